@@ -0,0 +1,135 @@
+# On-disk cache of parsed ASTs
+#
+# Parsing is a large part of the time spent on a file, and most files of a CI run have not changed since
+# the previous run. The AST of a file is pickled under a key made of the hash of its content, its name
+# (every node's coord carries it) and the versions of pycparser and Python, so an unchanged file skips
+# lexing and parsing entirely and any upgrade starts a fresh cache.
+#
+# The cache is kept under a size limit by evicting the least recently used entries: a hit refreshes the
+# modification time of its entry, and the oldest entries are removed once the limit is exceeded. Like the
+# summary cache, entries are written to a temporary file and renamed into place, so several processes can
+# share the same directory.
+
+import gc
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+
+import pycparser
+
+
+# ASTs of deeply nested code are deep, pickle needs a frame per level
+PICKLE_RECURSION_LIMIT = 10000
+
+# pickle is only fast with the cyclic garbage collector paused: it would otherwise walk the whole
+# half-built tree every few thousand nodes
+def withoutGc(function, *args):
+    enabled = gc.isenabled()
+    limit = sys.getrecursionlimit()
+    gc.disable()
+    sys.setrecursionlimit(max(limit, PICKLE_RECURSION_LIMIT))
+    try:
+        return function(*args)
+    finally:
+        sys.setrecursionlimit(limit)
+        if enabled:
+            gc.enable()
+
+
+class AstCache:
+    # maxBytes is the size limit of the cache directory (None for no limit)
+    def __init__(self, directory, maxBytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.version = pycparser.__version__ + "/" + sys.version.split()[0] + "/" + str(pickle.HIGHEST_PROTOCOL)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bytes written since the size of the directory was last checked (None before the first check)
+        self.written = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, text, filename):
+        h = hashlib.sha256(self.version.encode())
+        h.update(b"\x00" + filename.encode() + b"\x00")
+        h.update(text.encode())
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".ast")
+
+    def get(self, text, filename):
+        path = self.path(self.key(text, filename))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            ast = withoutGc(pickle.loads, data)
+        except Exception:
+            # missing, or unreadable (truncated by a full disk, written by another version, ...)
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # refresh its place in the LRU order
+            os.utime(path)
+        except OSError:
+            pass
+        return ast
+
+    def put(self, text, filename, ast):
+        path = self.path(self.key(text, filename))
+        try:
+            data = withoutGc(pickle.dumps, ast, pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        # checking the size means listing the whole directory, so it is only done on the first write of a
+        # process (which may join an already full cache) and then once a tenth of the limit has been written
+        if self.maxBytes is None:
+            return
+        if self.written is not None:
+            self.written += len(data)
+        if self.written is None or self.written > self.maxBytes // 10:
+            self.evict()
+            self.written = 0
+
+    # remove the least recently used entries until the cache fits in maxBytes
+    def evict(self):
+        entries = []
+        total = 0
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".ast"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        return ("ast cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses, "
+                + str(self.evictions) + " evictions")
@@ -0,0 +1,39 @@
+# Diff-mode checks: the changed lines parseDiff reads from unified diffs, with the context lines of a plain
+# `git diff` and without them (`git diff -U0`, which --git-diff runs). Both must mark the same lines.
+#
+# usage: python3 benchmarks/diffModeCheck.py
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from diffMode import parseDiff
+
+HEADER = "--- a/f.c\n+++ b/f.c\n"
+# (name, diff, changed lines of f.c)
+CASES = [
+    ("deletion with context", "@@ -2,7 +2,6 @@\n l2\n l3\n l4\n-l5\n l6\n l7\n l8\n", [4, 5]),
+    ("deletion without context", "@@ -5 +4,0 @@\n-l5\n", [4, 5]),
+    ("deletions without context", "@@ -5,2 +4,0 @@\n-l5\n-l6\n", [4, 5]),
+    ("addition with context", "@@ -2,6 +2,7 @@\n l2\n l3\n l4\n+new\n l5\n l6\n l7\n", [5]),
+    ("addition without context", "@@ -4,0 +5 @@\n+new\n", [5]),
+    ("replacement with context", "@@ -2,7 +2,7 @@\n l2\n l3\n l4\n-l5\n+new\n l6\n l7\n l8\n", [4, 5]),
+    ("replacement without context", "@@ -5 +5 @@\n-l5\n+new\n", [4, 5]),
+]
+
+
+def main():
+    failed = 0
+    for name, hunk, expected in CASES:
+        lines = parseDiff(HEADER + hunk).get("f.c", [])
+        if lines != expected:
+            failed += 1
+            print(name + ": changed lines " + str(lines) + ", expected " + str(expected))
+    print(str(len(CASES) - failed) + " of " + str(len(CASES)) + " diff-mode checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# Generator of synthetic C programs for the benchmarks
+#
+# Each workload stresses one part of the analysis and takes a single size parameter. The programs only use
+# the constructs the tracker understands and are valid input for it (no leak or warning case crashes it).
+#
+# usage: python3 benchmarks/generateProgram.py <workload> <size> > program.c
+
+import sys
+
+
+# n pointers allocated one after the other, half of them aliased, reallocated and freed
+def straightLine(n):
+    lines = ["int main() {"]
+    for i in range(n):
+        lines.append("    int* p" + str(i) + " = malloc(4);")
+    for i in range(0, n, 2):
+        lines.append("    int* q" + str(i) + ";")
+        lines.append("    q" + str(i) + " = p" + str(i) + ";")
+    for i in range(0, n, 3):
+        lines.append("    p" + str(i) + " = malloc(8);")
+    for i in range(0, n, 4):
+        lines.append("    free(p" + str(i) + ");")
+    lines.append("    return 0;")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+# ifs nested `depth` deep over a fixed set of pointers, every level allocating in one branch and
+# freeing in the other
+def nestedIfs(depth, width=50):
+    lines = ["int main() {", "    int c = 1;"]
+    for i in range(width):
+        lines.append("    int* p" + str(i) + " = malloc(4);")
+    indent = "    "
+    for d in range(depth):
+        lines.append(indent + "if (c) {")
+        lines.append(indent + "    int* a" + str(d) + " = malloc(4);")
+        lines.append(indent + "    p" + str(d % width) + " = a" + str(d) + ";")
+        lines.append(indent + "} else {")
+        lines.append(indent + "    int* b" + str(d) + " = malloc(4);")
+        lines.append(indent + "    free(b" + str(d) + ");")
+        lines.append(indent + "}")
+        lines.append(indent + "if (c) {")
+        indent += "    "
+    for d in range(depth):
+        indent = indent[4:]
+        lines.append(indent + "}")
+    lines.append("    return 0;")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+# n loops in a row, each allocating and freeing a local and reallocating a pointer declared outside of it
+def loops(n):
+    lines = ["int main() {", "    int* q = malloc(4);"]
+    for i in range(n):
+        if i % 2 == 0:
+            lines.append("    for (int i" + str(i) + " = 0; i" + str(i) + " < 10; i" + str(i) + "++) {")
+        else:
+            lines.append("    while (q) {")
+        lines.append("        int* t" + str(i) + " = malloc(4);")
+        lines.append("        free(t" + str(i) + ");")
+        lines.append("        q = malloc(4);")
+        lines.append("    }")
+    lines.append("    free(q);")
+    lines.append("    return 0;")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+# loops nested `depth` deep, every level allocating and freeing a local and reallocating a pointer declared
+# outside of all of them
+def nestedLoops(depth):
+    lines = ["int main() {", "    int c = 1;", "    int* q = malloc(4);"]
+    indent = "    "
+    for d in range(depth):
+        lines.append(indent + ("while (c) {" if d % 2 == 0 else "for (int i" + str(d) + " = 0; i" + str(d) + " < 10; i" + str(d) + "++) {"))
+        indent += "    "
+        lines.append(indent + "int* t" + str(d) + " = malloc(4);")
+        lines.append(indent + "free(t" + str(d) + ");")
+        lines.append(indent + "q = malloc(4);")
+    for d in range(depth):
+        indent = indent[4:]
+        lines.append(indent + "}")
+    lines.append("    free(q);")
+    lines.append("    return 0;")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+# a function with n pointer parameters that allocates all of them, called from 20 callers
+def wideParams(n, callers=20):
+    params = ", ".join("int* a" + str(i) for i in range(n))
+    lines = ["void fill(" + params + ") {"]
+    for i in range(n):
+        lines.append("    a" + str(i) + " = malloc(4);")
+    lines.append("}")
+    args = ", ".join("p" + str(i) for i in range(n))
+    for c in range(callers):
+        lines.append("void caller" + str(c) + "() {")
+        for i in range(n):
+            lines.append("    int* p" + str(i) + " = NULL;")
+        lines.append("    fill(" + args + ");")
+        for i in range(0, n, 2):
+            lines.append("    free(p" + str(i) + ");")
+        lines.append("}")
+    return "\n".join(lines) + "\n"
+
+# n small functions, each calling the previous one and a function returning allocated memory
+def manyFunctions(n):
+    functions = ["int* make0() {\n    int* c = malloc(4);\n    return c;\n}\n"]
+    for i in range(n):
+        functions.append(
+            "void f" + str(i) + "(int* p) {\n"
+            + "    int* a = malloc(4);\n"
+            + ("    f" + str(i - 1) + "(a);\n" if i > 0 else "")
+            + "    int* b = make0();\n"
+            + "    free(a);\n"
+            + "    free(b);\n"
+            + "}\n")
+    return "\n".join(functions)
+
+
+# < key=workload name, value=generator >
+WORKLOADS = {
+    "straightLine": straightLine,
+    "nestedIfs": nestedIfs,
+    "loops": loops,
+    "nestedLoops": nestedLoops,
+    "wideParams": wideParams,
+    "manyFunctions": manyFunctions,
+}
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in WORKLOADS:
+        print("usage: python3 benchmarks/generateProgram.py <" + "|".join(WORKLOADS) + "> <size>", file=sys.stderr)
+        sys.exit(2)
+    sys.stdout.write(WORKLOADS[sys.argv[1]](int(sys.argv[2])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Golden-output corpus: the report of every example program, as the tracker printed it when the
+# golden files were last updated. A speedup must leave every report unchanged, and both engines must print them.
+#
+# usage: python3 benchmarks/goldenCorpus.py [--update | --engine cfg]
+
+import os
+import sys
+import glob
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from memLeakTracker import Analyzer
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+# the programs of the corpus, relative to the repository root
+CORPUS = ["Examples/*.c", "UserStudyExercises/Initial/*.c"]
+
+
+def corpusFiles():
+    filenames = []
+    for pattern in CORPUS:
+        filenames += sorted(glob.glob(os.path.join(ROOT, pattern)))
+    return [os.path.relpath(filename, ROOT) for filename in filenames]
+
+def goldenPath(filename):
+    return os.path.join(GOLDEN_DIR, os.path.splitext(filename)[0] + ".out")
+
+def report(analyzer, filename):
+    return str(analyzer.analyzeFile(os.path.join(ROOT, filename)))
+
+# Compare every report against its golden file
+# returns the files whose report changed (or that have no golden file yet)
+def checkCorpus(analyzer=None, out=sys.stdout):
+    if analyzer is None:
+        analyzer = Analyzer()
+    changed = []
+    for filename in corpusFiles():
+        try:
+            with open(goldenPath(filename)) as f:
+                expected = f.read()
+        except OSError:
+            expected = None
+        if report(analyzer, filename) != expected:
+            changed.append(filename)
+            print("golden output changed: " + filename, file=out)
+    return changed
+
+def updateCorpus(analyzer=None):
+    if analyzer is None:
+        analyzer = Analyzer()
+    for filename in corpusFiles():
+        path = goldenPath(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(report(analyzer, filename))
+
+
+def main():
+    if "--update" in sys.argv[1:]:
+        updateCorpus()
+        print("updated " + str(len(corpusFiles())) + " golden files")
+        return
+    engine = "ast"
+    if "--engine" in sys.argv[1:]:
+        engine = sys.argv[sys.argv.index("--engine") + 1]
+    changed = checkCorpus(Analyzer(engine=engine))
+    print(str(len(corpusFiles()) - len(changed)) + " of " + str(len(corpusFiles())) + " golden outputs unchanged")
+    sys.exit(1 if changed else 0)
+
+
+if __name__ == "__main__":
+    main()
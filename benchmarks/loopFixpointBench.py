@@ -0,0 +1,89 @@
+# Loop fixpoint benchmark: how many passes over their body loops take to converge, and how the work grows
+# with the nesting depth
+#
+# The first table counts the passes of every loop of the corpus and of the loops workload: typical loops
+# converge in 2 or 3. The second one analyzes loops nested deeper and deeper (the nestedLoops workload), with
+# the nested loops of later passes widened to a single pass and without it: with widening the passes grow
+# with the square of the depth (every pass of a loop evaluates each loop nested in it once), without it they
+# grow exponentially (only run up to a small depth).
+#
+# usage: python3 benchmarks/loopFixpointBench.py [max nesting depth]
+
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from memLeakTracker import Analyzer
+from generateProgram import WORKLOADS
+import goldenCorpus
+
+# deepest nesting analyzed without widening, every level multiplies its passes
+MAX_UNWIDENED_DEPTH = 8
+
+
+# Analyzer that records the passes of every loop it evaluates
+class PassCountingAnalyzer(Analyzer):
+    def __init__(self):
+        Analyzer.__init__(self)
+        self.passes = []
+
+    def evaluateLoop(self, decl, pbr, funcName):
+        passes, converged = Analyzer.evaluateLoop(self, decl, pbr, funcName)
+        self.passes.append(passes)
+        return passes, converged
+
+# the same without widening: nested loops are iterated to their fixpoint on every pass of the enclosing ones
+class UnwidenedAnalyzer(PassCountingAnalyzer):
+    def evaluateLoop(self, decl, pbr, funcName):
+        replays = self.loopReplays
+        self.loopReplays = 0
+        try:
+            return PassCountingAnalyzer.evaluateLoop(self, decl, pbr, funcName)
+        finally:
+            self.loopReplays = replays
+
+
+def passesOf(analyzer, ast):
+    analyzer.passes = []
+    start = time.perf_counter()
+    analyzer.analyzeAst(ast)
+    return sum(analyzer.passes), time.perf_counter() - start
+
+
+def main():
+    maxDepth = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    analyzer = PassCountingAnalyzer()
+
+    histogram = Counter()
+    for filename in goldenCorpus.corpusFiles():
+        analyzer.analyzeFile(os.path.join(ROOT, filename))
+        histogram.update(analyzer.passes)
+        analyzer.passes = []
+    analyzer.analyzeAst(analyzer.parser.parse(WORKLOADS["loops"](500), filename="<loops>"))
+    histogram.update(analyzer.passes)
+    total = sum(histogram.values())
+    print("%8s %8s %8s" % ("passes", "loops", "share"))
+    for passes in sorted(histogram):
+        print("%8d %8d %7.1f%%" % (passes, histogram[passes], histogram[passes] * 100.0 / total))
+    print()
+
+    unwidened = UnwidenedAnalyzer()
+    print("%8s %16s %14s %16s %14s" % ("depth", "passes", "time (s)", "unwidened passes", "time (s)"))
+    depth = 1
+    while depth <= maxDepth:
+        ast = analyzer.parser.parse(WORKLOADS["nestedLoops"](depth), filename="<nestedLoops>")
+        passes, seconds = passesOf(analyzer, ast)
+        line = "%8d %16d %14.4f" % (depth, passes, seconds)
+        if depth <= MAX_UNWIDENED_DEPTH:
+            passes, seconds = passesOf(unwidened, ast)
+            line += " %16d %14.4f" % (passes, seconds)
+        print(line)
+        depth *= 2
+
+
+if __name__ == "__main__":
+    main()
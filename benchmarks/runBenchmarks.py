@@ -0,0 +1,158 @@
+# Benchmark suite: parse time, analysis time and peak memory of every generated workload, compared against
+# the stored baselines, after checking that the golden-output corpus is unchanged
+#
+# A measurement regresses when it is worse than its baseline by more than the tolerance (a fraction of the
+# baseline), and timings also have to be worse by more than a few milliseconds, below that it is noise.
+# The default time tolerance is wide (twice the baseline) so the suite catches algorithmic regressions
+# rather than scheduler noise; tighten it with --time-tolerance on a quiet machine.
+# The baselines are only meaningful on the machine they were recorded on: run with --update after a
+# deliberate change, or once on a new machine, to record them again.
+#
+# usage: python3 benchmarks/runBenchmarks.py [--update] [--only WORKLOAD ...] [--repeat N]
+#                                            [--time-tolerance F] [--memory-tolerance F]
+
+import os
+import sys
+import json
+import time
+import gc
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from memLeakTracker import Analyzer
+from generateProgram import WORKLOADS
+import goldenCorpus
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# < key=workload, value=size it is benchmarked at >
+SIZES = {
+    "straightLine": 3000,
+    "nestedIfs": 100,
+    "loops": 500,
+    "nestedLoops": 40,
+    "wideParams": 200,
+    "manyFunctions": 2000,
+}
+DEFAULT_TOLERANCES = {"time": 1.0, "memory": 0.2, "minSeconds": 0.02}
+
+
+# best of `repeat` runs, so a slow outlier (another process, a GC pause) does not count as a regression
+def bestTime(function, repeat):
+    best = None
+    for i in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+def measure(analyzer, name, repeat):
+    text = WORKLOADS[name](SIZES[name])
+    ast = analyzer.parser.parse(text, filename="<" + name + ">")
+    parseSeconds = bestTime(lambda: analyzer.parser.parse(text, filename="<" + name + ">"), repeat)
+    analysisSeconds = bestTime(lambda: analyzer.analyzeAst(ast, "<" + name + ">"), repeat)
+    # a separate run for memory, tracemalloc slows everything down
+    # (collect first so the garbage of the previous runs is not counted)
+    gc.collect()
+    tracemalloc.start()
+    analyzer.analyzeAst(ast, "<" + name + ">")
+    peakBytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "size": SIZES[name],
+        "lines": text.count("\n"),
+        "parseSeconds": round(parseSeconds, 4),
+        "analysisSeconds": round(analysisSeconds, 4),
+        "peakMemoryKB": peakBytes // 1024,
+    }
+
+def loadBaselines():
+    try:
+        with open(BASELINES) as f:
+            return json.load(f)
+    except OSError:
+        return {"tolerances": dict(DEFAULT_TOLERANCES), "workloads": {}}
+
+# compare one measurement to its baseline, returns the regressions as messages
+def compare(name, measured, baseline, tolerances):
+    regressions = []
+    if baseline is None:
+        return regressions
+    if baseline.get("size") != measured["size"]:
+        return [name + ": baseline was recorded at size " + str(baseline.get("size")) + ", run with --update"]
+    for key, kind in (("parseSeconds", "time"), ("analysisSeconds", "time"), ("peakMemoryKB", "memory")):
+        limit = baseline[key] * (1 + tolerances[kind])
+        if kind == "time":
+            limit = max(limit, baseline[key] + tolerances["minSeconds"])
+        if measured[key] > limit:
+            regressions.append(name + ": " + key + " " + str(measured[key]) + " is over " + str(baseline[key])
+                               + " + " + str(int(tolerances[kind] * 100)) + "%")
+    return regressions
+
+def change(measured, baseline, key):
+    if baseline is None or not baseline.get(key):
+        return "    -"
+    return "%+5.0f%%" % ((measured[key] - baseline[key]) * 100.0 / baseline[key])
+
+
+def main():
+    argparser = argparse.ArgumentParser('runBenchmarks.py')
+    argparser.add_argument('--update', action='store_true',
+                           help='record the measurements as the new baselines')
+    argparser.add_argument('--only', nargs='+', choices=sorted(WORKLOADS), default=None,
+                           help='workloads to run (default: all of them)')
+    argparser.add_argument('--repeat', type=int, default=5,
+                           help='runs per timing, the best one is kept (default: 5)')
+    argparser.add_argument('--time-tolerance', type=float, default=None,
+                           help='allowed slowdown as a fraction of the baseline (default: from baselines.json)')
+    argparser.add_argument('--memory-tolerance', type=float, default=None,
+                           help='allowed peak memory growth as a fraction of the baseline (default: from baselines.json)')
+    args = argparser.parse_args()
+
+    analyzer = Analyzer()
+    changed = goldenCorpus.checkCorpus(analyzer)
+    print("golden corpus: " + str(len(goldenCorpus.corpusFiles()) - len(changed)) + " of "
+          + str(len(goldenCorpus.corpusFiles())) + " reports unchanged")
+
+    baselines = loadBaselines()
+    tolerances = dict(DEFAULT_TOLERANCES, **baselines.get("tolerances", {}))
+    if args.time_tolerance is not None:
+        tolerances["time"] = args.time_tolerance
+    if args.memory_tolerance is not None:
+        tolerances["memory"] = args.memory_tolerance
+
+    print("%-14s %7s %7s %10s %7s %13s %7s %11s %7s" % ("workload", "size", "lines", "parse (s)", "", "analysis (s)", "",
+                                                      "peak (KB)", ""))
+    regressions = []
+    for name in args.only or list(WORKLOADS):
+        measured = measure(analyzer, name, args.repeat)
+        baseline = baselines["workloads"].get(name)
+        print("%-14s %7d %7d %10.3f %7s %13.3f %7s %11d %7s" % (
+            name, measured["size"], measured["lines"],
+            measured["parseSeconds"], change(measured, baseline, "parseSeconds"),
+            measured["analysisSeconds"], change(measured, baseline, "analysisSeconds"),
+            measured["peakMemoryKB"], change(measured, baseline, "peakMemoryKB")))
+        sys.stdout.flush()
+        if args.update:
+            baselines["workloads"][name] = measured
+        else:
+            regressions += compare(name, measured, baseline, tolerances)
+
+    if args.update:
+        baselines["tolerances"] = tolerances
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("baselines updated")
+    for regression in regressions:
+        print("REGRESSION: " + regression)
+    sys.exit(1 if regressions or changed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Startup benchmark: wall time from launching `python3 memLeakTracker.py` on a trivial file to its first line
+# of output, which is the latency felt when the tool runs from an editor or a pre-commit hook
+#
+# The time of a bare interpreter (`python3 -c pass`) is measured the same way and subtracted: it depends on
+# the machine and the Python installation, not on the tracker. The run fails when what is left is over the
+# target.
+#
+# usage: python3 benchmarks/startupBenchmark.py [--repeat N] [--target MS] [-- extra tracker options]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+TRIVIAL_PROGRAM = """int main() {
+    int* p = malloc(4);
+    free(p);
+    int* q = malloc(4);
+    return 0;
+}
+"""
+DEFAULT_TARGET_MS = 100
+
+
+# seconds until the command prints its first line (or exits without output)
+def timeToFirstLine(command):
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    process.stdout.readline()
+    seconds = time.perf_counter() - start
+    process.stdout.read()
+    process.wait()
+    return seconds
+
+# the fastest time of each command, launched in turn so a burst of load on the machine slows them all, not the
+# one that happened to run then
+def bestOf(commands, repeat):
+    best = [float("inf")] * len(commands)
+    for i in range(repeat):
+        for j, command in enumerate(commands):
+            best[j] = min(best[j], timeToFirstLine(command))
+    return best
+
+
+def main():
+    argparser = argparse.ArgumentParser('startupBenchmark.py')
+    argparser.add_argument('--repeat', type=int, default=10,
+                           help='launches per measurement, the fastest one is kept (default: 10)')
+    argparser.add_argument('--target', type=float, default=DEFAULT_TARGET_MS,
+                           help='allowed startup time in ms on top of the bare interpreter (default: '
+                                + str(DEFAULT_TARGET_MS) + ')')
+    argparser.add_argument('options', nargs='*',
+                           help='extra options passed to the tracker (after --)')
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "trivial.c")
+        with open(filename, "w") as f:
+            f.write(TRIVIAL_PROGRAM)
+        interpreter, tracker = bestOf([[sys.executable, "-c", "print()"],
+                                       [sys.executable, "memLeakTracker.py"] + args.options + [filename]], args.repeat)
+
+    overhead = (tracker - interpreter) * 1000
+    print("interpreter startup  %8.1f ms" % (interpreter * 1000))
+    print("tracker first output %8.1f ms" % (tracker * 1000))
+    print("tracker overhead     %8.1f ms (target %.0f ms)" % (overhead, args.target))
+    if overhead > args.target:
+        print("REGRESSION: startup overhead is over the target")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
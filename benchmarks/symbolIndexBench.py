@@ -0,0 +1,71 @@
+# Micro-benchmark for function lookups: analysis time of a generated translation unit as the number of
+# functions grows, with the symbol index and with the linear scans it replaced
+#
+# usage: python3 benchmarks/symbolIndexBench.py [max number of functions]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from memLeakTracker import Analyzer
+
+
+# Every function takes a pointer parameter (so it is a pass by reference function), calls the previous one
+# and assigns from a user defined function, so each statement goes through the function lookups
+def generateProgram(n):
+    functions = ["int* make0() {\n    int* c = malloc(4);\n    return c;\n}\n"]
+    for i in range(n):
+        functions.append(
+            "void f" + str(i) + "(int* p) {\n"
+            + "    int* a = malloc(4);\n"
+            + ("    f" + str(i - 1) + "(a);\n" if i > 0 else "")
+            + "    int* b = make0();\n"
+            + "    free(a);\n"
+            + "    free(b);\n"
+            + "}\n")
+    return "\n".join(functions)
+
+
+# the lookups as they were before the symbol index: a scan of ast.ext or referenceFuncs per call
+class LinearScanAnalyzer(Analyzer):
+    def findFuncDec(self, name):
+        for funcDec in self.ast.ext:
+            if str(funcDec.decl.name) == name:
+                return funcDec
+
+    def inReferenceFunc(self, i):
+        pbrNames = []
+        for f in self.referenceFuncs:
+            pbrNames.append(f.funcName)
+        return i in pbrNames
+
+    def returnReferenceFunc(self, i):
+        for f in self.referenceFuncs:
+            if f.funcName == i:
+                return f
+        return None
+
+
+def timeAnalysis(analyzer, ast):
+    start = time.perf_counter()
+    analyzer.analyzeAst(ast)
+    return time.perf_counter() - start
+
+
+def main():
+    maxFunctions = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    sizes = [n for n in (500, 1000, 2000, 5000, 10000) if n <= maxFunctions]
+    indexed = Analyzer()
+    linear = LinearScanAnalyzer()
+    print("%10s %12s %12s %9s" % ("functions", "indexed (s)", "linear (s)", "speedup"))
+    for n in sizes:
+        ast = indexed.parser.parse(generateProgram(n), filename="<generated>")
+        indexedTime = timeAnalysis(indexed, ast)
+        linearTime = timeAnalysis(linear, ast)
+        print("%10d %12.3f %12.3f %8.1fx" % (n, indexedTime, linearTime, linearTime / indexedTime))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# Call graph scheduling: functions are evaluated callees first, so every call sees the finished
+# PassByReference summary of the function it calls, whatever the order they are defined in
+#
+# The call graph of a translation unit is condensed into its strongly connected components (SCCs) and the
+# components are evaluated bottom-up. The functions of a recursive component call each other (or
+# themselves), so they are evaluated again until their summaries stop changing. Components whose callees are
+# all done are independent of each other: with several jobs they are spread over a pool of forked worker
+# processes, which inherit the ast instead of receiving it, and only summaries and results cross over.
+
+from pycparser import c_ast
+
+# evaluations of a recursive component before giving up on a fixed point
+MAX_SCC_ITERATIONS = 10
+# below this many functions a file is evaluated serially, the pool would cost more than it saves
+PARALLEL_MIN_FUNCTIONS = 100
+# statements with a single nested statement
+BODY_STATEMENTS = (c_ast.For, c_ast.While, c_ast.DoWhile, c_ast.Switch, c_ast.Label)
+
+
+# names of every function called in the body of a function (the summary cache keys a function on them)
+def calledNames(funcDec):
+    names = set()
+    stack = [funcDec.body]
+    while stack:
+        node = stack.pop()
+        nodeType = type(node)
+        if nodeType == c_ast.FuncCall:
+            if type(node.name) == c_ast.ID:
+                names.add(node.name.name)
+            if node.args is not None:
+                stack.append(node.args)
+        elif nodeType != c_ast.ID and nodeType != c_ast.Constant:
+            # iterating a node yields its children (identifiers and constants have none)
+            stack.extend(node)
+    return sorted(names)
+
+# names of the functions whose summaries the evaluation of a function looks up: calls made as a statement or
+# as the right hand side of an assignment or initializer, in any block of the body. Calls nested inside
+# expressions are never evaluated, and only walking the statements keeps the graph cheap to build.
+def summaryCallees(funcDec):
+    names = set()
+    stack = [funcDec.body]
+    while stack:
+        node = stack.pop()
+        nodeType = type(node)
+        if nodeType == c_ast.Compound:
+            if node.block_items is not None:
+                stack.extend(node.block_items)
+            continue
+        if nodeType == c_ast.If:
+            stack.append(node.iftrue)
+            stack.append(node.iffalse)
+            continue
+        if nodeType in BODY_STATEMENTS:
+            stack.append(node.stmt)
+            continue
+        if nodeType == c_ast.Case or nodeType == c_ast.Default:
+            stack.extend(node.stmts or ())
+            continue
+        if nodeType == c_ast.Assignment:
+            node = node.rvalue
+        elif nodeType == c_ast.Decl:
+            node = node.init
+        if type(node) == c_ast.FuncCall and type(node.name) == c_ast.ID:
+            names.add(node.name.name)
+    return names
+
+# < index=position in functions, value=sorted positions of the functions it calls >
+# functionIndex maps names to the definition a call resolves to (see Analyzer.buildFunctionIndex)
+# functions can be some of the file's only, calls to the others are left out
+def buildCallGraph(functions, functionIndex):
+    positions = {id(funcDec): i for i, funcDec in enumerate(functions)}
+    graph = []
+    for funcDec in functions:
+        callees = set()
+        for name in summaryCallees(funcDec):
+            if name in functionIndex:
+                position = positions.get(id(functionIndex[name]))
+                if position is not None:
+                    callees.add(position)
+        graph.append(sorted(callees))
+    return graph
+
+# true when every function only calls functions defined before it (and none is recursive), source order is
+# then already bottom-up
+def isBottomUp(graph):
+    return all(callee < i for i, callees in enumerate(graph) for callee in callees)
+
+# Tarjan's algorithm, iterative so deep call chains do not hit the recursion limit
+# returns the components callees first, each a sorted list of positions
+def stronglyConnectedComponents(graph):
+    index = [None] * len(graph)
+    lowLink = [0] * len(graph)
+    onStack = [False] * len(graph)
+    stack = []
+    components = []
+    counter = 0
+    for root in range(len(graph)):
+        if index[root] is not None:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, i = work.pop()
+            if i == 0:
+                index[node] = lowLink[node] = counter
+                counter += 1
+                stack.append(node)
+                onStack[node] = True
+            recursed = False
+            while i < len(graph[node]):
+                callee = graph[node][i]
+                i += 1
+                if index[callee] is None:
+                    work.append((node, i))
+                    work.append((callee, 0))
+                    recursed = True
+                    break
+                if onStack[callee]:
+                    lowLink[node] = min(lowLink[node], index[callee])
+            if recursed:
+                continue
+            if lowLink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    onStack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(sorted(component))
+            if work:
+                caller = work[-1][0]
+                lowLink[caller] = min(lowLink[caller], lowLink[node])
+    return components
+
+def isRecursive(component, graph):
+    return len(component) > 1 or component[0] in graph[component[0]]
+
+# group the components into levels: a component's level is one more than the highest level of its callees,
+# so the components of a level only depend on lower levels
+def componentLevels(components, graph):
+    componentOf = {}
+    for c, component in enumerate(components):
+        for position in component:
+            componentOf[position] = c
+    level = []
+    levels = []
+    for c, component in enumerate(components):
+        calleeLevels = [level[componentOf[callee]] for position in component for callee in graph[position]
+                        if componentOf[callee] != c]
+        level.append(max(calleeLevels) + 1 if calleeLevels else 0)
+        if level[c] == len(levels):
+            levels.append([])
+        levels[level[c]].append(component)
+    return levels
+
+
+# the analyzer and functions of the run in progress, inherited by the forked workers
+forkedAnalyzer = None
+forkedFunctions = None
+
+def canFork():
+    import multiprocessing
+    return "fork" in multiprocessing.get_all_start_methods()
+
+# evaluate a batch of components in a worker, summaries are those of every function they call
+def evaluateInWorker(batch, summaries):
+    import summaryCache
+    analyzer = forkedAnalyzer
+    analyzer.referenceFuncs = []
+    analyzer.referenceFuncIndex = {}
+    for summary in summaries:
+        analyzer.addReferenceFunc(summaryCache.summaryFromDict(summary))
+    return [analyzer.evaluateComponent([forkedFunctions[p] for p in component], recursive)
+            for component, recursive in batch]
+
+# Evaluate the components level by level across a pool of `jobs` forked processes
+# returns the contribution of every function, by position
+# with pending (an outputStream.PendingDiagnostics), the levels left once it is done are not evaluated and their
+# functions have no contribution
+def evaluateInParallel(analyzer, functions, graph, components, jobs, pending=None):
+    global forkedAnalyzer, forkedFunctions
+    import multiprocessing
+    import summaryCache
+    from concurrent.futures import ProcessPoolExecutor
+    entries = [None] * len(functions)
+    forkedAnalyzer = analyzer
+    forkedFunctions = functions
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork")) as executor:
+            for level in componentLevels(components, graph):
+                # a few batches per worker, so one slow component does not hold up the whole level
+                batchCount = min(len(level), jobs * 4)
+                batches = [level[b::batchCount] for b in range(batchCount)]
+                futures = []
+                for batch in batches:
+                    names = set()
+                    for component in batch:
+                        for position in component:
+                            names.update(str(functions[callee].decl.name) for callee in graph[position])
+                    summaries = [summaryCache.summaryToDict(analyzer.referenceFuncIndex[name])
+                                 for name in sorted(names) if name in analyzer.referenceFuncIndex]
+                    futures.append(executor.submit(evaluateInWorker,
+                                                   [(component, isRecursive(component, graph)) for component in batch],
+                                                   summaries))
+                for batch, future in zip(batches, futures):
+                    for component, componentEntries in zip(batch, future.result()):
+                        for position, entry in zip(component, componentEntries):
+                            entries[position] = entry
+                            analyzer.registerSummary(functions[position], entry)
+                            if pending is not None:
+                                pending.add(*summaryCache.diagnosticCounts(entry))
+                if pending is not None and pending.done:
+                    break
+    finally:
+        forkedAnalyzer = None
+        forkedFunctions = None
+    return entries
+
+# Evaluate the components callees first in this process
+def evaluateSerially(analyzer, functions, graph, components, pending=None):
+    import summaryCache
+    entries = [None] * len(functions)
+    for component in components:
+        componentEntries = analyzer.evaluateComponent([functions[p] for p in component], isRecursive(component, graph))
+        for position, entry in zip(component, componentEntries):
+            entries[position] = entry
+            if pending is not None:
+                pending.add(*summaryCache.diagnosticCounts(entry))
+        if pending is not None and pending.done:
+            break
+    return entries
+
+# Evaluate the functions of a translation unit bottom-up, with up to `jobs` processes
+# returns the contribution of every function, by position, None for the functions not evaluated because pending
+# (an outputStream.PendingDiagnostics, if any) was done first
+def evaluateBottomUp(analyzer, functions, graph, jobs=1, pending=None):
+    components = stronglyConnectedComponents(graph)
+    if jobs > 1 and len(functions) >= PARALLEL_MIN_FUNCTIONS and canFork():
+        return evaluateInParallel(analyzer, functions, graph, components, jobs, pending)
+    return evaluateSerially(analyzer, functions, graph, components, pending)
@@ -0,0 +1,605 @@
+# Control-flow graph engine: function bodies evaluated as a dataflow problem over their basic blocks
+#
+# The AST engine (Analyzer.evaluateProgram) walks the statements of a body and recurses into every conditional
+# and loop, so how deep code can nest is bounded by Python's recursion limit, and it only knows about if/else
+# and loops. This engine first compiles a body into a control-flow graph of basic blocks, where switch, break,
+# continue, goto and early returns are edges, then evaluates the blocks off a worklist in reverse postorder.
+# A block with a single predecessor starts from a copy-on-write branch of its state, states are only merged
+# where control flow joins, and a loop header is evaluated again until its state repeats (with the widening
+# and the iteration cap of the AST engine's loops). Nothing recurses, however deep the nesting.
+#
+# Conditions are not evaluated: both sides of every branch are taken and every loop can exit, as in the AST
+# engine. Code after a return (or any other jump) is unreachable and is not evaluated. The one condition that is
+# read is a null test whose branch jumps away (`if (p == NULL) return -1;`): the allocation p points to failed on
+# that path, so it is not a leak there.
+
+import heapq
+
+from pycparser import c_ast
+
+# layers a state can be stacked on before it is collapsed into one
+MAX_LAYERS = 16
+
+
+class Block:
+    __slots__ = ("index", "statements", "enclosing", "successors", "predecessors", "order", "loop", "markers",
+                 "nullTested")
+
+    def __init__(self, index):
+        self.index = index
+        # the statements of the block (no conditionals, loops or jumps), in order
+        self.statements = []
+        # the Loops its statements are nested in
+        self.enclosing = ()
+        self.successors = []
+        self.predecessors = []
+        # position in reverse postorder, None for an unreachable block
+        self.order = None
+        # the Loop this block is the header of
+        self.loop = None
+        # the Conditionals and Loops whose warnings are generated when the block is reached
+        self.markers = []
+        # the pointer variable known to be null when the block starts (the branch of a null test), if any
+        self.nullTested = None
+
+
+# An if statement: the block of its condition, the last blocks of its branches and the loops around it
+class Conditional:
+    __slots__ = ("before", "ifEnd", "elseEnd", "hasElse", "enclosing")
+
+    def __init__(self, before, hasElse, enclosing):
+        self.before = before
+        self.ifEnd = None
+        self.elseEnd = None
+        self.hasElse = hasElse
+        self.enclosing = enclosing
+
+
+# A loop: the block control enters it from (None for a loop made of gotos) and the fixpoint of its header
+class Loop:
+    __slots__ = ("preheader", "enclosing", "line", "visits", "seen", "seenWidened", "entered")
+
+    def __init__(self, preheader, enclosing, line=None):
+        self.preheader = preheader
+        self.enclosing = enclosing
+        self.line = line
+        self.enter()
+        self.entered = False
+
+    # control comes to the header from the preheader: the fixpoint starts over, as the AST engine evaluates the
+    # loop anew in every pass of an enclosing loop
+    def enter(self):
+        self.visits = 0
+        self.seen = set()
+        self.seenWidened = set()
+        self.entered = True
+
+
+class Cfg:
+    def __init__(self):
+        self.blocks = []
+        self.entry = self.newBlock()
+        self.exit = self.newBlock()
+
+    def newBlock(self):
+        block = Block(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def edge(self, source, target):
+        source.successors.append(target)
+        target.predecessors.append(source)
+
+    # Number the blocks reachable from the entry in reverse postorder, so a block comes after its predecessors
+    # (except along back edges) and the body of a loop before the code after it. The target of a back edge
+    # that is not the header of a loop statement (a loop made of gotos) becomes a loop header too.
+    def orderBlocks(self):
+        postorder = []
+        onStack = set()
+        visited = {self.entry.index}
+        onStack.add(self.entry.index)
+        # successors are visited last first, so the first successor (a loop's body) finishes last
+        work = [(self.entry, len(self.entry.successors))]
+        while work:
+            block, i = work.pop()
+            if i > 0:
+                work.append((block, i - 1))
+                successor = block.successors[i - 1]
+                if successor.index not in visited:
+                    visited.add(successor.index)
+                    onStack.add(successor.index)
+                    work.append((successor, len(successor.successors)))
+                elif successor.index in onStack and successor.loop is None:
+                    successor.loop = Loop(None, ())
+                continue
+            onStack.discard(block.index)
+            postorder.append(block)
+        for order, block in enumerate(reversed(postorder)):
+            block.order = order
+
+
+# Compile a function body into its control-flow graph, with an explicit work stack instead of recursion
+class CfgBuilder:
+    def __init__(self):
+        self.cfg = Cfg()
+        # the block statements are added to, None after a jump (the code that follows is unreachable)
+        self.current = self.cfg.entry
+        # < key=label name, value=Block >
+        self.labels = {}
+        # (break target, continue target) of the enclosing loops and switches
+        self.targets = []
+        # the enclosing Loops
+        self.loops = []
+        # AST nodes to compile and actions to run, the next one last
+        self.work = []
+
+    def build(self, body):
+        self.work.append(body)
+        while self.work:
+            item = self.work.pop()
+            if callable(item):
+                item()
+            else:
+                self.compileStatement(item)
+        self.jump(self.cfg.exit)
+        self.cfg.orderBlocks()
+        return self.cfg
+
+    def labelBlock(self, name):
+        if name not in self.labels:
+            self.labels[name] = self.cfg.newBlock()
+        return self.labels[name]
+
+    # the block statements go to, a new one (with no predecessor) in unreachable code
+    def currentBlock(self):
+        if self.current is None:
+            self.current = self.cfg.newBlock()
+        return self.current
+
+    # continue in block, falling through to it from the current block
+    def start(self, block):
+        if self.current is not None:
+            self.cfg.edge(self.current, block)
+        self.current = block
+
+    def jump(self, block):
+        if self.current is not None:
+            self.cfg.edge(self.current, block)
+        self.current = None
+
+    def branch(self, blocks):
+        source = self.currentBlock()
+        for block in blocks:
+            self.cfg.edge(source, block)
+        self.current = None
+
+    # the items are run in order, before the rest of the work
+    def then(self, *items):
+        self.work.extend(reversed(items))
+
+    def compileStatement(self, node):
+        nodeType = type(node)
+        if nodeType == c_ast.Compound:
+            if node.block_items is not None:
+                self.then(*node.block_items)
+        elif nodeType == c_ast.If:
+            self.compileIf(node)
+        elif nodeType == c_ast.While or nodeType == c_ast.For:
+            self.compileLoop(node)
+        elif nodeType == c_ast.DoWhile:
+            self.compileDoWhile(node)
+        elif nodeType == c_ast.Switch:
+            self.compileSwitch(node)
+        elif nodeType == c_ast.Break:
+            if self.targets:
+                self.jump(self.targets[-1][0])
+        elif nodeType == c_ast.Continue:
+            for breakTarget, continueTarget in reversed(self.targets):
+                if continueTarget is not None:
+                    self.jump(continueTarget)
+                    break
+        elif nodeType == c_ast.Return:
+            self.addStatement(node)
+            self.jump(self.cfg.exit)
+        elif nodeType == c_ast.Goto:
+            self.jump(self.labelBlock(node.name))
+        elif nodeType == c_ast.Label:
+            self.start(self.labelBlock(node.name))
+            self.then(node.stmt)
+        elif nodeType == c_ast.Case or nodeType == c_ast.Default:
+            # a case label outside of the switch's own block, only its statements are kept
+            self.then(*(node.stmts or ()))
+        elif nodeType != c_ast.EmptyStatement:
+            self.addStatement(node)
+
+    def addStatement(self, node):
+        block = self.currentBlock()
+        if not block.statements:
+            block.enclosing = tuple(self.loops)
+        block.statements.append(node)
+
+    def compileIf(self, node):
+        record = Conditional(self.currentBlock(), node.iffalse is not None, tuple(self.loops))
+        ifBlock = self.cfg.newBlock()
+        elseBlock = self.cfg.newBlock() if node.iffalse is not None else None
+        join = self.cfg.newBlock()
+        join.markers.append(record)
+        self.branch([ifBlock, elseBlock or join])
+
+        def endIf():
+            record.ifEnd = self.current
+            if self.current is None:
+                ifBlock.nullTested = nullTestedName(node.cond)
+            self.jump(join)
+
+        def endElse():
+            record.elseEnd = self.current
+            self.jump(join)
+
+        items = [lambda: self.start(ifBlock), node.iftrue, endIf]
+        if node.iffalse is not None:
+            items += [lambda: self.start(elseBlock), node.iffalse, endElse]
+        self.then(*(items + [lambda: self.start(join)]))
+
+    # while and for loops (the init and next expressions of a for are not evaluated, as in the AST engine)
+    def compileLoop(self, node):
+        loop = Loop(self.current, tuple(self.loops), node.coord.line)
+        header = self.cfg.newBlock()
+        header.loop = loop
+        body = self.cfg.newBlock()
+        after = self.cfg.newBlock()
+        after.markers.append(loop)
+        self.start(header)
+        self.branch([body, after])
+        self.enterLoop(loop, after, header)
+        self.then(lambda: self.start(body), node.stmt, lambda: self.jump(header), self.leaveLoop,
+                  lambda: self.start(after))
+
+    def compileDoWhile(self, node):
+        loop = Loop(self.current, tuple(self.loops), node.coord.line)
+        body = self.cfg.newBlock()
+        body.loop = loop
+        condition = self.cfg.newBlock()
+        after = self.cfg.newBlock()
+        after.markers.append(loop)
+        self.start(body)
+        self.enterLoop(loop, after, condition)
+        self.then(node.stmt, lambda: self.start(condition), self.leaveLoop,
+                  lambda: self.branch([body, after]), lambda: self.start(after))
+
+    def enterLoop(self, loop, breakTarget, continueTarget):
+        self.loops.append(loop)
+        self.targets.append((breakTarget, continueTarget))
+
+    def leaveLoop(self):
+        self.loops.pop()
+        self.targets.pop()
+
+    # the case labels of the switch's block branch from the switch, the cases fall through to the next one
+    def compileSwitch(self, node):
+        after = self.cfg.newBlock()
+        items = node.stmt.block_items if type(node.stmt) == c_ast.Compound else [node.stmt]
+        items = items or []
+        cases = {id(item): self.cfg.newBlock() for item in items if type(item) in (c_ast.Case, c_ast.Default)}
+        hasDefault = any(type(item) == c_ast.Default for item in items)
+        self.branch([cases[id(item)] for item in items if id(item) in cases] + ([] if hasDefault else [after]))
+        continueTarget = self.targets[-1][1] if self.targets else None
+        self.targets.append((after, continueTarget))
+        work = []
+        for item in items:
+            if id(item) in cases:
+                work.append(lambda block=cases[id(item)]: self.start(block))
+                work += item.stmts or []
+            else:
+                work.append(item)
+        self.then(*(work + [self.targets.pop, lambda: self.start(after)]))
+
+def buildCfg(body):
+    return CfgBuilder().build(body)
+
+def isNull(node):
+    if type(node) == c_ast.Cast:
+        node = node.expr
+    return (type(node) == c_ast.ID and node.name == "NULL") or (type(node) == c_ast.Constant and node.value == "0")
+
+# the variable a condition tests to be null (`!p`, `p == NULL`, `NULL == p`, `p == 0`), None for any other condition
+def nullTestedName(cond):
+    if type(cond) == c_ast.UnaryOp and cond.op == "!" and type(cond.expr) == c_ast.ID:
+        return cond.expr.name
+    if type(cond) == c_ast.BinaryOp and cond.op == "==":
+        for operand, other in ((cond.left, cond.right), (cond.right, cond.left)):
+            if type(operand) == c_ast.ID and isNull(other):
+                return operand.name
+    return None
+
+
+# the layers of a state from itself down to the root
+def layersOf(state):
+    layers = []
+    while state is not None:
+        layers.append(state)
+        state = state.parent
+    return layers
+
+# the deepest layer under all the states
+def commonAncestor(states):
+    layers = layersOf(states[0])
+    depths = {id(layer): depth for depth, layer in enumerate(layers)}
+    deepest = 0
+    for state in states[1:]:
+        while id(state) not in depths:
+            state = state.parent
+        deepest = max(deepest, depths[id(state)])
+    return layers[deepest]
+
+# the keys changed (or removed) in the layers of state above ancestor, each once
+# (in the order they were first changed in, as they would have been added to one dictionary)
+def changedSince(state, ancestor):
+    layers = []
+    while state is not ancestor:
+        layers.append(state)
+        state = state.parent
+    keys = {}
+    for layer in reversed(layers):
+        keys.update(dict.fromkeys(layer.delta))
+        keys.update(dict.fromkeys(layer.removed))
+    return keys
+
+# the keys whose values can differ between the states
+def changedBetween(states):
+    ancestor = commonAncestor(states)
+    keys = {}
+    for state in states:
+        keys.update(changedSince(state, ancestor))
+    return keys
+
+def depthOver(state, root):
+    depth = 0
+    while state is not root:
+        depth += 1
+        state = state.parent
+    return depth
+
+# The same contents as state with its top layers merged into one. At least half of MAX_LAYERS are merged,
+# then the layers below as long as they are no bigger than what was merged so far, so a long chain of blocks
+# keeps a few layers of growing size (like a binary counter) and every change is only copied a few times.
+def collapse(state, root):
+    layers = []
+    while state is not root:
+        layers.append(state)
+        state = state.parent
+    size = 0
+    base = root
+    for i, layer in enumerate(layers):
+        layerSize = len(layer.delta) + len(layer.removed)
+        if i >= MAX_LAYERS // 2 and layerSize > size:
+            base = layer
+            break
+        size += layerSize
+    state = layers[0]
+    collapsed = base.branch()
+    for key in changedSince(state, base):
+        if key in state:
+            collapsed[key] = state[key].copy()
+        elif key in collapsed:
+            del collapsed[key]
+    return collapsed
+
+# Join the states reaching a block, on a layer over their common ancestor: a key takes its value in the last
+# state that has it, as the AST engine joins an if branch and an else branch. With preferInitialized, a key
+# initialized in some state is not overridden by [-1] (declared null) in a later one.
+def joinStates(states, preferInitialized=False):
+    ancestor = commonAncestor(states)
+    keys = {}
+    for state in states:
+        keys.update(changedSince(state, ancestor))
+    joined = ancestor.branch()
+    for key in keys:
+        value = None
+        for state in states:
+            if key in state:
+                v = state[key]
+                if value is None or not (preferInitialized and v == [-1] and value != [-1]):
+                    value = v
+        if value is None:
+            if key in joined:
+                del joined[key]
+        elif key not in ancestor or ancestor[key] != value:
+            joined[key] = value.copy()
+    return joined
+
+
+class CfgEngine:
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+
+    # Evaluate the body of a function on the analyzer's global dictionaries
+    def evaluateFunction(self, funcDec, passByRef):
+        analyzer = self.analyzer
+        cfg = buildCfg(funcDec.body)
+        funcName = funcDec.decl.name
+        # the state at the entry of the function is frozen, every state of the body is a layer over it
+        self.roots = (analyzer.globalAliasDictionary.fork(), analyzer.globalLocationDictionary.fork())
+        # < key=block index, value=(alias state, location state) at the end of the block >
+        self.exits = {}
+        worklist = [(cfg.entry.order, cfg.entry.index)]
+        queued = {cfg.entry.index}
+        while worklist:
+            order, index = heapq.heappop(worklist)
+            queued.discard(index)
+            block = cfg.blocks[index]
+            state = self.entryState(block)
+            if block.loop is not None and not self.admit(block.loop, state):
+                continue
+            if analyzer.budget is not None:
+                analyzer.checkBudget(*state)
+            for marker in block.markers:
+                if not any(loop.visits > 1 for loop in marker.enclosing):
+                    if type(marker) == Conditional:
+                        self.conditionalWarnings(marker, state)
+                    else:
+                        self.loopWarnings(marker, state)
+            if not self.evaluateBlock(block, state, funcName, passByRef):
+                continue
+            self.exits[index] = state
+            for successor in block.successors:
+                if successor.loop is not None and successor.loop.preheader is block:
+                    successor.loop.enter()
+                if successor.index not in queued:
+                    queued.add(successor.index)
+                    heapq.heappush(worklist, (successor.order, successor.index))
+
+        # the function's contribution is what changed at its exit (nothing when the exit is unreachable)
+        for dictionary, root, state in zip((analyzer.globalAliasDictionary, analyzer.globalLocationDictionary),
+                                           self.roots, self.exits.get(cfg.exit.index, self.roots)):
+            dictionary.restore(root)
+            for key in changedSince(state, root):
+                if key in state:
+                    dictionary[key] = state[key]
+                elif key in dictionary:
+                    del dictionary[key]
+
+    # The state a block starts from: a branch of its predecessor's, or the join of its predecessors'. A pass over a
+    # loop starts from the end of the one before, or from the preheader when the loop is entered, and the loop
+    # exits with the state at the end of its last pass: as in the AST engine, a loop is run at least once and
+    # every pass starts from the one before, not from their join with the path that skips the loop.
+    def entryState(self, block):
+        states = []
+        loop = block.loop
+        if loop is not None and loop.preheader is not None:
+            if loop.entered:
+                loop.entered = False
+                if loop.preheader.index in self.exits:
+                    states.append(self.exits[loop.preheader.index])
+            else:
+                states = self.passStates(block)
+        else:
+            for p in block.predecessors:
+                if p.loop is not None and p.loop in block.markers:
+                    states += self.passStates(p) or ([self.exits[p.index]] if p.index in self.exits else [])
+                elif p.index in self.exits:
+                    states.append(self.exits[p.index])
+        if not states:
+            states = [self.roots]
+        if len(states) == 1:
+            aliasState, locationState = states[0][0].branch(), states[0][1].branch()
+        else:
+            aliasState, locationState = self.join(states)
+        if depthOver(aliasState, self.roots[0]) > MAX_LAYERS:
+            aliasState = collapse(aliasState, self.roots[0])
+        if depthOver(locationState, self.roots[1]) > MAX_LAYERS:
+            locationState = collapse(locationState, self.roots[1])
+        return aliasState, locationState
+
+    # the states at the end of the last pass over the loop of header (along its back edges)
+    def passStates(self, header):
+        return [self.exits[p.index] for p in header.predecessors if p is not header.loop.preheader and p.index in self.exits]
+
+    def join(self, states):
+        return (joinStates([s[0] for s in states], preferInitialized=True), joinStates([s[1] for s in states]))
+
+    # Evaluate the statements of a block on its state. In a later iteration of a loop the warnings are dropped,
+    # and a statement that meets a state the transfer functions do not model drops the block with a
+    # "loop-pass-dropped" note for the innermost such loop, as the AST engine drops such a pass. returns whether
+    # the block was evaluated
+    def evaluateBlock(self, block, state, funcName, passByRef):
+        analyzer = self.analyzer
+        aliasState, locationState = state
+        if block.nullTested is not None:
+            self.assumeNull(block.nullTested, funcName, aliasState, locationState)
+        if not any(loop.visits > 1 for loop in block.enclosing):
+            for statement in block.statements:
+                analyzer.evaluateStatement(statement, funcName, passByRef, aliasState, locationState)
+            return True
+        warnings = analyzer.warnings
+        analyzer.warnings = type(warnings)(analyzer.aliasFuncs, analyzer.aliasVars)
+        try:
+            for statement in block.statements:
+                analyzer.evaluateStatement(statement, funcName, passByRef, aliasState, locationState)
+        except (KeyError, ValueError):
+            analyzer.warnings = warnings
+            line = next(loop.line for loop in reversed(block.enclosing) if loop.visits > 1)
+            analyzer.warnings.add("loop-pass-dropped", (), (line,))
+            return False
+        finally:
+            analyzer.warnings = warnings
+        return True
+
+    # The branch of a null test of name: the allocation it points to failed, it and its aliases point to nothing
+    # (as after a free, but the lines of the allocation are left as they are)
+    def assumeNull(self, name, funcName, aliasState, locationState):
+        alias = self.analyzer.aliasIds.get(funcName, {}).get(name)
+        if alias is None or alias not in aliasState or aliasState[alias][-1] == -1:
+            return
+        loc = aliasState[alias][-1]
+        if loc in locationState:
+            for a in locationState[loc]:
+                if a in aliasState:
+                    aliasState.appendTo(a, -1)
+            locationState.pop(loc)
+        else:
+            aliasState.appendTo(alias, -1)
+
+    # Whether a loop header is evaluated (again) with this state: not when its abstract state repeats one
+    # it was evaluated with before (widened after the analyzer's widening delay), nor over the iteration cap.
+    # In a later pass of an enclosing loop the loop is evaluated once, as the AST engine replays it.
+    def admit(self, loop, state):
+        analyzer = self.analyzer
+        loop.visits += 1
+        replay = any(enclosing.visits > 1 for enclosing in loop.enclosing)
+        if loop.visits > (1 if replay else analyzer.maxLoopIterations):
+            return False
+        reference = self.roots
+        if loop.preheader is not None and loop.preheader.index in self.exits:
+            reference = self.exits[loop.preheader.index]
+        aliasKeys = changedBetween([state[0], reference[0]])
+        locationKeys = changedBetween([state[1], reference[1]])
+        signature = analyzer.abstractState(state[0], state[1], aliasKeys, locationKeys)
+        widened = analyzer.abstractState(state[0], state[1], aliasKeys, locationKeys, widened=True)
+        if signature in loop.seen or (loop.visits > analyzer.wideningDelay and widened in loop.seenWidened):
+            return False
+        loop.seen.add(signature)
+        loop.seenWidened.add(widened)
+        return True
+
+    # the warnings of an if statement, as Analyzer.evaluateConditional generates them, at its join
+    def conditionalWarnings(self, record, joined):
+        before = self.exits.get(record.before.index)
+        ifState = self.exits.get(record.ifEnd.index) if record.ifEnd is not None else None
+        elseState = self.exits.get(record.elseEnd.index) if record.elseEnd is not None else None
+        if before is None or ifState is None or (record.hasElse and elseState is None):
+            return
+        locationBefore, ifLocations = before[1], ifState[1]
+        ifKeys = list(changedBetween([ifLocations, locationBefore]))
+        missingVars = []
+        if record.hasElse:
+            elseLocations = elseState[1]
+            elseKeys = list(changedBetween([elseLocations, locationBefore]))
+            for key in ifKeys + elseKeys:
+                if key in ifLocations and elseLocations.count(ifLocations[key]) == 0:
+                    missingVars.append(ifLocations[key])
+            for key in elseKeys + ifKeys:
+                if key in elseLocations and ifLocations.count(elseLocations[key]) == 0:
+                    missingVars.append(elseLocations[key])
+        else:
+            elseKeys = []
+            for key in ifKeys:
+                if key in locationBefore and ifLocations.count(locationBefore[key]) == 0:
+                    missingVars.append(locationBefore[key])
+        missingVars = [alias for aliases in missingVars for alias in aliases]
+
+        introducedVars = []
+        for key in dict.fromkeys(ifKeys + elseKeys):
+            if key in joined[1] and locationBefore.count(joined[1][key]) == 0:
+                introducedVars.extend(joined[1][key])
+        missingVars = [var for var in missingVars if var not in introducedVars]
+        self.analyzer.generateIfWarnings(introducedVars, missingVars, joined[0])
+
+    # the warnings of a loop, as Analyzer.evaluateLoop generates them, on the code after it
+    def loopWarnings(self, loop, after):
+        if loop.preheader is None or loop.preheader.index not in self.exits:
+            return
+        aliasBefore, aliasAfter = self.exits[loop.preheader.index][0], after[0]
+        keys = changedBetween([aliasAfter, aliasBefore])
+        self.analyzer.generateLoopWarnings({key: tuple(aliasBefore[key]) for key in keys if key in aliasBefore},
+                                           {key: aliasAfter[key] for key in keys if key in aliasAfter})
@@ -0,0 +1,389 @@
+# Function-granular parsing: a translation unit is cut into its top-level constructs (function definitions,
+# declarations) and every chunk is parsed on its own, so a file that was edited only needs its changed
+# chunks parsed again
+#
+# A chunk always starts at the beginning of a line and is parsed behind a `# <line>` directive, so the
+# coords of its nodes are the same as when the whole file is parsed. The parser has to know every typedef
+# name to parse a chunk, so the typedef chunks before it are parsed with it (and their nodes dropped).
+# A chunk whose text is unchanged but that moved up or down the file is reused with its line numbers
+# shifted. Whenever the chunks do not parse (a syntax error, or a construct the splitter cut wrong) the
+# whole file is parsed instead, so the result, and the error, are always those of a normal parse.
+#
+# FunctionChunks is the same split used to analyze a very large (or partly broken) file one function at a time
+# (see Analyzer.analyzeFunctions): the file is memory-mapped and only scanned up front, a function is parsed when
+# it is about to be evaluated and dropped after, and a function that does not parse is skipped on its own.
+
+import os
+import re
+import mmap
+
+from pycparser import c_ast
+
+from preprocessor import lineMarker
+
+# the tokens that matter to find where top-level constructs end
+TOKENS = re.compile(r"""(?P<comment>//[^\n]*|/\*.*?\*/)|(?P<literal>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')"""
+                    r"""|(?P<directive>^[ \t]*\#[^\n]*)|(?P<open>\{)|(?P<close>\})|(?P<end>;)|(?P<newline>\n)""",
+                    re.S | re.M)
+# a #line directive, or a line marker of the preprocessor's output: # <line> "<file>"
+LINE_DIRECTIVE = re.compile(r'[ \t]*#[ \t]*(?:line[ \t]+)?(\d+)(?:[ \t]+"((?:\\.|[^"\\])*)")?')
+TYPEDEF = re.compile(r"\btypedef\b")
+# an identifier followed by a parenthesis: a call, or the name a function definition defines
+CALL = re.compile(r"([A-Za-z_]\w*)\s*\(")
+ATTRIBUTE = re.compile(r"__attribute__\s*\(\(.*?\)\)|__declspec\s*\(.*?\)", re.S)
+# the words of a function's header followed by a parenthesis that are not its name
+NOT_NAMES = frozenset(("void", "char", "short", "int", "long", "float", "double", "signed", "unsigned", "_Bool",
+                       "const", "volatile", "restrict", "static", "extern", "inline", "sizeof", "_Alignas",
+                       "_Atomic", "__typeof__", "typeof"))
+# the same patterns for bytes, what a memory-mapped file is scanned with
+BYTES_PATTERNS = {p: re.compile(p.pattern.encode(), p.flags & ~re.UNICODE) for p in (TOKENS, LINE_DIRECTIVE, TYPEDEF, CALL)}
+
+def pattern(p, text):
+    return p if isinstance(text, str) else BYTES_PATTERNS[p]
+
+def decode(text):
+    return text if isinstance(text, str) else text.decode(errors="replace").replace("\r\n", "\n")
+
+# C source text with its comments blanked out, their newlines kept so the lines and columns of the rest are unchanged:
+# the parser does not read comments, the preprocessor removes them when there is one
+def blankComments(text):
+    if "//" not in text and "/*" not in text:
+        return text
+    return TOKENS.sub(lambda m: re.sub(r"[^\n]", " ", m.group()) if m.lastgroup == "comment" else m.group(), text)
+
+# (name, parameters) of a function definition's header: the name is its first identifier followed by a parenthesis,
+# past the types and attributes (None when it could not be told), the parameters the text after it
+def splitHeader(header):
+    header = ATTRIBUTE.sub(" ", header)
+    for m in CALL.finditer(header):
+        if m.group(1) not in NOT_NAMES:
+            return m.group(1), header[m.end():]
+    return None, ""
+
+
+class Chunk:
+    __slots__ = ("line", "text", "isFunction")
+
+    def __init__(self, line, text, isFunction):
+        # line of the file the chunk starts on
+        self.line = line
+        self.text = text
+        self.isFunction = isFunction
+
+
+class Span:
+    __slots__ = ("start", "end", "line", "lastLine", "filename", "head", "body")
+
+    def __init__(self, start, end, line, lastLine, filename, head, body):
+        # offsets of the chunk in the text
+        self.start = start
+        self.end = end
+        # lines of the file the chunk starts and ends on
+        self.line = line
+        self.lastLine = lastLine
+        # the file named by the last line marker before the chunk, None without one
+        self.filename = filename
+        # offsets of a function definition's header (after any comment before it) and of its body's '{',
+        # None when the chunk is not a function definition
+        self.head = head
+        self.body = body
+
+
+# Cut C source text (a str, or bytes such as a memory-mapped file) into chunks of whole lines, each ending
+# after a function body, a declaration's ';' or a preprocessor line. Constructs sharing a line end up in
+# the same chunk. Yields the Span of every chunk.
+def scanChunks(text):
+    newline, paren = ("\n", ")") if isinstance(text, str) else (b"\n", b")")
+    lineDirective = pattern(LINE_DIRECTIVE, text)
+    start = head = 0
+    startLine = line = 1
+    filename = startFile = None
+    depth = 0
+    body = None
+    # a construct ended, the chunk ends with its line unless more code follows on that line
+    ended = False
+    for m in pattern(TOKENS, text).finditer(text):
+        kind = m.lastgroup
+        if kind == "newline":
+            line += 1
+            if ended:
+                yield Span(start, m.end(), startLine, line - 1, startFile, head if body is not None else None, body)
+                start = head = m.end()
+                startLine = line
+                startFile = filename
+                body = None
+                ended = False
+            continue
+        if kind == "comment":
+            line += m.group().count(newline)
+            if depth == 0 and body is None:
+                head = m.end()
+            continue
+        ended = False
+        if kind == "literal":
+            continue
+        if kind == "directive":
+            ended = depth == 0
+            d = lineDirective.match(m.group())
+            if d is not None:
+                # the line after the directive is the one it names
+                line = int(d.group(1)) - 1
+                if d.group(2) is not None:
+                    filename = decode(d.group(2)).replace('\\"', '"').replace("\\\\", "\\")
+        elif kind == "open":
+            if depth == 0 and text[start:m.start()].rstrip().endswith(paren):
+                body = m.start()
+            depth += 1
+        elif kind == "close":
+            depth -= 1
+            ended = depth == 0 and body is not None
+        else:
+            ended = depth == 0
+    if text[start:].strip():
+        yield Span(start, len(text), startLine, line, startFile, head if body is not None else None, body)
+
+# Cut C source text into Chunks (see scanChunks)
+def splitChunks(text):
+    return [Chunk(span.line, text[span.start:span.end], span.body is not None) for span in scanChunks(text)]
+
+# every coord of the nodes and their children, once each (coords can be shared between nodes)
+def collectCoords(nodes):
+    coords = {}
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if node.coord is not None:
+            coords[id(node.coord)] = node.coord
+        stack.extend(child for name, child in node.children())
+    return list(coords.values())
+
+
+class ChunkParser:
+    # parser is the CParser chunks are parsed with
+    def __init__(self, parser):
+        self.parser = parser
+        # < key=filename, value=< key=(typedefs, chunk text), value=[line, top-level nodes, their coords] > >
+        # only the chunks of the last version of each file are kept
+        self.files = {}
+        # < key=typedefs text, value=number of top-level nodes it parses to >
+        self.prefixes = {}
+        # chunks parsed and reused by the last parse(), and whether it had to parse the whole file instead
+        self.parsed = 0
+        self.reused = 0
+        self.wholeFile = False
+
+    def prefixLength(self, prefix, filename):
+        if prefix not in self.prefixes:
+            self.prefixes[prefix] = len(self.parser.parse(prefix, filename=filename).ext)
+        return self.prefixes[prefix]
+
+    def parseChunk(self, chunk, prefix, filename):
+        text = prefix + "\n# " + str(chunk.line) + "\n" + chunk.text
+        return self.parser.parse(text, filename=filename).ext[self.prefixLength(prefix, filename):]
+
+    # the ast of the whole text, parsing only the chunks that changed since the last call for this file
+    def parse(self, text, filename='<none>'):
+        old = self.files.get(filename, {})
+        new = {}
+        ext = []
+        typedefs = []
+        self.parsed = self.reused = 0
+        self.wholeFile = False
+        try:
+            for chunk in splitChunks(text):
+                prefix = "\n".join(typedefs)
+                key = (prefix, chunk.text)
+                # the same text twice in a file is two chunks
+                entry = old.pop(key, None) if key not in new else None
+                if entry is None:
+                    entry = [chunk.line, self.parseChunk(chunk, prefix, filename), None]
+                    self.parsed += 1
+                else:
+                    if entry[0] != chunk.line:
+                        # collected the first time the chunk moves, a chunk that moved once tends to move again
+                        if entry[2] is None:
+                            entry[2] = collectCoords(entry[1])
+                        offset = chunk.line - entry[0]
+                        for coord in entry[2]:
+                            coord.line += offset
+                        entry[0] = chunk.line
+                    self.reused += 1
+                new[key] = entry
+                ext += entry[1]
+                if not chunk.isFunction and TYPEDEF.search(chunk.text):
+                    typedefs.append(chunk.text)
+        except Exception:
+            # the whole file gives the real error (or parses where the chunks did not)
+            self.files.pop(filename, None)
+            self.wholeFile = True
+            return self.parser.parse(text, filename=filename)
+        self.files[filename] = new
+        return c_ast.FileAST(ext)
+
+    # forget the chunks of a file
+    def discard(self, filename):
+        self.files.pop(filename, None)
+
+
+# the parser of a worker process parsing functions for FunctionChunks
+workerParser = None
+
+def functionDefinitions(nodes):
+    return [node for node in nodes if type(node) == c_ast.FuncDef]
+
+def parseInWorker(text, filename, skip):
+    global workerParser
+    if workerParser is None:
+        from pycparser import c_parser
+        workerParser = c_parser.CParser()
+    return functionDefinitions(workerParser.parse(text, filename=filename).ext[skip:])
+
+
+class FunctionChunk:
+    __slots__ = ("position", "span", "line", "name", "calls", "typedefs")
+
+    def __init__(self, position, span, line, name, calls, typedefs):
+        # position among the function chunks of the file
+        self.position = position
+        self.span = span
+        # line the definition starts on (past the blank lines and comments of the chunk before it)
+        self.line = line
+        # the name the chunk's header defines (None when it could not be told), and the names it calls
+        self.name = name
+        self.calls = calls
+        # number of typedef names declared before the chunk
+        self.typedefs = typedefs
+
+
+# The function definitions of a file, parsed one at a time
+# Up front the file is only scanned: the chunks of its function definitions, the name each one defines and the
+# names it calls (a lexical over-approximation of the call graph, enough to evaluate callees first), and the
+# typedef names declared before each one. The typedef chunks are the only ones parsed then, for their names: a
+# function is parsed behind a `typedef int <name>;` for every one of them, which is all the parser needs.
+# With jobs > 1 the functions are parsed ahead in a pool of processes, in the order they will be evaluated.
+# Used as a context manager, which unmaps the file and stops the pool.
+class FunctionChunks:
+    # parser is the CParser of the analyzer, preprocessor an optional preprocessor.Preprocessor (the file is then
+    # read and preprocessed instead of memory-mapped)
+    def __init__(self, filename, parser, preprocessor=None, jobs=1):
+        self.filename = filename
+        self.parser = parser
+        self.jobs = jobs
+        self.mapped = None
+        if preprocessor is not None:
+            with open(filename) as f:
+                self.source = preprocessor.preprocess(f.read(), filename)
+        else:
+            with open(filename, "rb") as f:
+                # an empty file cannot be mapped
+                if os.fstat(f.fileno()).st_size > 0:
+                    self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.source = self.mapped if self.mapped is not None else b""
+        self.typedefNames = []
+        self.functions = []
+        # < key=number of typedef names, value=prefix declaring them >
+        self.prefixes = {}
+        self.pool = None
+        # < key=position, value=future of its parse > and the positions to parse ahead, in order
+        self.pending = {}
+        self.ahead = []
+        self.scan()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+
+    def scan(self):
+        source = self.source
+        typedef = pattern(TYPEDEF, source)
+        call = pattern(CALL, source)
+        known = set()
+        for span in scanChunks(source):
+            if span.body is None:
+                if typedef.search(source, span.start, span.end):
+                    for name in self.parseTypedefs(span):
+                        if name not in known:
+                            known.add(name)
+                            self.typedefNames.append(name)
+                continue
+            calls = set(decode(name) for name in call.findall(source, span.body, span.end))
+            self.functions.append(FunctionChunk(len(self.functions), span, self.headerLine(span), self.headerName(span),
+                                                calls, len(self.typedefNames)))
+
+    def headerLine(self, span):
+        newline = "\n" if isinstance(self.source, str) else b"\n"
+        header = self.source[span.start:span.body]
+        code = header[span.head - span.start:]
+        return span.line + header[:span.head - span.start].count(newline) + code[:len(code) - len(code.lstrip())].count(newline)
+
+    # the name a function definition's header defines (see splitHeader)
+    def headerName(self, span):
+        return splitHeader(decode(self.source[span.head:span.body]))[0]
+
+    # the names of the typedefs of a declaration chunk (none when it does not parse)
+    def parseTypedefs(self, span):
+        prefix, skip = self.prefix(len(self.typedefNames))
+        try:
+            nodes = self.parser.parse(prefix + self.text(span), filename=self.filename).ext[skip:]
+        except Exception:
+            return []
+        return [node.name for node in nodes if type(node) == c_ast.Typedef]
+
+    # the declarations of the first count typedef names, and the number of nodes they parse to
+    def prefix(self, count):
+        if count not in self.prefixes:
+            self.prefixes[count] = "".join("typedef int " + name + ";\n" for name in self.typedefNames[:count])
+        return self.prefixes[count], count
+
+    # the text of a chunk behind the line marker of where it starts, without its comments: the comments before a
+    # function definition are part of its chunk, and would keep it from parsing
+    def text(self, span):
+        return lineMarker(span.line, span.filename or self.filename) + blankComments(decode(self.source[span.start:span.end]))
+
+    # The call graph of the chunks, < index=position, value=sorted positions of the chunks it may call >
+    # functionIndex maps names to the chunk a call resolves to
+    def callGraph(self, functionIndex):
+        graph = []
+        for chunk in self.functions:
+            graph.append(sorted(functionIndex[name].position for name in chunk.calls
+                                if type(functionIndex.get(name)) == FunctionChunk))
+        return graph
+
+    # the positions the chunks will be asked for in, so they can be parsed ahead
+    def schedule(self, positions):
+        if self.jobs > 1 and len(positions) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(max_workers=self.jobs)
+            self.ahead = list(reversed(positions))
+
+    # keep a few parses per worker running ahead of the evaluation
+    def submitAhead(self):
+        while self.ahead and len(self.pending) < self.jobs * 2:
+            chunk = self.functions[self.ahead.pop()]
+            prefix, skip = self.prefix(chunk.typedefs)
+            self.pending[chunk.position] = self.pool.submit(parseInWorker, prefix + self.text(chunk.span),
+                                                            self.filename, skip)
+
+    # The FuncDefs of the chunk at a position, raises the parse error of a chunk that does not parse
+    def parse(self, position):
+        if self.pool is not None:
+            self.submitAhead()
+            future = self.pending.pop(position, None)
+            if future is not None:
+                try:
+                    return future.result()
+                finally:
+                    self.submitAhead()
+        chunk = self.functions[position]
+        prefix, skip = self.prefix(chunk.typedefs)
+        return functionDefinitions(self.parser.parse(prefix + self.text(chunk.span), filename=self.filename).ext[skip:])
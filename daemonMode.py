@@ -0,0 +1,187 @@
+# Daemon mode: a long-lived process that re-analyzes files as they are edited
+#
+# A Daemon keeps, for every file it has seen, the parsed chunks of its last version (see chunkParser) and the
+# result of every function in an in-memory summary cache (see summaryCache). After an edit only the changed
+# chunks are parsed again, and only the functions whose code changed, or whose callees' summaries changed,
+# are evaluated again; every other function is restored from the cache.
+#
+# It is driven either by polling files on disk (--watch) or by an editor over the Language Server Protocol
+# on stdin/stdout (--lsp), which publishes the leaks and warnings of every open document as diagnostics.
+
+import os
+import sys
+import json
+import time
+
+from memLeakTracker import Analyzer, AnalysisResult, generateOutput
+from chunkParser import ChunkParser
+import summaryCache
+import diagnostics
+
+
+class Daemon:
+    # analyzerOptions are keyword arguments of the analyzer (see Analyzer)
+    def __init__(self, analyzerOptions=None):
+        self.summaryCache = summaryCache.MemorySummaryCache()
+        self.analyzer = Analyzer(self.summaryCache, **(analyzerOptions or {}))
+        self.chunkParser = ChunkParser(self.analyzer.parser)
+        # < key=function name, value=line it starts on > of the file analyzed last
+        self.functionLines = {}
+
+    # analyze the current text of a file, returns its AnalysisResult
+    def analyze(self, filename, text):
+        start = time.perf_counter()
+        misses = self.summaryCache.misses
+        hits = self.summaryCache.hits
+        self.functionLines = {}
+        try:
+            if self.analyzer.preprocessor is not None:
+                # the chunks' line numbers are those of the file, not of its preprocessed text
+                ast = self.analyzer.parse(text, filename)
+            else:
+                ast = self.chunkParser.parse(text, filename)
+            result = self.analyzer.analyzeAst(ast, filename)
+            for funcDec in ast.ext:
+                if hasattr(funcDec, "body"):
+                    self.functionLines.setdefault(str(funcDec.decl.name), funcDec.decl.coord.line)
+        except Exception as e:
+            result = AnalysisResult(filename, [], [], [], error=type(e).__name__ + ": " + str(e))
+        result.seconds = time.perf_counter() - start
+        result.cacheStats = {"summary cache": (self.summaryCache.hits - hits, self.summaryCache.misses - misses)}
+        return result
+
+    # forget a file that was closed or deleted
+    def forget(self, filename):
+        self.chunkParser.discard(filename)
+
+    # one line about the last analysis, for the log
+    def describe(self, result):
+        restored, evaluated = result.cacheStats["summary cache"]
+        if self.analyzer.preprocessor is not None or self.chunkParser.wholeFile:
+            parsed = "parsed the whole file"
+        else:
+            parsed = ("parsed %d of %d chunks" % (self.chunkParser.parsed, self.chunkParser.parsed + self.chunkParser.reused))
+        return ("%s: %.1f ms, %s, evaluated %d of %d functions"
+                % (result.filename, result.seconds * 1000, parsed, evaluated, restored + evaluated))
+
+
+# Poll the inputs (files, directories, globs, a compile_commands.json) every `interval` seconds and print
+# the report of every file that changed, until interrupted
+def watch(inputs, interval=0.2, outputFormat="text", analyzerOptions=None):
+    import projectMode
+    daemon = Daemon(analyzerOptions)
+    # < key=filename, value=(modification time, size) when it was last analyzed >
+    stamps = {}
+    try:
+        while True:
+            for filename in projectMode.collectFiles(inputs):
+                try:
+                    st = os.stat(filename)
+                    stamp = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    stamp = None
+                if stamps.get(filename) == stamp:
+                    continue
+                stamps[filename] = stamp
+                if stamp is None:
+                    daemon.forget(filename)
+                    continue
+                with open(filename) as f:
+                    text = f.read()
+                result = daemon.analyze(filename, text)
+                if outputFormat == "text":
+                    print("=== " + filename)
+                    if result.error is not None:
+                        print("\nERROR: " + result.error + "\n")
+                    else:
+                        generateOutput(result)
+                else:
+                    generateOutput(result, outputFormat)
+                sys.stdout.flush()
+                print(daemon.describe(result), file=sys.stderr)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+# Language Server Protocol messages: a Content-Length header, a blank line and a JSON body
+def readMessage(stream):
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, sep, value = line.decode("ascii").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    if length is None:
+        return {}
+    return json.loads(stream.read(length))
+
+def writeMessage(stream, message):
+    body = json.dumps(message).encode("utf-8")
+    stream.write(b"Content-Length: " + str(len(body)).encode("ascii") + b"\r\n\r\n" + body)
+    stream.flush()
+
+def uriToPath(uri):
+    from urllib.parse import urlparse, unquote
+    from urllib.request import url2pathname
+    parsed = urlparse(uri)
+    if parsed.scheme != "file":
+        return uri
+    return url2pathname(unquote(parsed.path))
+
+# Serve the diagnostics of the open documents to an editor until it sends exit (or closes stdin)
+# returns the process exit code the protocol asks for
+def serveLsp(inStream=None, outStream=None, analyzerOptions=None):
+    inStream = inStream or sys.stdin.buffer
+    outStream = outStream or sys.stdout.buffer
+    daemon = Daemon(analyzerOptions)
+    shutdown = False
+
+    def publish(uri, text):
+        if text is None:
+            lspDiagnostics = []
+        else:
+            result = daemon.analyze(uriToPath(uri), text)
+            lspDiagnostics = diagnostics.toLsp(result, daemon.functionLines)
+            print(daemon.describe(result), file=sys.stderr)
+        writeMessage(outStream, {"jsonrpc": "2.0", "method": "textDocument/publishDiagnostics",
+                                 "params": {"uri": uri, "diagnostics": lspDiagnostics}})
+
+    while True:
+        message = readMessage(inStream)
+        if message is None:
+            return 0 if shutdown else 1
+        method = message.get("method")
+        params = message.get("params") or {}
+        if method == "initialize":
+            writeMessage(outStream, {"jsonrpc": "2.0", "id": message.get("id"), "result": {
+                # full document sync, every change sends the whole text
+                "capabilities": {"textDocumentSync": {"openClose": True, "change": 1, "save": {"includeText": True}}},
+                "serverInfo": {"name": "memLeakTracker"},
+            }})
+        elif method == "shutdown":
+            shutdown = True
+            writeMessage(outStream, {"jsonrpc": "2.0", "id": message.get("id"), "result": None})
+        elif method == "exit":
+            return 0 if shutdown else 1
+        elif method == "textDocument/didOpen":
+            document = params["textDocument"]
+            publish(document["uri"], document["text"])
+        elif method == "textDocument/didChange":
+            # with full sync the last change holds the whole new text
+            publish(params["textDocument"]["uri"], params["contentChanges"][-1]["text"])
+        elif method == "textDocument/didSave":
+            if "text" in params:
+                publish(params["textDocument"]["uri"], params["text"])
+        elif method == "textDocument/didClose":
+            uri = params["textDocument"]["uri"]
+            daemon.forget(uriToPath(uri))
+            publish(uri, None)
+        elif method is not None and "id" in message:
+            writeMessage(outStream, {"jsonrpc": "2.0", "id": message["id"],
+                                     "error": {"code": -32601, "message": "method not found: " + method}})
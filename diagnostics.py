@@ -0,0 +1,251 @@
+# Diagnostics: the leaks and warnings found by an analysis run
+#
+# A diagnostic is a small record (its kind, the alias ids it is about and its line numbers), not a message.
+# Records are deduplicated on those fields with a hash lookup, and the message text is only built when a
+# record is printed. The same records are turned into JSON or SARIF without going through the text.
+
+
+def formatAliasName(funcName, alias):
+    return funcName + "." + alias
+
+def printFormatAlias(alias):
+    return "'" + alias + "'"
+
+
+# < key=kind, value=(names of its line numbers, SARIF level, short description) >
+KINDS = {
+    "leak": (("allocation", "lastReference"), "error",
+             "Allocated memory is never freed"),
+    "leak-unreferenced": (("allocation", "lastReference"), "error",
+                          "Allocated memory is never freed and nothing points to it"),
+    "if-allocated": (("allocation", "lastReference"), "warning",
+                     "Memory allocated in a condition block is not freed before the block's end"),
+    "if-freed": ((), "warning",
+                 "Memory is freed in one condition block but not the other"),
+    "loop-allocated": (("allocation",), "warning",
+                       "Memory allocated in a loop is not freed before the loop's end"),
+    "loop-freed": (("free",), "warning",
+                   "Memory is freed inside a loop it was not declared in"),
+    "loop-reallocated": ((), "warning",
+                         "Memory is reallocated inside a loop it was not declared in"),
+    "unparsed-function": (("start", "end"), "warning",
+                          "A function could not be parsed and was not analyzed"),
+    "loop-pass-dropped": (("loop",), "note",
+                          "A later pass over a loop reached a state the analysis does not model and was dropped"),
+    "analysis-degraded": (("function",), "note",
+                          "A function went over its analysis budget and was analyzed coarsely"),
+    "analysis-incomplete": (("function",), "warning",
+                            "A function went over its analysis budget and was not analyzed"),
+}
+
+def render(kind, names, lines):
+    if kind == "leak":
+        return ("LEAK: Memory allocated at line " + str(lines[0]) + " was never freed"
+                + "\n\t-> Variables pointing to this memory location: " + ", ".join(map(printFormatAlias, names))
+                + "\n\t-> Last reference occurred at line " + str(lines[1]))
+    if kind == "leak-unreferenced":
+        return ("LEAK: Memory allocated at line " + str(lines[0]) + " was never freed and has nothing pointing to it"
+                + "\n\t-> Last reference occurred at line " + str(lines[1]))
+    if kind == "unparsed-function":
+        return "WARNING: the function at lines " + str(lines[0]) + "-" + str(lines[1]) + " could not be parsed and was not analyzed"
+    if kind == "loop-pass-dropped":
+        return ("NOTE: a later pass over the loop at line " + str(lines[0]) + " reached a state the analysis does not model and was dropped"
+                + "\n\t-> The state after the loop is that of the passes before")
+    if kind == "analysis-degraded":
+        return ("NOTE: the function at line " + str(lines[0]) + " went over its analysis budget and was analyzed coarsely"
+                + "\n\t-> Its loops were evaluated in a single pass and its conditionals nested past the limit were skipped")
+    if kind == "analysis-incomplete":
+        return ("WARNING: the function at line " + str(lines[0]) + " went over its analysis budget and was not analyzed"
+                + "\n\t-> Its leaks and warnings are not reported")
+    w = "WARNING: variable " + printFormatAlias(names[0])
+    if kind == "if-allocated":
+        w += " was allocated inside of a condition block but was not freed before the condition block's end"
+        # no lines when the variable no longer points to the memory after the join
+        if lines:
+            w += ("\n\t-> Allocation occurred at line " + str(lines[0])
+                  + "\n\t-> Last reference occurred at line " + str(lines[1]))
+        return w
+    if kind == "if-freed":
+        return w + " was freed inside one of the condition blocks but not the other block"
+    if kind == "loop-allocated":
+        return (w + " was allocated inside of a loop but was not freed before the loop's end"
+                + "\n\t-> Allocation occurred at line " + str(lines[0]))
+    if kind == "loop-freed":
+        return (w + " was freed inside of a loop it was not declared in"
+                + "\n\t-> Free occurred at line " + str(lines[0]))
+    if kind == "loop-reallocated":
+        return w + " was reallocated inside of a loop it was not declared in"
+    raise ValueError("unknown diagnostic kind " + repr(kind))
+
+
+class Diagnostic:
+    __slots__ = ("store", "kind", "aliases", "lines")
+
+    def __init__(self, store, kind, aliases, lines):
+        self.store = store
+        self.kind = kind
+        # tuple of alias ids, resolved to names through the store
+        self.aliases = aliases
+        # tuple of line numbers, named by KINDS[kind]
+        self.lines = lines
+
+    def names(self):
+        return [self.store.aliasName(alias) for alias in self.aliases]
+
+    # the line the diagnostic points at (None when it has no line)
+    def line(self):
+        return self.lines[0] if self.lines else None
+
+    def __str__(self):
+        return render(self.kind, self.names(), self.lines)
+
+    def toDict(self):
+        return {
+            "kind": self.kind,
+            "variables": self.names(),
+            "lines": dict(zip(KINDS[self.kind][0], self.lines)),
+            "message": str(self),
+        }
+
+
+# Insertion ordered set of diagnostics
+# aliasFuncs and aliasVars are the alias id tables of the Analyzer run the diagnostics come from
+class DiagnosticStore:
+    def __init__(self, aliasFuncs, aliasVars):
+        self.aliasFuncs = aliasFuncs
+        self.aliasVars = aliasVars
+        self.records = []
+        # < key=(kind, aliases, lines), value=record >
+        self.index = {}
+
+    def aliasName(self, alias):
+        return formatAliasName(self.aliasFuncs[alias], self.aliasVars[alias])
+
+    # add a diagnostic unless the same one is already there
+    def add(self, kind, aliases, lines=()):
+        key = (kind, aliases, lines)
+        if key not in self.index:
+            record = Diagnostic(self, kind, aliases, lines)
+            self.index[key] = record
+            self.records.append(record)
+
+    # drop the records from position start on, as if they were never added
+    def truncate(self, start):
+        for record in self.records[start:]:
+            del self.index[(record.kind, record.aliases, record.lines)]
+        del self.records[start:]
+
+    # drop the records from position start on that keep() rejects (they stay known, adding one again does nothing)
+    def filterFrom(self, start, keep):
+        self.records[start:] = [record for record in self.records[start:] if keep(record)]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    # the message of every diagnostic, in order
+    def texts(self):
+        return [str(record) for record in self.records]
+
+
+# Language Server Protocol severity of each SARIF level
+LSP_SEVERITIES = {"error": 1, "warning": 2, "note": 3}
+
+# The diagnostics of a result as LSP Diagnostic objects (LSP lines are 0-based)
+# functionLines maps function names to their first line: a diagnostic without a line of its own points at
+# the function of its first variable
+def toLsp(result, functionLines=None):
+    def lineRange(line, character=0):
+        line = max((line or 1) - 1, 0)
+        return {"start": {"line": line, "character": character}, "end": {"line": line + 1, "character": 0}}
+    if result.error is not None:
+        # parse errors look like "ParseError: file.c:12:5: before: }"
+        import re
+        m = re.search(r":(\d+):(\d+):", result.error)
+        return [{
+            "range": lineRange(int(m.group(1)), int(m.group(2)) - 1) if m else lineRange(None),
+            "severity": LSP_SEVERITIES["error"],
+            "source": "memLeakTracker",
+            "message": result.error,
+        }]
+    lspDiagnostics = []
+    for d in list(result.leaks) + list(result.warnings):
+        line = d.line()
+        if line is None and d.aliases and functionLines:
+            line = functionLines.get(d.store.aliasFuncs[d.aliases[0]])
+        lspDiagnostics.append({
+            "range": lineRange(line),
+            "severity": LSP_SEVERITIES[KINDS[d.kind][1]],
+            "code": d.kind,
+            "source": "memLeakTracker",
+            "message": str(d),
+        })
+    return lspDiagnostics
+
+def resultToDict(result):
+    return fileToDict(result.filename, result.error, result.leaks, result.warnings)
+
+# the JSON object of a file with only some of its diagnostics (see outputStream.JsonWriter)
+def fileToDict(filename, error, leaks, warnings):
+    return {
+        "file": filename,
+        "error": error,
+        "leaks": [d.toDict() for d in leaks],
+        "warnings": [d.toDict() for d in warnings],
+    }
+
+def toJson(results):
+    import json
+    return json.dumps([resultToDict(result) for result in results], indent=2)
+
+def sarifTool():
+    return {"driver": {"name": "memLeakTracker",
+                       "rules": [{"id": kind, "shortDescription": {"text": KINDS[kind][2]}} for kind in KINDS]}}
+
+# the SARIF result of a diagnostic of filename
+def sarifResult(filename, d):
+    physicalLocation = {"artifactLocation": {"uri": filename}}
+    if d.line() is not None:
+        physicalLocation["region"] = {"startLine": d.line()}
+    return {
+        "ruleId": d.kind,
+        "level": KINDS[d.kind][1],
+        "message": {"text": str(d)},
+        "locations": [{"physicalLocation": physicalLocation}],
+    }
+
+# the SARIF notification of a file that failed
+def sarifNotification(result):
+    return {
+        "level": "error",
+        "message": {"text": result.error},
+        "locations": [{"physicalLocation": {"artifactLocation": {"uri": result.filename}}}],
+    }
+
+# One SARIF 2.1.0 log for the results of any number of files
+def toSarif(results):
+    sarifResults = []
+    notifications = []
+    for result in results:
+        if result.error is not None:
+            notifications.append(sarifNotification(result))
+            continue
+        for d in list(result.leaks) + list(result.warnings):
+            sarifResults.append(sarifResult(result.filename, d))
+    run = {
+        "tool": sarifTool(),
+        "results": sarifResults,
+    }
+    if notifications:
+        run["invocations"] = [{"executionSuccessful": False, "toolExecutionNotifications": notifications}]
+    import json
+    return json.dumps({
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [run],
+    }, indent=2)
@@ -0,0 +1,211 @@
+# Diff mode: analyze only the functions a change touches, and the callers it can affect
+#
+# The changed lines of every file come from a unified diff (or `git diff` over a revision range). A function is
+# changed when one of its lines is, its extent running from the line of its name to the line before the next
+# top-level construct. The callers whose analysis depends on a changed function are added: a caller only sees
+# the PassByReference summary of a function with pointer parameters (or the signature of one), so the callers
+# of such functions are added, and theirs in turn while they have pointer parameters too. Only these functions
+# are reported. The callees whose summaries they read are evaluated with them (or restored from the summary
+# cache) and every other function of the file is not evaluated at all.
+#
+# A baseline is the list of diagnostics of an earlier run (see writeBaseline). Diagnostics are matched against
+# it by file, kind and variables, not by line, since lines move with every edit; the ones in the baseline are
+# not reported, so the report of a change only shows what it introduced.
+
+import os
+import re
+import json
+import bisect
+import subprocess
+from collections import Counter
+
+from pycparser import c_ast
+
+import callGraph
+
+# @@ -<old start>[,<old count>] +<new start>[,<new count>] @@
+HUNK = re.compile(r"@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# part of every baseline, a baseline of another format is rejected
+BASELINE_VERSION = 1
+
+
+class DiffError(Exception):
+    pass
+
+
+# < key=path, value=sorted list of changed lines > of the files a unified diff changes, lines of the new
+# version of each file. A deletion marks the lines on both sides of it. Deleted files are left out.
+def parseDiff(text):
+    changes = {}
+    lines = set()
+    line = 0
+    # rows of the current hunk still to come, on the old and the new side
+    oldLeft = newLeft = 0
+    for row in text.splitlines():
+        if oldLeft > 0 or newLeft > 0:
+            if row.startswith("+"):
+                lines.add(line)
+                line += 1
+                newLeft -= 1
+            elif row.startswith("-"):
+                lines.update((line - 1, line))
+                oldLeft -= 1
+            elif not row.startswith("\\"):
+                line += 1
+                oldLeft -= 1
+                newLeft -= 1
+            continue
+        if row.startswith("+++ "):
+            path = row[4:].split("\t")[0].strip()
+            if path.startswith("b/"):
+                path = path[2:]
+            # the lines of a deleted file are counted and dropped
+            lines = set() if path == "/dev/null" else changes.setdefault(os.path.normpath(path), set())
+        else:
+            m = HUNK.match(row)
+            if m is not None:
+                oldLeft = int(m.group(1) or 1)
+                newLeft = int(m.group(3) or 1)
+                # the start of a hunk that adds no lines (a deletion without context, as git diff -U0 writes it)
+                # is the line before it
+                line = int(m.group(2)) + (1 if newLeft == 0 else 0)
+    return {path: sorted(lines) for path, lines in changes.items() if lines}
+
+def readDiff(path):
+    if path == "-":
+        import sys
+        return parseDiff(sys.stdin.read())
+    with open(path) as f:
+        return parseDiff(f.read())
+
+# the changes of a git revision range (or of the working tree since a revision), paths relative to the current
+# directory
+def gitChanges(revisions):
+    try:
+        process = subprocess.run(["git", "diff", "--no-color", "--no-ext-diff", "--relative", "-U0", revisions, "--"],
+                                 capture_output=True, text=True)
+    except OSError as e:
+        raise DiffError("cannot run git: " + str(e))
+    if process.returncode != 0:
+        raise DiffError((process.stderr.strip().splitlines() or ["git diff failed"])[0])
+    return parseDiff(process.stdout)
+
+# the path a file is known by in changes and baselines
+def normalizePath(filename):
+    return os.path.normpath(os.path.relpath(filename))
+
+def fingerprint(d):
+    return (d.kind, tuple(sorted(d.names())))
+
+
+def readBaseline(path):
+    try:
+        with open(path) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError) as e:
+        raise DiffError("cannot read baseline " + path + ": " + str(e))
+    if baseline.get("version") != BASELINE_VERSION:
+        raise DiffError(path + " is not a baseline of this version of the tracker")
+    return {filename: Counter((kind, tuple(names)) for kind, names in entries)
+            for filename, entries in baseline["files"].items()}
+
+# save the diagnostics of the results as a baseline
+def writeBaseline(results, path):
+    files = {}
+    for result in results:
+        if result.error is None:
+            files[normalizePath(result.filename)] = [[kind, list(names)] for kind, names in
+                                                     map(fingerprint, list(result.leaks) + list(result.warnings))]
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": BASELINE_VERSION, "files": files}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def hasPointerParams(funcDec):
+    args = funcDec.decl.type.args
+    return args is not None and any(type(getattr(param, "type", None)) == c_ast.PtrDecl for param in args.params)
+
+def closure(graph, start, follow):
+    seen = set(start)
+    stack = list(start)
+    while stack:
+        node = stack.pop()
+        for other in graph[node]:
+            if other not in seen and follow(other):
+                seen.add(other)
+                stack.append(other)
+    return seen
+
+
+# What the Analyzer evaluates and reports of every file in diff mode (the diffScope option of Analyzer)
+# changes maps paths to their changed lines (see parseDiff), baseline paths to the Counter of the fingerprints
+# of their diagnostics in the baseline (see readBaseline)
+class DiffScope:
+    def __init__(self, changes, baseline=None):
+        self.changes = changes
+        self.baseline = baseline or {}
+        # of the file being analyzed: names of the functions reported, their line extents and the baseline
+        # diagnostics not matched yet
+        self.reported = set()
+        self.extents = []
+        self.remaining = Counter()
+
+    # The functions to evaluate among the FuncDefs of a file (analyzer.functionIndex is already built)
+    def select(self, analyzer, ast, filename, functions):
+        path = normalizePath(filename)
+        self.remaining = Counter(self.baseline.get(path, ()))
+        changed = self.changes.get(path, ())
+        extents = self.functionExtents(ast, filename, functions)
+        graph = callGraph.buildCallGraph(functions, analyzer.functionIndex)
+        callers = [[] for funcDec in functions]
+        for caller, callees in enumerate(graph):
+            for callee in callees:
+                callers[callee].append(caller)
+        touched = set()
+        summaryChanged = set()
+        for i, (start, end) in enumerate(extents):
+            if any(start <= line <= end for line in changed):
+                touched.add(i)
+                body = functions[i].body.coord.line if functions[i].body.coord is not None else start
+                if hasPointerParams(functions[i]) or any(start <= line <= body for line in changed):
+                    summaryChanged.add(i)
+        # the callers of a function whose summary changed, and theirs in turn while they have a summary too
+        affected = set()
+        stack = list(summaryChanged)
+        while stack:
+            for caller in callers[stack.pop()]:
+                if caller not in affected:
+                    affected.add(caller)
+                    if hasPointerParams(functions[caller]):
+                        stack.append(caller)
+        reported = touched | affected
+        # the callees whose summaries the reported functions read
+        needed = closure(graph, reported, lambda i: hasPointerParams(functions[i]))
+        self.reported = {str(functions[i].decl.name) for i in reported}
+        self.extents = [extents[i] for i in sorted(reported)]
+        return [functions[i] for i in sorted(needed)]
+
+    # (first line, last line) of every function: from its name to the line before the next top-level construct
+    # of the file (headers spliced in by the preprocessor have coords of their own files)
+    def functionExtents(self, ast, filename, functions):
+        starts = sorted(node.coord.line for node in ast.ext if node.coord is not None and node.coord.file == filename)
+        extents = []
+        for funcDec in functions:
+            start = funcDec.decl.coord.line
+            following = bisect.bisect_right(starts, start)
+            extents.append((start, starts[following] - 1 if following < len(starts) else float("inf")))
+        return extents
+
+    # true when a diagnostic of the file is reported: it is about a reported function and not in the baseline
+    def keep(self, d):
+        if d.aliases:
+            if d.store.aliasFuncs[d.aliases[0]] not in self.reported:
+                return False
+        elif d.lines and not any(start <= d.lines[0] <= end for start, end in self.extents):
+            return False
+        key = fingerprint(d)
+        if self.remaining[key] > 0:
+            self.remaining[key] -= 1
+            return False
+        return True
@@ -0,0 +1,119 @@
+# Entry point reachability: only the functions an entry function (main by default) can reach are analyzed
+#
+# A function is reachable from the entries of a file when it is one of them, or when a reachable function or a
+# top-level declaration (an initializer such as a table of function pointers) names it: a call, or a pointer to it
+# passed or stored. Reachability is a walk from the entries that only ever looks at the functions it reaches, the
+# Analyzer then evaluates them callees first as usual, so every reachable callee is evaluated once and its summary
+# is there for all its callers. The other functions are dead code as far as the entries go and are not evaluated,
+# or, with the unreachable pass, evaluated after all the reachable ones and reported after them. A file without
+# any of the entries (a library file) has nothing to start from and is analyzed in full.
+#
+# In per-function mode the walk is lexical (see chunkParser.FunctionChunks): every identifier of a reachable
+# function's body that names a function of the file is followed, and only the reachable chunks are parsed.
+
+import re
+
+from pycparser import c_ast
+
+import chunkParser
+from chunkParser import FunctionChunk, decode, pattern
+
+IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+# an identifier outside of a function body that is not followed by a parenthesis: not the name of a prototype
+REFERENCE = re.compile(r"([A-Za-z_]\w*)(?!\s*\(|\w)")
+chunkParser.BYTES_PATTERNS.update({p: re.compile(p.pattern.encode(), p.flags & ~re.UNICODE) for p in (IDENTIFIER, REFERENCE)})
+
+
+# the names of the identifiers under a node (the names of calls are identifiers too)
+def referencedNames(node):
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if type(node) == c_ast.ID:
+            names.add(node.name)
+        elif node is not None:
+            stack.extend(node)
+    return names
+
+# The set of ids of the definitions reachable from roots, a list of definitions. follow(definition) are the names
+# it refers to, index maps names to the definitions they resolve to.
+def reach(roots, follow, index):
+    seen = set(map(id, roots))
+    stack = list(roots)
+    while stack:
+        for name in follow(stack.pop()):
+            definition = index.get(name)
+            if definition is not None and id(definition) not in seen:
+                seen.add(id(definition))
+                stack.append(definition)
+    return seen
+
+
+# The entry points of an Analyzer (its entryPoints option), it counts what was reachable
+class EntryPoints:
+    # names are the entry functions, with unreachablePass the unreachable functions are evaluated after the others
+    def __init__(self, names=("main",), unreachablePass=False):
+        self.names = list(names)
+        self.unreachablePass = unreachablePass
+        self.functions = 0
+        self.reachable = 0
+        self.files = 0
+        self.entered = 0
+
+    # The functions to evaluate among FuncDefs of a file, in the order to evaluate and report them (analyzer's
+    # functionIndex is already built). Returns them and the (reachable, functions, has an entry) of the file.
+    def select(self, analyzer, ast, functions):
+        index = analyzer.functionIndex
+        roots = [index[name] for name in self.names if name in index]
+        if not roots:
+            return functions, self.count(len(functions), len(functions), False)
+        for node in ast.ext:
+            if type(node) != c_ast.FuncDef:
+                roots.extend(index[name] for name in referencedNames(node) if name in index)
+        reachable = reach(roots, lambda funcDec: referencedNames(funcDec.body), index)
+        return (self.order(functions, lambda funcDec: id(funcDec) in reachable),
+                self.count(sum(1 for funcDec in functions if id(funcDec) in reachable), len(functions), True))
+
+    # the same for the chunks of a file in per-function mode (functionIndex maps names to the chunks calls resolve
+    # to), returns the positions of the chunks to evaluate, in order
+    def selectChunks(self, chunks, functionIndex):
+        index = {name: chunk for name, chunk in functionIndex.items() if type(chunk) == FunctionChunk}
+        roots = [index[name] for name in self.names if name in index]
+        positions = list(range(len(chunks.functions)))
+        if not roots:
+            return positions, self.count(len(positions), len(positions), False)
+        source = chunks.source
+        identifier = pattern(IDENTIFIER, source)
+        reference = pattern(REFERENCE, source)
+        # the text between the function definitions is that of the top-level declarations
+        start = 0
+        for chunk in chunks.functions + [None]:
+            end = chunk.span.start if chunk is not None else len(source)
+            roots.extend(index[name] for name in map(decode, reference.findall(source, start, end)) if name in index)
+            if chunk is not None:
+                start = chunk.span.end
+        reachable = reach(roots, lambda chunk: map(decode, identifier.findall(source, chunk.span.body, chunk.span.end)),
+                          index)
+        return (self.order(positions, lambda position: id(chunks.functions[position]) in reachable),
+                self.count(len(reachable), len(positions), True))
+
+    # the reachable items, followed by the others with the unreachable pass
+    def order(self, items, isReachable):
+        reachable = [item for item in items if isReachable(item)]
+        if self.unreachablePass:
+            reachable += [item for item in items if not isReachable(item)]
+        return reachable
+
+    # count the functions of a file and those reachable, returns (reachable, functions, entered) for its AnalysisResult
+    def count(self, reachable, functions, entered):
+        self.files += 1
+        self.functions += functions
+        self.reachable += reachable
+        if entered:
+            self.entered += 1
+        return reachable, functions, entered
+
+    def stats(self):
+        return ("entry points: " + str(self.reachable) + " of " + str(self.functions) + " functions reachable, "
+                + str(self.files - self.entered) + " of " + str(self.files) + " files without an entry point")
@@ -0,0 +1,46 @@
+/* Types and objects of the C library, as stand-ins the analyzer can parse (see preprocessor.py) */
+#ifndef _FAKE_TYPEDEFS_H
+#define _FAKE_TYPEDEFS_H
+
+typedef unsigned long size_t;
+typedef long ssize_t;
+typedef long ptrdiff_t;
+typedef int wchar_t;
+typedef int wint_t;
+typedef int FILE;
+typedef long fpos_t;
+typedef int va_list;
+typedef int __builtin_va_list;
+
+typedef signed char int8_t;
+typedef short int16_t;
+typedef int int32_t;
+typedef long int64_t;
+typedef unsigned char uint8_t;
+typedef unsigned short uint16_t;
+typedef unsigned int uint32_t;
+typedef unsigned long uint64_t;
+typedef long intptr_t;
+typedef unsigned long uintptr_t;
+typedef long intmax_t;
+typedef unsigned long uintmax_t;
+
+typedef long off_t;
+typedef int pid_t;
+typedef unsigned int uid_t;
+typedef unsigned int gid_t;
+typedef unsigned int mode_t;
+typedef long time_t;
+typedef long clock_t;
+typedef int sig_atomic_t;
+typedef int jmp_buf;
+typedef int locale_t;
+typedef int div_t;
+typedef int ldiv_t;
+
+extern FILE *stdin;
+extern FILE *stdout;
+extern FILE *stderr;
+extern int errno;
+
+#endif
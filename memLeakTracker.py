@@ -3,17 +3,35 @@
 
 # coding: utf-8
 from __future__ import print_function
+import os
 import sys
-import copy
+import time
 import argparse
 
 # This is not required if you've installed pycparser into
 # your site-packages/ with setup.py
 sys.path.extend(['.', '..'])
 
-from pycparser import c_parser, c_ast, parse_file
-from operator import add
-from functools import reduce
+
+# The AST node classes, loaded on their own: the pycparser package imports its parser and lexer (over half of the
+# startup time) when it is imported, and they are only needed once a file is parsed (see Analyzer.parser), not to
+# print --help, answer a query or analyze an AST built elsewhere. Once the package is imported it uses this module.
+def importAstNodes():
+    if "pycparser.c_ast" not in sys.modules:
+        import importlib.util
+        location = importlib.util.find_spec("pycparser").submodule_search_locations[0]
+        spec = importlib.util.spec_from_file_location("pycparser.c_ast", os.path.join(location, "c_ast.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    return sys.modules["pycparser.c_ast"]
+
+c_ast = importAstNodes()
+from collections import Counter
+from collections.abc import MutableMapping
+from array import array
+
+from diagnostics import DiagnosticStore, formatAliasName
 
 
 testProgram= r"""
@@ -53,52 +71,6 @@ testProgram= r"""
     }
 """
 
-# the top level list of statements in the C program
-dec = []
-
-# our version of memory locations
-memloc = 0
-
-
-# dictionaries for the state of the program
-# < key=loc, value=list of aliases currently pointing to loc >
-globalLocationDictionary = {}
-# < key=alias (funcName.varName), value=list of locs it has pointed to over its life (current at tail) >
-globalAliasDictionary = {}
-
-# list of warnings generated for the program
-warnings = []
-
-#List of Pass by reference functions
-referenceFuncs = []
-
-# for keeping track of line number information
-# < key=location, value=(allocation line num, last used line num) >
-linesDictionary = {}
-
-# number to keep track of nesting of controlflow
-nest = 0
-nestedAlias = {}
-nestedLocation = {}
-iterationHistoryAlias = {}
-iterationHistoryLocation = {}
-
-def findFuncDec(name):
-    for funcDec in ast.ext:
-        if str(funcDec.decl.name) == name:
-            return funcDec
-
-def incrementMemLoc():
-    global memloc
-    memloc += 1
-
-def incrementNest():
-    global nest
-    nest += 1
-
-def decrementNest():
-    global nest
-    nest -= 1
 
 # Case where location is same on both branches may not be needed since memory location is global
 # Combine dictionaries such that:
@@ -138,8 +110,259 @@ def findMissingVars(aList1, aList2):
             missing.append(var)
     return missing
 
-def formatAliasName(funcName, alias):
-    return funcName + "." + alias
+# Aliases pointing to one memory location: an insertion ordered set of alias ids
+# (a dict with no values), so removing an alias is O(1) and the report lists aliases in the order they were added
+class AliasSet(dict):
+    __slots__ = ()
+    def append(self, alias):
+        self[alias] = None
+    def remove(self, alias):
+        # same error as list.remove for an alias that is not there
+        if self.pop(alias, self) is self:
+            raise ValueError("AliasSet.remove(x): x not in set")
+    def copy(self):
+        return AliasSet(self)
+
+# Copy-on-write dictionary of lists for the abstract state
+# Each StateDict is a layer of changes (delta/removed) over a read-only parent layer, so a conditional can fork
+# its branches in O(1) instead of deep copying the whole state, and the join only has to look at what each
+# branch changed. Iteration order is the same as a plain dict that went through the same operations.
+# Values must be changed through the StateDict (item assignment, pop, appendTo, removeFrom) and never mutated
+# in place, since a list read from a frozen layer is shared with every other branch.
+# With countValues, the number of entries holding each value is tracked so value membership
+# ("is this list one of the values?") is answered without scanning the values. The counts of a layer are only
+# built the first time they are asked for, so straight-line code that never reaches a conditional pays nothing.
+# With maxHistory, appendTo keeps only the last maxHistory items of a list.
+class StateDict(MutableMapping):
+    def __init__(self, parent=None, countValues=False, maxHistory=None):
+        self.parent = parent
+        # < key=key set in this layer, value=its list (owned by this layer) >
+        self.delta = {}
+        # keys of the parent layer hidden by this layer
+        self.removed = set()
+        # < key=tuple(value), value=change in the number of entries holding it compared to the parent >
+        # (None until count() needs it)
+        self.counts = None
+        self.countValues = countValues
+        self.maxHistory = maxHistory
+        self.size = parent.size if parent is not None else 0
+
+    def __getitem__(self, key):
+        layer = self
+        while layer is not None:
+            if key in layer.delta:
+                return layer.delta[key]
+            if key in layer.removed:
+                break
+            layer = layer.parent
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        layer = self
+        while layer is not None:
+            if key in layer.delta:
+                return True
+            if key in layer.removed:
+                return False
+            layer = layer.parent
+        return False
+
+    def __iter__(self):
+        if self.parent is not None:
+            for key in self.parent:
+                if key not in self.removed:
+                    yield key
+        for key in self.delta:
+            if self.parent is None or key in self.removed or key not in self.parent:
+                yield key
+
+    def __len__(self):
+        return self.size
+
+    def countChange(self, value, change):
+        if self.counts is not None:
+            t = tuple(value)
+            n = self.counts.get(t, 0) + change
+            if n == 0:
+                del self.counts[t]
+            else:
+                self.counts[t] = n
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self.countChange(self[key], -1)
+        else:
+            self.size += 1
+        self.delta[key] = value
+        self.countChange(value, 1)
+
+    def __delitem__(self, key):
+        value = self[key]
+        self.countChange(value, -1)
+        self.size -= 1
+        if key in self.delta:
+            del self.delta[key]
+        if self.parent is not None and key in self.parent:
+            self.removed.add(key)
+
+    # the value of key, copied into this layer first when it belongs to a frozen one
+    def ownedValue(self, key):
+        if key in self.delta:
+            return self.delta[key]
+        value = self[key].copy()
+        self.delta[key] = value
+        return value
+
+    def appendTo(self, key, item):
+        value = self.ownedValue(key)
+        self.countChange(value, -1)
+        value.append(item)
+        if self.maxHistory is not None and len(value) > self.maxHistory:
+            del value[0]
+        self.countChange(value, 1)
+
+    def removeFrom(self, key, item):
+        value = self.ownedValue(key)
+        self.countChange(value, -1)
+        value.remove(item)
+        self.countChange(value, 1)
+
+    # build the counts of this layer from its own changes (the parent layer is frozen)
+    def buildCounts(self):
+        self.counts = {}
+        for key in self.delta:
+            self.countChange(self.delta[key], 1)
+        if self.parent is not None:
+            for key in self.removed.union(self.delta):
+                if key in self.parent:
+                    self.countChange(self.parent[key], -1)
+
+    # number of entries whose value equals the given list (needs countValues)
+    def count(self, value):
+        t = tuple(value)
+        n = 0
+        layer = self
+        while layer is not None:
+            if layer.counts is None:
+                layer.buildCounts()
+            n += layer.counts.get(t, 0)
+            layer = layer.parent
+        return n
+
+    # keys this layer changed or removed compared to its parent
+    def changedKeys(self):
+        return list(self.delta) + [key for key in self.removed if key not in self.delta]
+
+    # Freeze the current contents into a read-only snapshot layer shared by this dict and the branches
+    # created from it with branch(). O(1): the current layer is moved, not copied.
+    def fork(self):
+        snapshot = type(self)(self.parent, self.countValues, self.maxHistory)
+        snapshot.delta, snapshot.removed, snapshot.counts, snapshot.size = self.delta, self.removed, self.counts, self.size
+        self.parent = snapshot
+        self.delta, self.removed, self.counts = {}, set(), None
+        return snapshot
+
+    def branch(self):
+        return type(self)(self, self.countValues, self.maxHistory)
+
+    # Drop everything changed since fork() and take the snapshot's layer back as our own
+    def restore(self, snapshot):
+        self.parent = snapshot.parent
+        self.delta, self.removed, self.counts, self.size = snapshot.delta, snapshot.removed, snapshot.counts, snapshot.size
+
+    # Keep everything changed since fork() but fold it into the snapshot's layer and take that layer back as our
+    # own, so the layers do not pile up. O(changes), the order of the keys is kept.
+    def commit(self, snapshot):
+        delta, removed = self.delta, self.removed
+        self.restore(snapshot)
+        for key in removed:
+            if key not in delta:
+                del self[key]
+        for key in delta:
+            # a key removed then set again moved to the end
+            if key in removed:
+                del self[key]
+            self[key] = delta[key]
+
+
+# Plan the join of two branches forked from `before`, giving the same contents (and order) as
+#   {**ifBranch, **elseBranch}
+# but only visiting the keys the branches changed. With preferInitialized, a key that is [-1] (declared null) in
+# the else branch but was initialized in the if branch keeps the if branch's value.
+# Returns the plan for applyJoin, the keys changed by either branch and the joined values of those keys
+# (None for keys that are gone). `before` can still be read until the plan is applied.
+def planJoin(before, ifBranch, elseBranch, preferInitialized=False):
+    # a value the joined state can own: lists of the branches and of the snapshot layer itself are handed over,
+    # lists of older (still shared) layers are copied
+    def take(branch, key):
+        if key in branch.delta:
+            return branch.delta[key]
+        if key in before.delta:
+            return before.delta[key]
+        return branch[key].copy()
+
+    def joinedValue(key):
+        if key in elseBranch:
+            if preferInitialized and key in ifBranch and elseBranch[key] == [-1] and ifBranch[key] != [-1]:
+                return take(ifBranch, key)
+            return take(elseBranch, key)
+        if key in ifBranch:
+            return take(ifBranch, key)
+        return None
+
+    # plan the operations on the snapshot, in the order the joined dict has its keys:
+    # keys kept in place, then keys new in the if branch, then keys the if branch removed but the else branch
+    # kept (in snapshot order), then keys new in the else branch
+    plan = []
+    for key in ifBranch.delta:
+        if key in before and key not in ifBranch.removed:
+            plan.append(("set", key, joinedValue(key)))
+        else:
+            plan.append(("append", key, joinedValue(key)))
+    moved = []
+    for key in ifBranch.removed:
+        if key in ifBranch.delta:
+            continue
+        if key in elseBranch and key not in elseBranch.removed:
+            moved.append(key)
+        elif key not in elseBranch:
+            plan.append(("remove", key, None))
+    if len(moved) > 1:
+        movedKeys = set(moved)
+        moved = [key for key in before if key in movedKeys]
+    for key in moved:
+        plan.append(("append", key, take(elseBranch, key)))
+    for key in elseBranch.delta:
+        if key in ifBranch:
+            if key not in ifBranch.delta:
+                plan.append(("set", key, joinedValue(key)))
+        elif key in elseBranch.removed or key not in before:
+            plan.append(("append", key, take(elseBranch, key)))
+
+    changed = ifBranch.changedKeys()
+    seen = set(changed)
+    for key in elseBranch.changedKeys():
+        if key not in seen:
+            seen.add(key)
+            changed.append(key)
+    joined = {}
+    for key in changed:
+        joined[key] = joinedValue(key)
+    return plan, changed, joined
+
+# Make `state` the join planned by planJoin, discarding whatever it changed since it was forked into `before`
+def applyJoin(state, before, plan):
+    state.restore(before)
+    for op, key, value in plan:
+        if op == "set":
+            state[key] = value
+        elif op == "append":
+            if key in state:
+                del state[key]
+            state[key] = value
+        elif key in state:
+            del state[key]
+
 
 def getAliasName(decl):
     if type(decl) == c_ast.Decl:
@@ -151,480 +374,109 @@ def getAliasName(decl):
     elif type(decl) == c_ast.FuncCall and type(decl.args.exprs[0]) != c_ast.Constant:
         return decl.args.exprs[0].name
     # cases above should cover all that we actually need the alias
-    # return an empty string so formatAliasName doesn't complain
+    # return an empty string so internAlias doesn't complain
     return ""
 
-def addNewAllocationLine(loc, decl):
-    line = str(decl.coord).split(":")[1]
-    # initialize last used line num as allocation line num
-    linesDictionary[loc] = (line, line)
-
-def updateLastUsedLine(loc, decl):
-    if loc == -1 or loc == None:
-        return
-    line = str(decl.coord).split(":")[1]
-    temp = list(linesDictionary[loc])
-    temp[1] = line
-    linesDictionary[loc] = tuple(temp)
-
-def getAllocationLine(loc):
-    if loc == -1 or loc == None:
-        return None
-    return linesDictionary[loc][0]
 
-def getLastUsedLine(loc):
-    if loc == -1 or loc == None:
-        return None
-    return linesDictionary[loc][1]
-
-def printFormatAlias(alias):
-    return "'" + alias + "'"
-
-def inReferenceFunc(i):
-    pbrNames = []
-    for f in referenceFuncs:
-        pbrNames.append(f.funcName)
-    if i in pbrNames:
-        return True
-    else:
-        return False
-
-def returnReferenceFunc(i):
-    for f in referenceFuncs:
-        if f.funcName == i:
-            return f
-    return None
-        
-def evaluatePBR(referenceFunc, funcName, decl, aliasDictionary, locationDictionary):
-    c = 0
-    if hasattr(decl, "rvalue"):
-        specDecl = decl.rvalue
-    else:
-        specDecl = decl
-    for i in referenceFunc.pbrIndex:
-        referencedVar = specDecl.args.exprs[i].name
-        if referenceFunc.malloc[c]:
-            # Malloc
-            if funcName + "." + referencedVar in aliasDictionary and aliasDictionary[funcName + "." + referencedVar][-1] != -1:
-                prevLocation = aliasDictionary[funcName + "." + referencedVar][-1]
-                locationDictionary[prevLocation].remove(funcName + "." + referencedVar)
-                locationDictionary[memloc] = [funcName + "." + referencedVar]
-                aliasDictionary[funcName + "." + referencedVar].append(memloc)
-                addNewAllocationLine(memloc, decl)
-                incrementMemLoc()
-            else:
-                locationDictionary[memloc] = [funcName + "." + referencedVar]
-                aliasDictionary[funcName + "." + referencedVar] = [memloc]
-                addNewAllocationLine(memloc, decl)
-                incrementMemLoc()
-        # Free
-        if referenceFunc.free[c]:
-            if funcName + "." + referencedVar in aliasDictionary and aliasDictionary[funcName + "." + referencedVar][-1] != -1:
-                locToFree = aliasDictionary[funcName + "." + referencedVar][-1]
-                allAliases = locationDictionary[locToFree]
-                for alias in allAliases:
-                    aliasDictionary[alias].append(-1)
-                locationDictionary.pop(locToFree)
-                updateLastUsedLine(locToFree, decl)
-        # Reallocate
-        if not referenceFunc.morf[c]:
-            for x in referenceFunc.reference:
-                if referenceFunc.varNames[c] in referenceFunc.reference[x]:
-                    locToReference = referenceFunc.pbrIndex[referenceFunc.varNames.index(x)]
-                    varToReference = specDecl.args.exprs[locToReference].name
-                    aliasedTo = funcName + "." + varToReference
-                    if (aliasedTo in aliasDictionary): # check that the right hand side is in the dictionary already
-                        aliasedLoc = aliasDictionary[aliasedTo]
-                        aliasDictionary[funcName + "." + referencedVar] = [aliasedLoc[-1]]
-                        locationDictionary[aliasedLoc[-1]].append(funcName + "." + referencedVar)
-                        if aliasedLoc[-1] != -1:
-                            updateLastUsedLine(aliasedLoc, decl)
-        c += 1
-
-def evaluateProgram(dec, funcName, passByRef, aliasDictionary, locationDictionary):
-    global nestedAlias	
-    global nestedLocation	
-    global iterationHistoryAlias	
-    global iterationHistoryLocation
-
-    if dec is not None:
-        for decl in dec:
-
-            alias = formatAliasName(funcName, getAliasName(decl))
-
-            if type(decl) == c_ast.Decl and type(decl.type) == c_ast.PtrDecl and hasattr(decl.init, "name") and decl.init.name != "NULL":
-                # Adding entries for if the following is detected: int* a = malloc(4);
-                if type(decl.init) == c_ast.FuncCall and decl.init.name.name == "malloc":
-                    locationDictionary[memloc] = [alias]
-                    aliasDictionary[alias] = [memloc]
-                    addNewAllocationLine(memloc, decl)
-                    incrementMemLoc()
-                # Adding entries for if the following is detected: int* d = c; (where c has already been allocated)
-                else:
-                    aliasedTo = decl.init.name
-                    if (aliasedTo in aliasDictionary): # check that the right hand side is in the dictionary already
-                        aliasedLoc = aliasDictionary[aliasedTo]
-                        aliasDictionary[alias] = [aliasedLoc[-1]]
-                        locationDictionary[aliasedLoc[-1]].append(alias)
-                        updateLastUsedLine(aliasedLoc, decl)
-
-            # removing entries from dictionaries after a free has been detected
-            if type(decl) == c_ast.FuncCall and decl.name.name == "free":
-                locToFree = aliasDictionary[alias][-1]
-                allAliases = locationDictionary[locToFree]
-                for a in allAliases:
-                    aliasDictionary[a].append(-1)
-                locationDictionary.pop(locToFree)
-                # note: instead of removing the entry from linesDictionary when the location is freed, 
-                # we update the last used location to be that of the free
-                updateLastUsedLine(locToFree, decl)
-
-            # if check for 1a: return c (pointer that needs to be removed from the dictionary)
-            if type(decl) == c_ast.Return and alias in aliasDictionary:
-                locToFree = aliasDictionary[alias][-1]
-                allAliases = locationDictionary[locToFree]
-                for a in allAliases:
-                    aliasDictionary[a].append(-1)
-                locationDictionary.pop(locToFree)
-                # note: instead of removing the entry from linesDictionary when the location is freed, 
-                # we update the last used location to be that of the free
-                updateLastUsedLine(locToFree, decl)
-
-            # if check for case 1b: int* c = foo();
-            if type(decl) == c_ast.Decl and type(decl.type) == c_ast.PtrDecl and hasattr(decl.init, 'name'):
-                aliasedTo = decl.init.name
-                if type(aliasedTo) != str: # Check that the right hand side is not null, which would be saved as a string
-                    funcDec = findFuncDec(aliasedTo.name) # Find the user defined function
-                    if funcDec is not None:
-                        locationDictionary[memloc] = [alias]
-                        aliasDictionary[alias] = [memloc]
-                        addNewAllocationLine(memloc, decl)
-                        incrementMemLoc()
-
-            # if check for case 1c: c = foo();
-            if type(decl) == c_ast.Assignment and type(decl.rvalue) != c_ast.UnaryOp and type(decl.rvalue) != c_ast.Constant:
-                funcDec = None
-                if type(decl.rvalue.name) != str:  # Ensure that the right hand side is not null, which would be saved as a string
-                    funcDec = findFuncDec(decl.rvalue.name.name)  # Find the user defined function
-                if funcDec is not None:
-                    if aliasDictionary.get(alias) == -1 or aliasDictionary.get(alias)[-1] == -1: # c declared null previously
-                        aliasDictionary[alias] = [memloc]
-                        locationDictionary[memloc] = [alias]
-                        addNewAllocationLine(memloc, decl)
-                        incrementMemLoc()
-                    elif aliasDictionary.get(alias) is not None: # c already points to allocated memory
-                        locationDictionary[memloc] = [alias]
-                        aliasDictionary[alias].append(memloc)
-                        updateLastUsedLine(memloc, decl)
-                        incrementMemLoc()
-
-            # if check for case 3: repeat mallocs without freeing in between
-            if type(decl) == c_ast.Assignment and alias in aliasDictionary and aliasDictionary.get(alias)[-1] != -1:
-                if type(decl.rvalue.name) != str: # check that the right hand side is not null, which would be saved as a string
-                    if decl.rvalue.name.name == "malloc":
-                        prevLocation = aliasDictionary[alias][-1]
-                        locationDictionary[prevLocation].remove(alias)
-                        locationDictionary[memloc] = [alias]
-                        aliasDictionary[alias].append(memloc)
-                        addNewAllocationLine(memloc, decl)
-                        incrementMemLoc()
-
-            # if check for case 4: evaluating passByRef
-            if type(decl) == c_ast.Assignment and type(decl.rvalue) != c_ast.UnaryOp and type(decl.rvalue) != c_ast.Constant and type(decl.rvalue.name) != str and inReferenceFunc(decl.rvalue.name.name):
-                    referenceFunc = returnReferenceFunc(decl.rvalue.name.name)
-                    evaluatePBR(referenceFunc, funcName, decl, aliasDictionary, locationDictionary)
-            
-            if type(decl) == c_ast.FuncCall and inReferenceFunc(decl.name.name):
-                    referenceFunc = returnReferenceFunc(decl.name.name)
-                    evaluatePBR(referenceFunc, funcName, decl, aliasDictionary, locationDictionary)
-
-            # if check for case 2: assigning malloc to a pointer that has been declared null
-            # int* a = NULL; OR int* a;
-            if type(decl) == c_ast.Decl and type(decl.type) == c_ast.PtrDecl and ((hasattr(decl.init, "name") and decl.init.name == "NULL") or isinstance(decl.init, type(None))):
-                aliasDictionary[alias] = [-1]
-            # a = malloc()
-            if type(decl) == c_ast.Assignment and type(decl.rvalue) == c_ast.FuncCall and decl.rvalue.name.name == "malloc":
-                if aliasDictionary.get(alias) is not None:
-                    lastLocation = aliasDictionary.get(alias)[-1]
-                    if lastLocation == -1:
-                        aliasDictionary[alias] = [memloc]
-                        locationDictionary[memloc] = [alias]
-                        addNewAllocationLine(memloc, decl)
-                        incrementMemLoc()
-            
-            # if check for case 5: assigning a malloc'd pointer to a variable
-            if type(decl) == c_ast.Assignment and type(decl.rvalue) != c_ast.FuncCall and type(decl.rvalue) != c_ast.UnaryOp and type(decl.lvalue) != c_ast.UnaryOp and aliasDictionary.get(alias) != None:
-                assignmentAlias = formatAliasName(funcName, decl.rvalue.name)
-                newLocation = aliasDictionary[assignmentAlias][-1]
-                # if the variable being assigned to already points to allocated memory, remove it from its old location
-                # (otherwise the variable is either null, not initialized, or previously freed)
-                if not (aliasDictionary.get(alias) == -1 or aliasDictionary[alias][-1] == -1):
-                    oldLocation = aliasDictionary[alias][-1]
-                    locationDictionary[oldLocation].remove(alias)
-                # update its new location
-                aliasDictionary[alias].append(newLocation)
-                locationDictionary[newLocation].append(alias)
-                updateLastUsedLine(newLocation, decl)
-
-            # add nest mallocs and frees here at the end
-            if nest > 0:
-                nestedAlias = aliasDictionary.copy()
-                nestedLocation = locationDictionary.copy()
-            else:
-                nestedAlias = {}
-                nestedLocation = {}
-
-            # if check for loops
-            if (type(decl) == c_ast.For or type(decl) == c_ast.While or type(decl) == c_ast.DoWhile) and not isinstance(decl.stmt.block_items, type(None)):
-                evaluateLoop(decl, passByRef, funcName)
-
-            # if check for conditionals
-            if type(decl) == c_ast.If:
-                evaluateConditional(decl, funcName, passByRef, aliasDictionary, locationDictionary)
-
-            if nest == 0:
-                iterationHistoryAlias = {}
-                iterationHistoryLocation = {}
-            
-            #PASS BY REFERENCE SECTION
-            #MALLOC
-            if type(decl) == c_ast.Assignment and type(decl.lvalue) != c_ast.UnaryOp and (decl.lvalue.name) in passByRef.varNames:
-                if type(decl.rvalue.name) != str: # check that the right hand s ide is not null, which would be saved as a string
-                        if not passByRef.morf[passByRef.varNames.index(decl.lvalue.name)]:
-                            passByRef.morf[passByRef.varNames.index(decl.lvalue.name)] = True
-                        passByRef.malloc[passByRef.varNames.index(decl.lvalue.name)] = True
-                        if passByRef.free[passByRef.varNames.index(decl.lvalue.name)]:
-                            passByRef.free[passByRef.varNames.index(decl.lvalue.name)] = False 
-                elif decl.rvalue.name in passByRef.varNames:
-                    #REFERENCE
-                    if passByRef.morf[passByRef.varNames.index(decl.lvalue.name)]:
-                        passByRef.morf[passByRef.varNames.index(decl.lvalue.name)] = False
-                    for reference in passByRef.reference:
-                        if decl.lvalue.name in passByRef.reference[reference]:
-                            passByRef.reference[reference].remove(decl.lvalue.name)
-                    if decl.lvalue.name in passByRef.refNormVars:
-                        passByRef.refNormVars.pop(decl.lvalue.name)
-                    if decl.rvalue.name in passByRef.reference:
-                        passByRef.reference[decl.rvalue.name].append(decl.lvalue.name)
-                    else:
-                        passByRef.reference[decl.rvalue.name] = [decl.lvalue.name]
-                elif funcName + "." + decl.rvalue.name in aliasDictionary.keys():
-                    if passByRef.morf[passByRef.varNames.index(decl.lvalue.name)]:
-                        passByRef.morf[passByRef.varNames.index(decl.lvalue.name)] = False
-                    for reference in passByRef.reference:
-                        if decl.lvalue.name in passByRef.reference[reference]:
-                            passByRef.reference[reference].remove(decl.lvalue.name)
-                    passByRef.refNormVars[decl.lvalue.name] = decl.rvalue.name
-                    
-            #FREE
-            if type(decl) == c_ast.FuncCall and decl.name.name == "free" and decl.args.exprs[0].name in passByRef.varNames:
-                if passByRef.malloc[passByRef.varNames.index(decl.args.exprs[0].name)]:
-                    passByRef.malloc[passByRef.varNames.index(decl.args.exprs[0].name)] = False
-                else:
-                    passByRef.free[passByRef.varNames.index(decl.args.exprs[0].name)] = True
-
-def evaluateConditional(decl, funcName, passByRef, aliasDictionary, locationDictionary):
-    global nestedAlias
-    global nestedLocation
-    global iterationHistoryAlias
-    global iterationHistoryLocation
-
-    incrementNest()
-
-    # Record the records of all states
-    iterationHistoryAlias[nest] = nestedAlias.copy()
-    iterationHistoryLocation[nest] = nestedLocation.copy()
-    # make copies of global Dictionaries
-    if nest > 1:
-        # Case where we are in a nested condtional statement
-        ifAliasDictionary = copy.deepcopy(iterationHistoryAlias[nest])
-        elseAliasDictionary = copy.deepcopy(iterationHistoryAlias[nest])
-        ifLocationDictionary = copy.deepcopy(iterationHistoryLocation[nest])
-        elseLocationDictionary = copy.deepcopy(iterationHistoryLocation[nest])
-        aliasBefore = copy.deepcopy(iterationHistoryAlias[nest])
-        locationBefore = copy.deepcopy(iterationHistoryLocation[nest])
-    else:
-        # Case where we are in the most outer condtional statement
-        ifAliasDictionary = copy.deepcopy(aliasDictionary)
-        elseAliasDictionary = copy.deepcopy(aliasDictionary)
-        ifLocationDictionary = copy.deepcopy(locationDictionary)
-        elseLocationDictionary = copy.deepcopy(locationDictionary)
-        aliasBefore = copy.deepcopy(aliasDictionary)
-        locationBefore = copy.deepcopy(locationDictionary)
-    # Evaluating if branch
-    evaluateProgram(decl.iftrue.block_items, funcName, passByRef, ifAliasDictionary, ifLocationDictionary)
-    # Check if we just finished evaluated a nested condition
-    if nest + 1 in iterationHistoryAlias:
-        # Clear iteration history when reaching the outer-most condition
-        if nest == 1:
-            iterationHistoryAlias = {}
-            iterationHistoryLocation = {}
-
-    # Evaluating else branch
-    if decl.iffalse is not None:
-        evaluateProgram(decl.iffalse.block_items, funcName, passByRef, elseAliasDictionary, elseLocationDictionary)
-        # Check if we just finished evaluated a nested condition
-        if nest + 1 in iterationHistoryAlias:
-            # Clear iteration history when reaching the outer-most condition
-            if nest == 1:
-                iterationHistoryAlias = {}
-                iterationHistoryLocation = {}
-
-    # Check if a declared variable has been initialized in one of the branches, update accordingly
-    for key in ifAliasDictionary:
-        if key in elseAliasDictionary:
-            if ifAliasDictionary[key] == [-1] and elseAliasDictionary[key] != [-1]:
-                ifAliasDictionary[key] = elseAliasDictionary[key]
-            if ifAliasDictionary[key] != [-1] and elseAliasDictionary[key] == [-1]:
-                elseAliasDictionary[key] = ifAliasDictionary[key]
-
-    # Union both conditional block dictionaries
-    result = combineDictionaries(ifAliasDictionary, elseAliasDictionary, ifLocationDictionary, elseLocationDictionary)
-
-    # Finding introduced variables
-    introducedVars = findIntroducedVars(locationBefore.values(), result[1].values())
-    if introducedVars != []:
-        introducedVars = reduce(add, introducedVars)
-
-    # Finding variables missing in each branch
-    if decl.iffalse is not None:
-        missingVars = findMissingVars(ifLocationDictionary.values(), elseLocationDictionary.values()) + findMissingVars(
-            elseLocationDictionary.values(), ifLocationDictionary.values())
-    else:
-        missingVars = findMissingVars(locationDictionary.values(),  ifLocationDictionary.values())
-    
-    if missingVars != []:
-        missingVars = reduce(add, missingVars)
-
-    missingVarsCopy = missingVars.copy()
-    for var in missingVars:
-        if var in introducedVars:
-            missingVarsCopy.remove(var)
-    missingVars = missingVarsCopy
-
-    # Update globalDictionaries
-    aliasDictionary.clear()
-    locationDictionary.clear()
-    for key in result[0]:
-        aliasDictionary[key] = result[0][key]
-    for key in result[1]:
-        locationDictionary[key] = result[1][key]
-
-    # Generate warnings
-    generateIfWarnings(introducedVars, missingVars, aliasDictionary)
-    decrementNest()
-
-def generateIfWarnings(introducedVars, missingVars, aliasDictionary):
-    # case MALLOC
-    for eachVar in set(introducedVars):
-        currLoc = aliasDictionary[eachVar][-1]
-        w = "WARNING: variable " + printFormatAlias(eachVar) + " was allocated inside of a condition block but was not freed before the condition block's end"
-        w += "\n\t-> Allocation occurred at line " + getAllocationLine(currLoc)
-        w += "\n\t-> Last reference occurred at line " + getLastUsedLine(currLoc)
-        if w not in warnings:
-             warnings.append(w)
-
-    # case FREE
-    for eachVar in set(missingVars):
-        w = "WARNING: variable " + printFormatAlias(eachVar) + " was freed inside one of the condition blocks but not the other block"
-        if w not in warnings:
-            warnings.append(w)
-
-# decl is the loop decl
-def evaluateLoop(decl, pbr, funcName):
-    # Copy the current state of the dictionaries
-    aliasBefore = {}
-    for key in globalAliasDictionary.keys():
-        # note: using tuples to preserve immutability
-        aliasBefore[key] = tuple(globalAliasDictionary[key])
-
-    # Run through the loop one time, adding/removing entries as necessary from the global dictionaries
-    loop = decl.stmt.block_items
-    evaluateProgram(loop, funcName, pbr, globalAliasDictionary, globalLocationDictionary)
-
-    # Generate warnings based on differences in the dictionaries' state before and after the loop
-    generateLoopWarnings(aliasBefore)
-
-
-def generateLoopWarnings(aliasBefore):
-    varsBefore = aliasBefore.keys()
-    varsAfter = globalAliasDictionary.keys()
-
-    # case MALLOC
-    for eachVar in set(varsAfter).difference(varsBefore):
-        currLoc = globalAliasDictionary[eachVar][-1]
-        if currLoc != -1:
-            w = "WARNING: variable " + printFormatAlias(eachVar) + " was allocated inside of a loop but was not freed before the loop's end"
-            w += "\n\t-> Allocation occurred at line " + getAllocationLine(currLoc)
-            if w not in warnings:
-                warnings.append(w)
-    
-    varsInBoth = set(varsBefore).intersection(varsAfter)
-    for eachVar in varsInBoth:
-        oldLoc = aliasBefore[eachVar][-1]
-        newLoc = globalAliasDictionary[eachVar][-1]
-        # case FREE
-        if oldLoc != -1 and newLoc == -1:
-            w = "WARNING: variable " + printFormatAlias(eachVar) + " was freed inside of a loop it was not declared in"
-            w += "\n\t-> Free occurred at line " + getLastUsedLine(oldLoc)
-            if w not in warnings:
-                warnings.append(w)
-        # case REALLOCATE
-        elif aliasBefore[eachVar] != tuple(globalAliasDictionary[eachVar]):
-            w = "WARNING: variable " + printFormatAlias(eachVar) + " was reallocated inside of a loop it was not declared in"
-            if w not in warnings:
-                warnings.append(w)
-
-def generateOutput():
-    # generate leak info
-    leaks = []
-    for loc in globalLocationDictionary:
-        aliasesPointingToLoc = globalLocationDictionary[loc]
-        if aliasesPointingToLoc != []:
-            strAliases = ", ".join(map(printFormatAlias, aliasesPointingToLoc))
-            l = "LEAK: Memory allocated at line " + getAllocationLine(loc) + " was never freed";
-            l += "\n\t-> Variables pointing to this memory location: " + strAliases
-            l += "\n\t-> Last reference occurred at line " + getLastUsedLine(loc)
-        else:
-            l = "LEAK: Memory allocated at line " + getAllocationLine(loc) + " was never freed and has nothing pointing to it"
-            l += "\n\t-> Last reference occurred at line " + getLastUsedLine(loc)
-        if l not in leaks:
-            leaks.append(l)
-    
-    # print leak info
-    if (leaks):
-        print("")
-        print(*leaks,sep='\n\n')
-    
-    # print warning info (from conditionals & loops)
-    if (warnings):
-        print("")
-        print(*warnings,sep='\n\n')
-
-    if (leaks or warnings):
-        print("")
-    else:
-        print("\nNo memory leaks detected!\n")
-    
-    # note: the `print("")` statements are to format the output on the console with spacing for better readability
-
-
-# create the parser and ask to parse the program
-# parse() will throw a ParseError if there's an error in the code
-parser = c_parser.CParser()
-
-# build an ast from a C file
-argparser = argparse.ArgumentParser('memLeakTracker.py')
-argparser.add_argument('c_filename',
-                        help='name of file to parse')
-args = argparser.parse_args()
+# the statements that open blocks of their own
+BLOCK_STATEMENTS = (c_ast.If, c_ast.For, c_ast.While, c_ast.DoWhile, c_ast.Compound, c_ast.Switch, c_ast.Label)
+
+# the names declared (when declarations is a set) and used in a statement
+def scanNames(node, declarations, ids):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if type(node) == c_ast.ID:
+            ids.add(node.name)
+        elif type(node) == c_ast.Decl and declarations is not None and node.name is not None:
+            declarations.add(node.name)
+        stack.extend(child for _, child in node.children())
+
+# The variables declared in the blocks nested in each top-level statement of a function body, which go out of
+# scope once that statement is done: < key=statement index, value=list of names >. A name declared at the top
+# level of the body or as a parameter, or used by another statement that does not declare it itself (a global,
+# or a name the block shadows), is the same alias outside the block and is left alone.
+def blockScopedNames(funcDec):
+    items = funcDec.body.block_items or ()
+    # < key=statement index, value=(names declared in its blocks, names it uses) >
+    blocks = {}
+    for i, decl in enumerate(items):
+        if type(decl) in BLOCK_STATEMENTS:
+            names = set()
+            ids = set()
+            scanNames(decl, names, ids)
+            if names:
+                blocks[i] = (names, ids)
+    if not blocks:
+        return {}
+    topLevel = set()
+    if funcDec.decl.type.args is not None:
+        topLevel.update(param.name for param in funcDec.decl.type.args.params)
+    # < key=name, value=number of statements using it without declaring it >
+    foreign = Counter()
+    for i, decl in enumerate(items):
+        if i in blocks:
+            names, ids = blocks[i]
+            foreign.update(ids - names)
+            continue
+        if type(decl) == c_ast.Decl:
+            topLevel.add(decl.name)
+        ids = set()
+        scanNames(decl, None, ids)
+        foreign.update(ids)
+    scoped = {}
+    for i, (names, ids) in blocks.items():
+        dead = sorted(name for name in names if name not in topLevel and foreign[name] == 0)
+        if dead:
+            scoped[i] = dead
+    return scoped
+
+# The names of the variables of a function that can ever hold heap memory, the only ones whose declarations are
+# tracked (see Analyzer.evaluateStatement). Heap memory starts at the variables assigned malloc or a call to a function
+# of the file (isDefined tells those), the arguments of such calls and of free, and the parameters (what is assigned
+# to them is in the function's summary), and flows through the assignments and initializers of one variable from
+# another, both ways: a variable assigned from a tracked one must be tracked for the assignment to be evaluated.
+# A pointer outside of these only ever holds null, its entry can neither be part of a leak nor of a warning.
+def heapPointers(funcDec, isDefined):
+    # union-find over the names, < key=name, value=parent name >
+    parents = {}
+    def find(name):
+        root = name
+        while parents.get(root, root) != root:
+            root = parents[root]
+        while name != root:
+            parents[name], name = root, parents[name]
+        return root
+    def union(a, b):
+        parents[find(a)] = find(b)
+    seeds = set()
+    if funcDec.decl.type.args is not None:
+        seeds.update(param.name for param in funcDec.decl.type.args.params if getattr(param, "name", None) is not None)
+    stack = [funcDec.body]
+    while stack:
+        node = stack.pop()
+        nodeType = type(node)
+        if nodeType == c_ast.Decl or nodeType == c_ast.Assignment:
+            target, value = (node.name, node.init) if nodeType == c_ast.Decl else (node.lvalue, node.rvalue)
+            if nodeType == c_ast.Assignment:
+                target = target.name if type(target) == c_ast.ID else None
+            if target is not None:
+                if type(value) == c_ast.ID and value.name != "NULL":
+                    union(target, value.name)
+                elif (type(value) == c_ast.FuncCall and type(value.name) == c_ast.ID
+                      and (value.name.name == "malloc" or isDefined(value.name.name))):
+                    seeds.add(target)
+        elif nodeType == c_ast.FuncCall and type(node.name) == c_ast.ID and node.args is not None:
+            if node.name.name == "free" or isDefined(node.name.name):
+                seeds.update(arg.name for arg in node.args.exprs if type(arg) == c_ast.ID)
+        stack.extend(child for _, child in node.children())
+    roots = set(map(find, seeds))
+    return set(name for name in parents if find(name) in roots) | seeds
 
-ast = parse_file(args.c_filename, use_cpp=False)
-# for testing
-# ast = parser.parse(testProgram, filename='<none>')
 
 # Pass By Reference object
 class PassByReference:
+  __slots__ = ("funcName", "varNames", "pbrIndex", "free", "malloc", "reference", "morf", "retName", "refNormVars", "varIndex")
   def __init__(self, funcName, varNames, pbrIndex, free, malloc, reference, morf, retName, refNormVars):
     self.funcName = funcName
     self.varNames = varNames
@@ -635,6 +487,17 @@ class PassByReference:
     self.morf = morf
     self.retName = retName
     self.refNormVars = refNormVars
+    # < key=param name, value=index into the parallel lists above >
+    self.varIndex = {}
+    for i, name in enumerate(varNames):
+        self.varIndex.setdefault(name, i)
+  def addParam(self, name, paramIndex):
+    self.varIndex.setdefault(name, len(self.varNames))
+    self.varNames.append(name)
+    self.free.append(False)
+    self.malloc.append(False)
+    self.morf.append(True)
+    self.pbrIndex.append(paramIndex)
   def __str__(self):
       string = "Function Name: "
       string += self.funcName
@@ -656,51 +519,1414 @@ class PassByReference:
       string += str(self.morf)
       return string
 
-# evaluate and generate output for the C program
-for funcDec in ast.ext:
-    pbr = False
-    x = PassByReference(funcDec.decl.name, [], [], [], [], {}, [], None, {})
-    if funcDec.decl.type.args is not None:
-        for param in funcDec.decl.type.args.params:
-            if(type(param.type) == c_ast.PtrDecl):
-                pbr = True
-                x.varNames.append(param.name)
-                x.free.append(False)
-                x.malloc.append(False)
-                x.morf.append(True)
-                x.pbrIndex.append(funcDec.decl.type.args.params.index(param))
-    if pbr:
-        referenceFuncs.append(x)
-    evaluateProgram(funcDec.body.block_items, funcDec.decl.name, x,  globalAliasDictionary, globalLocationDictionary)
-    alreadyMallocedVars = []
-    alreadyMalloced = []
-    for key in x.refNormVars:
-        aliasedNormVar = funcDec.decl.name + "." + x.refNormVars[key]
-        if not isinstance(globalAliasDictionary[aliasedNormVar], type(None)) and not x.morf[x.varNames.index(key)]:
-            #MALLOC
-            if globalAliasDictionary[aliasedNormVar][-1] != -1:
-                if globalAliasDictionary[aliasedNormVar] not in alreadyMalloced:
-                    if x.free[x.varNames.index(key)]:
-                        x.free[x.varNames.index(key)] = False
-                    x.malloc[x.varNames.index(key)] = True
-                    alreadyMallocedVars.append(key)
-                    alreadyMalloced.append(globalAliasDictionary[aliasedNormVar])
+
+# Result of analyzing one translation unit
+# leaks and warnings hold the diagnostics (DiagnosticStore, str() of each one is its message) in the order
+# generateOutput prints them,
+# referenceFuncs holds the PassByReference summaries of every function with pointer parameters,
+# error is set instead when the file could not be parsed or analyzed, seconds is the wall time it took,
+# profile is the profiler.Profile of the run when it was analyzed with --profile
+class AnalysisResult:
+  def __init__(self, filename, leaks, warnings, referenceFuncs, error=None, seconds=0.0):
+    self.filename = filename
+    self.leaks = leaks
+    self.warnings = warnings
+    self.referenceFuncs = referenceFuncs
+    self.error = error
+    self.seconds = seconds
+    self.profile = None
+    # true when the limits of the output (see outputStream) stopped the analysis before the end of the file
+    self.stopped = False
+    # < key=cache name, value=(hits, misses) > while analyzing this file, set in project mode
+    self.cacheStats = None
+    # (functions skipped, functions) by the prefilter (see prefilter.py), None without it
+    self.prefiltered = None
+    # (functions reachable, functions, whether the file has an entry point) with entry points (see entryPoints.py)
+    self.reachable = None
+  def hasLeaks(self):
+      return len(self.leaks) > 0
+  def __str__(self):
+      # note: the empty strings are to format the output on the console with spacing for better readability
+      string = ""
+      if (self.leaks):
+          string += "\n" + "\n\n".join(map(str, self.leaks)) + "\n"
+      if (self.warnings):
+          string += "\n" + "\n\n".join(map(str, self.warnings)) + "\n"
+      if (self.leaks or self.warnings):
+          string += "\n"
+      else:
+          string += "\nNo memory leaks detected!\n\n"
+      return string
+
+
+# passes over a loop body before its fixpoint is given up on (see Analyzer.evaluateLoop)
+MAX_LOOP_ITERATIONS = 8
+# passes compared on the full abstract state before the comparison is widened
+WIDENING_DELAY = 3
+# locations kept in the history of an alias: the last one, and the one before it so a pointer freed after it
+# was allocated ([loc, -1]) is still told apart from one declared null ([-1])
+HISTORY_LENGTH = 2
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+# The limits of the evaluation of one function: seconds of wall time, entries of its alias and location
+# dictionaries together, and conditionals nested in each other (None for no limit). They are checked at every
+# conditional and every pass over a loop (every block with engine="cfg", which has no nesting limit), where the
+# cost of a function blows up.
+class FunctionBudget:
+    def __init__(self, seconds=None, stateSize=None, nesting=None):
+        self.seconds = seconds
+        self.stateSize = stateSize
+        self.nesting = nesting
+        self.deadline = None
+        # whether the evaluation in progress is the coarse one, and whether the function was evaluated in full
+        self.coarse = False
+        self.precise = True
+
+    def begin(self, coarse=False):
+        self.deadline = time.perf_counter() + self.seconds if self.seconds is not None else None
+        self.coarse = coarse
+        self.precise = not coarse
+
+    def check(self, stateSize):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise BudgetExceeded("time")
+        if self.stateSize is not None and stateSize > self.stateSize:
+            raise BudgetExceeded("state size")
+
+
+# Holds the abstract state of one analysis run so that a single process can analyze many
+# translation units back to back. The CParser is built once per Analyzer and reused by every run,
+# the rest of the state is cleared by reset() at the start of each run.
+class Analyzer:
+    # the class of the alias and location dictionaries
+    stateDictClass = StateDict
+    # the class of the engine="cfg" engine, cfgEngine.CfgEngine when None (only imported when used)
+    cfgEngineClass = None
+    # passes over a loop before its abstract state is compared widened
+    wideningDelay = WIDENING_DELAY
+
+    # jobs is the number of processes the functions of one translation unit are spread over (see callGraph)
+    # maxLoopIterations caps the passes over a loop body before its fixpoint is given up on (1 is a single pass)
+    # engine is how function bodies are evaluated: "ast" walks the statements, "cfg" runs a worklist over their
+    # control-flow graph (see cfgEngine)
+    # preprocessor is an optional preprocessor.Preprocessor source text goes through before it is parsed
+    # with fullHistory, every location an alias pointed to is kept rather than the last HISTORY_LENGTH
+    # with perFunction, analyzeFile parses and evaluates a file one function at a time (see analyzeFunctions),
+    # jobs is then the number of processes the functions are parsed in
+    # diffScope is an optional diffMode.DiffScope: only the functions of a change are evaluated and reported
+    # functionTimeout, maxStateSize and maxNesting are the budget of every function (see FunctionBudget)
+    # with prefilter, the functions and files without heap activity are skipped (see prefilter.py)
+    # entryPoints is an optional list of function names: only the functions they reach are evaluated, and with
+    # unreachablePass the others after them (see entryPoints.py)
+    # with slicing, the pointers that never hold heap memory are left out of the state (see heapPointers), loops
+    # can then reach their fixpoint a pass sooner
+    def __init__(self, summaryCache=None, astCache=None, jobs=1, maxLoopIterations=MAX_LOOP_ITERATIONS, engine="ast",
+                 preprocessor=None, fullHistory=False, perFunction=False, diffScope=None, functionTimeout=None,
+                 maxStateSize=None, maxNesting=None, prefilter=False, entryPoints=None, unreachablePass=False,
+                 slicing=False):
+        # built on first use (see parser), a run served from the ast cache never needs it
+        self.cParser = None
+        # optional summaryCache.SummaryCache shared across runs (and processes)
+        self.summaryCache = summaryCache
+        # optional astCache.AstCache of parsed files, shared the same way
+        self.astCache = astCache
+        self.jobs = jobs
+        self.maxLoopIterations = maxLoopIterations
+        self.engine = engine
+        self.preprocessor = preprocessor
+        self.fullHistory = fullHistory
+        self.perFunction = perFunction
+        self.diffScope = diffScope
+        self.slicing = slicing
+        self.budget = None
+        if functionTimeout is not None or maxStateSize is not None or maxNesting is not None:
+            self.budget = FunctionBudget(functionTimeout, maxStateSize, maxNesting)
+        self.prefilter = None
+        if prefilter:
+            from prefilter import Prefilter
+            self.prefilter = Prefilter()
+        # the prefilter.FileScan of the file parse() was last called for, until analyzeAst takes it
+        self.fileScan = None
+        self.entryPoints = None
+        if entryPoints is not None:
+            from entryPoints import EntryPoints
+            self.entryPoints = EntryPoints(entryPoints, unreachablePass)
+        # optional outputStream writer the leaks and warnings are streamed to as every function finishes
+        self.output = None
+        self.reset()
+
+    # the parser is created once, parse() will throw a ParseError if there's an error in the code
+    @property
+    def parser(self):
+        if self.cParser is None:
+            from pycparser import c_parser
+            self.cParser = c_parser.CParser()
+        return self.cParser
+
+    def reset(self):
+        # the translation unit currently being analyzed
+        self.ast = None
+
+        # aliases (funcName.varName) are interned to small integer ids
+        # < key=funcName, value=< key=varName, value=alias id > >
+        self.aliasIds = {}
+        # < index=alias id, value=funcName > and < index=alias id, value=varName >
+        # (the strings are shared with the AST, the full name is only built for the report)
+        self.aliasFuncs = []
+        self.aliasVars = []
+
+        self.clearState()
+        # the leaks of the functions that returned so far (see exitFunction), and whether self.output stopped the
+        # run at its limits
+        self.leaks = DiagnosticStore(self.aliasFuncs, self.aliasVars)
+        self.stopped = False
+
+        #List of Pass by reference functions
+        self.referenceFuncs = []
+
+        # symbol tables of the translation unit, built once per run so calls resolve in O(1)
+        # < key=function name, value=FuncDef >
+        self.functionIndex = {}
+        # < key=function name, value=PassByReference of a function in referenceFuncs >
+        self.referenceFuncIndex = {}
+
+    # empty the program state (memory locations, dictionaries, line numbers and warnings)
+    def clearState(self):
+        # our version of memory locations
+        self.memloc = 0
+
+        # dictionaries for the state of the program, they only hold the function being evaluated (see exitFunction)
+        # < key=loc, value=AliasSet of alias ids currently pointing to loc >
+        self.globalLocationDictionary = self.stateDictClass(countValues=True)
+        # < key=alias id, value=list of the last locs it has pointed to (current at tail) >
+        self.globalAliasDictionary = self.stateDictClass(maxHistory=None if self.fullHistory else HISTORY_LENGTH)
+
+        # warnings generated for the program (conditionals & loops)
+        self.warnings = DiagnosticStore(self.aliasFuncs, self.aliasVars)
+
+        # for keeping track of line number information
+        # < index=location, value=allocation line num > and < index=location, value=last used line num >
+        self.allocationLines = array('i')
+        self.lastUsedLines = array('i')
+
+        # number to keep track of nesting of controlflow
+        self.nest = 0
+        # number of enclosing loops in a second or later pass over their body (see evaluateLoop)
+        self.loopReplays = 0
+        # the names of the variables of the function being evaluated that are tracked, None for all of them
+        self.heapPointers = None
+
+    # build an ast from C source text and analyze it
+    def analyzeSource(self, text, filename='<none>'):
+        return self.analyzeAst(self.parse(text, filename), filename)
+
+    # the ast of C source text, from the ast cache when the same text was parsed before
+    def parse(self, text, filename='<none>'):
+        if self.preprocessor is not None:
+            text = self.preprocessor.preprocess(text, filename)
+        if self.prefilter is not None:
+            # a file without heap activity is not parsed
+            self.fileScan = self.prefilter.scan(text)
+            if self.fileScan.skipsFile():
+                return c_ast.FileAST([])
+        if self.astCache is not None:
+            ast = self.astCache.get(text, filename)
+            if ast is not None:
+                return ast
+        ast = self.parser.parse(text, filename=filename)
+        if self.astCache is not None:
+            self.astCache.put(text, filename, ast)
+        return ast
+
+    # build an ast from a C file and analyze it
+    def analyzeFile(self, filename):
+        if self.perFunction:
+            return self.analyzeFunctions(filename)
+        with open(filename) as f:
+            text = f.read()
+        return self.analyzeSource(text, filename)
+
+    # evaluate every function of an already parsed translation unit
+    def analyzeAst(self, ast, filename='<none>'):
+        self.reset()
+        self.ast = ast
+        self.buildFunctionIndex(ast)
+        if self.output is not None:
+            self.output.beginFile(filename)
+        functions = [funcDec for funcDec in ast.ext if type(funcDec) == c_ast.FuncDef]
+        if self.diffScope is not None:
+            functions = self.diffScope.select(self, ast, filename, functions)
+        reachable = None
+        if self.entryPoints is not None:
+            functions, reachable = self.entryPoints.select(self, ast, functions)
+        prefiltered = None
+        if self.fileScan is not None:
+            scan, self.fileScan = self.fileScan, None
+            if scan.skipsFile():
+                prefiltered = self.prefilter.count(scan.definitions, scan.definitions)
+            else:
+                selected = scan.select(functions)
+                prefiltered = self.prefilter.count(len(functions), len(functions) - len(selected))
+                functions = selected
+        self.evaluateFunctions(functions)
+        leaks = self.generateLeaks()
+        result = AnalysisResult(filename, leaks, self.warnings, self.referenceFuncs)
+        result.stopped = self.stopped
+        result.prefiltered = prefiltered
+        result.reachable = reachable
+        if self.output is not None:
+            self.output.endFile(result)
+        # drop the reference to the ast so it can be freed between runs
+        self.ast = None
+        return result
+
+    # Analyze a C file one function definition at a time (see chunkParser.FunctionChunks). Only the functions being
+    # evaluated are ever parsed, so the memory a file takes is bounded by its largest function (or recursive
+    # group of functions) rather than by its size, and a function that does not parse is reported as an
+    # "unparsed-function" warning and skipped while the rest of the file is still analyzed.
+    def analyzeFunctions(self, filename):
+        import chunkParser
+        with chunkParser.FunctionChunks(filename, self.parser, self.preprocessor, self.jobs) as chunks:
+            self.reset()
+            for chunk in chunks.functions:
+                if chunk.name is not None:
+                    self.functionIndex.setdefault(chunk.name, chunk)
+            if self.output is not None:
+                self.output.beginFile(filename)
+            positions = list(range(len(chunks.functions)))
+            # the unreachable chunks (see entryPoints.py) and the trivial ones (see prefilter.py) are not even parsed
+            reachable = None
+            if self.entryPoints is not None:
+                positions, reachable = self.entryPoints.selectChunks(chunks, self.functionIndex)
+            prefiltered = None
+            if self.prefilter is not None:
+                skipped = self.prefilter.trivialChunks(chunks)
+                prefiltered = self.prefilter.count(len(chunks.functions), len(skipped))
+                positions = [position for position in positions if position not in skipped]
+            self.evaluateChunks(chunks, positions)
+        leaks = self.generateLeaks()
+        result = AnalysisResult(filename, leaks, self.warnings, self.referenceFuncs)
+        result.stopped = self.stopped
+        result.prefiltered = prefiltered
+        result.reachable = reachable
+        if self.output is not None:
+            self.output.endFile(result)
+        return result
+
+    # evaluateFunctions for the chunks of a file at positions (in the order they are reported, all of them when
+    # None), parsing each one when it is evaluated
+    def evaluateChunks(self, chunks, positions=None):
+        import callGraph
+        graph = chunks.callGraph(self.functionIndex)
+        if positions is None:
+            positions = list(range(len(graph)))
+        selected = set(positions)
+        if callGraph.isBottomUp(graph):
+            chunks.schedule(positions)
+            for position in positions:
+                functions = self.loadChunk(chunks, position)
+                if functions is None:
+                    start = len(self.warnings)
+                    self.skipChunk(chunks.functions[position])
+                    if not self.exitFunction(start):
+                        return
+                    continue
+                for funcDec in functions:
+                    start = len(self.warnings)
+                    self.evaluateFunction(funcDec)
+                    if not self.exitFunction(start):
+                        return
+                self.unloadChunk(chunks.functions[position], functions)
+            return
+        import summaryCache
+        components = callGraph.stronglyConnectedComponents(graph)
+        chunks.schedule([position for component in components for position in component if position in selected])
+        # < index=position, value=list of (first line, contribution) of its functions, None when it did not parse >
+        entries = [None] * len(graph)
+        evaluated = set()
+        pending = self.pendingDiagnostics()
+        for component in components:
+            loaded = [(position, self.loadChunk(chunks, position)) for position in component if position in selected]
+            functions = [funcDec for position, chunkFunctions in loaded for funcDec in chunkFunctions or ()]
+            componentEntries = iter(self.evaluateComponent(functions, callGraph.isRecursive(component, graph)))
+            for position, chunkFunctions in loaded:
+                evaluated.add(position)
+                if chunkFunctions is not None:
+                    entries[position] = [(summaryCache.baseLine(funcDec), next(componentEntries))
+                                         for funcDec in chunkFunctions]
+                    self.unloadChunk(chunks.functions[position], chunkFunctions)
+                    if pending is not None:
+                        for base, entry in entries[position]:
+                            pending.add(*summaryCache.diagnosticCounts(entry))
+                elif pending is not None:
+                    pending.add(0, 1)
+            if pending is not None and pending.done:
+                break
+        self.clearState()
+        self.referenceFuncs = []
+        self.referenceFuncIndex = {}
+        for position in positions:
+            if position not in evaluated:
+                continue
+            chunk = chunks.functions[position]
+            chunkEntries = entries[position]
+            if chunkEntries is None:
+                start = len(self.warnings)
+                self.skipChunk(chunk)
+                if not self.exitFunction(start):
+                    return
+                continue
+            for base, entry in chunkEntries:
+                start = len(self.warnings)
+                summaryCache.restoreEntry(self, base, entry)
+                if not self.exitFunction(start):
+                    return
+
+    # The FuncDefs of a chunk, None when it does not parse. While they are loaded they take the chunk's place in
+    # functionIndex, so their summaries are registered as those of the definitions calls resolve to.
+    def loadChunk(self, chunks, position):
+        chunk = chunks.functions[position]
+        try:
+            functions = chunks.parse(position)
+        except Exception:
+            return None
+        for funcDec in functions:
+            name = str(funcDec.decl.name)
+            if self.functionIndex.setdefault(name, chunk) is chunk:
+                self.functionIndex[name] = funcDec
+        return functions
+
+    # put the chunk back in functionIndex once its functions are evaluated, so they can be freed
+    def unloadChunk(self, chunk, functions):
+        for funcDec in functions:
+            name = str(funcDec.decl.name)
+            if self.functionIndex.get(name) is funcDec:
+                self.functionIndex[name] = chunk
+
+    def skipChunk(self, chunk):
+        self.warnings.add("unparsed-function", (), (chunk.line, chunk.span.lastLine))
+
+    # Evaluate the functions callees first (see callGraph), so a call always sees the summary of the function
+    # it calls, then put their contributions together in source order so the report follows the file
+    def evaluateFunctions(self, functions):
+        import callGraph
+        graph = callGraph.buildCallGraph(functions, self.functionIndex)
+        if self.jobs == 1 and callGraph.isBottomUp(graph):
+            # source order already is bottom-up, evaluate in place
+            for funcDec in functions:
+                # the first location and warning of the function
+                start = len(self.warnings)
+                self.evaluateFunction(funcDec)
+                if not self.exitFunction(start):
+                    return
+            return
+        import summaryCache
+        entries = callGraph.evaluateBottomUp(self, functions, graph, self.jobs, self.pendingDiagnostics())
+        self.clearState()
+        self.referenceFuncs = []
+        self.referenceFuncIndex = {}
+        for funcDec, entry in zip(functions, entries):
+            if entry is None:
+                continue
+            start = len(self.warnings)
+            summaryCache.restoreFunction(self, funcDec, entry)
+            if not self.exitFunction(start):
+                return
+
+    # The diagnostics of the functions evaluated callees first, ahead of their replay in source order, as an
+    # outputStream.PendingDiagnostics: once they are enough for self.output to reach its limits, the functions left
+    # are not evaluated. None when the output has no limits, or with a diff scope, which may filter them out.
+    def pendingDiagnostics(self):
+        if self.output is None or self.diffScope is not None:
+            return None
+        if self.output.maxDiagnostics is None and not self.output.failFast:
+            return None
+        import outputStream
+        return outputStream.PendingDiagnostics(self.output)
+
+    # The function that just finished (start is its first warning) returned: its variables are dead, and the
+    # locations still in the location dictionary are leaks (no later function can reach them). The leaks are added
+    # to self.leaks and the function is dropped from the state, so the state only ever holds the function being
+    # evaluated. The leaks and warnings are handed to self.output if there is one.
+    # returns False once the output has reached its limits, the rest of the file is then not evaluated
+    def exitFunction(self, start):
+        first = len(self.leaks)
+        self.addLeaks(self.leaks, self.globalLocationDictionary)
+        self.globalLocationDictionary = self.stateDictClass(countValues=True)
+        self.globalAliasDictionary = self.stateDictClass(maxHistory=self.globalAliasDictionary.maxHistory)
+        if self.diffScope is not None:
+            self.leaks.filterFrom(first, self.diffScope.keep)
+            self.warnings.filterFrom(start, self.diffScope.keep)
+        if self.output is None:
+            return True
+        self.output.write(self.leaks[first:], self.warnings[start:])
+        self.stopped = self.output.done
+        return not self.stopped
+
+    # Drop variables that went out of scope from the alias dictionary. Locations keep their aliases, a leak
+    # still names every variable that pointed to it.
+    def pruneAliases(self, funcName, names, aliasDictionary):
+        ids = self.aliasIds.get(funcName, {})
+        for name in names:
+            alias = ids.get(name)
+            if alias is not None and alias in aliasDictionary:
+                del aliasDictionary[alias]
+
+    # Evaluate the functions of one component of the call graph, each on an empty state
+    # returns their contributions (see summaryCache.captureFunction)
+    # a recursive component is evaluated again until the summaries of its functions stop changing
+    def evaluateComponent(self, functions, recursive):
+        import callGraph
+        import summaryCache
+        previous = None
+        for iteration in range(callGraph.MAX_SCC_ITERATIONS if recursive else 1):
+            entries = []
+            for funcDec in functions:
+                self.clearState()
+                start = summaryCache.beginCapture(self)
+                x = self.evaluateFunction(funcDec)
+                entry = summaryCache.captureFunction(self, funcDec, x, len(x.pbrIndex) > 0, start)
+                # the latest summary is the one the next evaluations see
+                self.registerSummary(funcDec, entry, x)
+                entries.append(entry)
+            summaries = [entry["summary"] for entry in entries]
+            if summaries == previous:
+                break
+            previous = summaries
+        return entries
+
+    # make the summary of an evaluated function the one its callers see
+    def registerSummary(self, funcDec, entry, x=None):
+        if entry["registered"] and self.functionIndex.get(str(funcDec.decl.name)) is funcDec:
+            if x is None:
+                import summaryCache
+                x = summaryCache.summaryFromDict(entry["summary"])
+            self.referenceFuncIndex[x.funcName] = x
+
+    # index every function definition by name (the first definition wins, like the linear scan it replaces)
+    def buildFunctionIndex(self, ast):
+        for funcDec in ast.ext:
+            if type(funcDec) == c_ast.FuncDef:
+                self.functionIndex.setdefault(str(funcDec.decl.name), funcDec)
+
+    def findFuncDec(self, name):
+        return self.functionIndex.get(name)
+
+    def addReferenceFunc(self, x):
+        self.referenceFuncs.append(x)
+        self.referenceFuncIndex.setdefault(x.funcName, x)
+
+    def incrementMemLoc(self):
+        self.memloc += 1
+
+    def incrementNest(self):
+        self.nest += 1
+
+    def decrementNest(self):
+        self.nest -= 1
+
+    # the id of funcName.varName, interned on first use
+    def internAlias(self, funcName, name):
+        ids = self.aliasIds.get(funcName)
+        if ids is None:
+            ids = self.aliasIds[funcName] = {}
+        alias = ids.get(name)
+        if alias is None:
+            # a missing or non variable name used to fail when the alias string was built, it still fails here
+            if type(name) != str:
+                raise TypeError("can only intern a variable name (not \"" + type(name).__name__ + "\")")
+            alias = ids[name] = len(self.aliasVars)
+            self.aliasFuncs.append(funcName)
+            self.aliasVars.append(name)
+        return alias
+
+    # funcName.varName of an alias id
+    def aliasName(self, alias):
+        return formatAliasName(self.aliasFuncs[alias], self.aliasVars[alias])
+
+    def setLines(self, loc, allocationLine, lastUsedLine):
+        while len(self.allocationLines) <= loc:
+            self.allocationLines.append(0)
+            self.lastUsedLines.append(0)
+        self.allocationLines[loc] = allocationLine
+        self.lastUsedLines[loc] = lastUsedLine
+
+    def addNewAllocationLine(self, loc, decl):
+        # initialize last used line num as allocation line num
+        self.setLines(loc, decl.coord.line, decl.coord.line)
+
+    def updateLastUsedLine(self, loc, decl):
+        if loc == -1 or loc == None:
+            return
+        self.lastUsedLines[loc] = decl.coord.line
+
+    def getAllocationLine(self, loc):
+        if loc == -1 or loc == None:
+            return None
+        return self.allocationLines[loc]
+
+    def getLastUsedLine(self, loc):
+        if loc == -1 or loc == None:
+            return None
+        return self.lastUsedLines[loc]
+
+    def inReferenceFunc(self, i):
+        return i in self.referenceFuncIndex
+
+    def returnReferenceFunc(self, i):
+        return self.referenceFuncIndex.get(i)
+
+    # Free the location alias points to, every alias of it then points to nothing. A location that is gone was
+    # already freed through another alias (as on a later pass over a loop), alias is then left pointing to nothing.
+    def freeLocation(self, alias, decl, aliasDictionary, locationDictionary):
+        locToFree = aliasDictionary[alias][-1]
+        if locToFree not in locationDictionary:
+            aliasDictionary.appendTo(alias, -1)
+            return
+        for a in locationDictionary[locToFree]:
+            # (aliases that went out of scope are not in the alias dictionary any more)
+            if a in aliasDictionary:
+                aliasDictionary.appendTo(a, -1)
+        locationDictionary.pop(locToFree)
+        # note: instead of clearing the line tables when the location is freed,
+        # we update the last used location to be that of the free
+        self.updateLastUsedLine(locToFree, decl)
+
+    # drop alias from the aliases of loc, unless loc was freed already or alias was moved off it (as a later pass
+    # over a loop finds them)
+    def detachAlias(self, loc, alias, locationDictionary):
+        if loc in locationDictionary and alias in locationDictionary[loc]:
+            locationDictionary.removeFrom(loc, alias)
+
+    # The location alias points to once it is assigned a pointer to loc, alias is added to the aliases of loc. A
+    # pointer assigned a null or freed one points to nothing (-1).
+    def attachAlias(self, loc, alias, decl, locationDictionary):
+        if loc == -1 or loc not in locationDictionary:
+            return -1
+        locationDictionary.appendTo(loc, alias)
+        self.updateLastUsedLine(loc, decl)
+        return loc
+
+    def evaluatePBR(self, referenceFunc, funcName, decl, aliasDictionary, locationDictionary):
+        c = 0
+        if hasattr(decl, "rvalue"):
+            specDecl = decl.rvalue
+        else:
+            specDecl = decl
+        for i in referenceFunc.pbrIndex:
+            referencedVar = specDecl.args.exprs[i].name
+            referencedAlias = self.internAlias(funcName, referencedVar)
+            if referenceFunc.malloc[c]:
+                # Malloc
+                if referencedAlias in aliasDictionary and aliasDictionary[referencedAlias][-1] != -1:
+                    prevLocation = aliasDictionary[referencedAlias][-1]
+                    self.detachAlias(prevLocation, referencedAlias, locationDictionary)
+                    locationDictionary[self.memloc] = AliasSet.fromkeys((referencedAlias,))
+                    aliasDictionary.appendTo(referencedAlias, self.memloc)
+                    self.addNewAllocationLine(self.memloc, decl)
+                    self.incrementMemLoc()
                 else:
-                    varToRef = alreadyMallocedVars[alreadyMalloced.index(globalAliasDictionary[aliasedNormVar])]
-                    if varToRef in pbr.reference:
-                        pbr.reference[varToRef].append(key)
-                    else:
-                        pbr.reference[varToRef] = [key]
-            #FREE
+                    locationDictionary[self.memloc] = AliasSet.fromkeys((referencedAlias,))
+                    aliasDictionary[referencedAlias] = [self.memloc]
+                    self.addNewAllocationLine(self.memloc, decl)
+                    self.incrementMemLoc()
+            # Free
+            if referenceFunc.free[c]:
+                if referencedAlias in aliasDictionary and aliasDictionary[referencedAlias][-1] != -1:
+                    self.freeLocation(referencedAlias, decl, aliasDictionary, locationDictionary)
+            # Reallocate
+            if not referenceFunc.morf[c]:
+                for x in referenceFunc.reference:
+                    if referenceFunc.varNames[c] in referenceFunc.reference[x]:
+                        locToReference = referenceFunc.pbrIndex[referenceFunc.varIndex[x]]
+                        varToReference = specDecl.args.exprs[locToReference].name
+                        aliasedTo = self.internAlias(funcName, varToReference)
+                        if (aliasedTo in aliasDictionary): # check that the right hand side is in the dictionary already
+                            aliasedLoc = aliasDictionary[aliasedTo]
+                            aliasDictionary[referencedAlias] = [aliasedLoc[-1]]
+                            locationDictionary.appendTo(aliasedLoc[-1], referencedAlias)
+                            if aliasedLoc[-1] != -1:
+                                self.updateLastUsedLine(aliasedLoc[-1], decl)
+            c += 1
+
+    # scoped is < key=statement index, value=names that go out of scope after it > (see blockScopedNames)
+    def evaluateProgram(self, dec, funcName, passByRef, aliasDictionary, locationDictionary, scoped=None):
+        if dec is not None:
+            for i, decl in enumerate(dec):
+                self.evaluateStatement(decl, funcName, passByRef, aliasDictionary, locationDictionary)
+                if scoped and i in scoped:
+                    # a variable assigned to a pass by reference parameter is still read when the function returns
+                    refNormVars = passByRef.refNormVars.values()
+                    self.pruneAliases(funcName, [name for name in scoped[i] if name not in refNormVars], aliasDictionary)
+
+    # evaluate one statement of a block (conditionals and loops evaluate their blocks in turn)
+    def evaluateStatement(self, decl, funcName, passByRef, aliasDictionary, locationDictionary):
+        alias = self.internAlias(funcName, getAliasName(decl))
+
+        if type(decl) == c_ast.Decl and type(decl.type) == c_ast.PtrDecl and hasattr(decl.init, "name") and decl.init.name != "NULL":
+            # Adding entries for if the following is detected: int* a = malloc(4);
+            if type(decl.init) == c_ast.FuncCall and decl.init.name.name == "malloc":
+                locationDictionary[self.memloc] = AliasSet.fromkeys((alias,))
+                aliasDictionary[alias] = [self.memloc]
+                self.addNewAllocationLine(self.memloc, decl)
+                self.incrementMemLoc()
+            # Adding entries for if the following is detected: int* d = c; (where c has already been allocated)
             else:
-                if x.malloc[x.varNames.index(key)]:
-                    x.malloc[x.varNames.index(key)] = False
+                aliasedTo = decl.init.name
+                if (aliasedTo in aliasDictionary): # check that the right hand side is in the dictionary already
+                    aliasDictionary[alias] = [self.attachAlias(aliasDictionary[aliasedTo][-1], alias, decl, locationDictionary)]
+
+        # removing entries from dictionaries after a free has been detected
+        # (a pointer already freed, as on the next pass over a loop that frees it, has nothing left to free, nor has one
+        # that is not tracked, as a parameter)
+        if type(decl) == c_ast.FuncCall and decl.name.name == "free" and alias in aliasDictionary and aliasDictionary[alias][-1] != -1:
+            self.freeLocation(alias, decl, aliasDictionary, locationDictionary)
+
+        # if check for 1a: return c (pointer that needs to be removed from the dictionary)
+        if type(decl) == c_ast.Return and alias in aliasDictionary and aliasDictionary[alias][-1] != -1:
+            self.freeLocation(alias, decl, aliasDictionary, locationDictionary)
+
+        # if check for case 1b: int* c = foo();
+        if type(decl) == c_ast.Decl and type(decl.type) == c_ast.PtrDecl and hasattr(decl.init, 'name'):
+            aliasedTo = decl.init.name
+            if type(aliasedTo) != str: # Check that the right hand side is not null, which would be saved as a string
+                funcDec = self.findFuncDec(aliasedTo.name) # Find the user defined function
+                if funcDec is not None:
+                    locationDictionary[self.memloc] = AliasSet.fromkeys((alias,))
+                    aliasDictionary[alias] = [self.memloc]
+                    self.addNewAllocationLine(self.memloc, decl)
+                    self.incrementMemLoc()
+
+        # if check for case 1c: c = foo();
+        if type(decl) == c_ast.Assignment and type(decl.rvalue) != c_ast.UnaryOp and type(decl.rvalue) != c_ast.Constant:
+            funcDec = None
+            if type(decl.rvalue.name) != str:  # Ensure that the right hand side is not null, which would be saved as a string
+                funcDec = self.findFuncDec(decl.rvalue.name.name)  # Find the user defined function
+            if funcDec is not None:
+                if aliasDictionary.get(alias) == -1 or aliasDictionary.get(alias)[-1] == -1: # c declared null previously
+                    aliasDictionary[alias] = [self.memloc]
+                    locationDictionary[self.memloc] = AliasSet.fromkeys((alias,))
+                    self.addNewAllocationLine(self.memloc, decl)
+                    self.incrementMemLoc()
+                elif aliasDictionary.get(alias) is not None: # c already points to allocated memory
+                    locationDictionary[self.memloc] = AliasSet.fromkeys((alias,))
+                    aliasDictionary.appendTo(alias, self.memloc)
+                    self.addNewAllocationLine(self.memloc, decl)
+                    self.incrementMemLoc()
+
+        # if check for case 3: repeat mallocs without freeing in between
+        if type(decl) == c_ast.Assignment and alias in aliasDictionary and aliasDictionary.get(alias)[-1] != -1:
+            if type(decl.rvalue.name) != str: # check that the right hand side is not null, which would be saved as a string
+                if decl.rvalue.name.name == "malloc":
+                    prevLocation = aliasDictionary[alias][-1]
+                    self.detachAlias(prevLocation, alias, locationDictionary)
+                    locationDictionary[self.memloc] = AliasSet.fromkeys((alias,))
+                    aliasDictionary.appendTo(alias, self.memloc)
+                    self.addNewAllocationLine(self.memloc, decl)
+                    self.incrementMemLoc()
+
+        # if check for case 4: evaluating passByRef
+        if type(decl) == c_ast.Assignment and type(decl.rvalue) != c_ast.UnaryOp and type(decl.rvalue) != c_ast.Constant and type(decl.rvalue.name) != str and self.inReferenceFunc(decl.rvalue.name.name):
+                referenceFunc = self.returnReferenceFunc(decl.rvalue.name.name)
+                self.evaluatePBR(referenceFunc, funcName, decl, aliasDictionary, locationDictionary)
+
+        if type(decl) == c_ast.FuncCall and self.inReferenceFunc(decl.name.name):
+                referenceFunc = self.returnReferenceFunc(decl.name.name)
+                self.evaluatePBR(referenceFunc, funcName, decl, aliasDictionary, locationDictionary)
+
+        # if check for case 2: assigning malloc to a pointer that has been declared null
+        # int* a = NULL; OR int* a;
+        # (a pointer that never holds heap memory is sliced out, see heapPointers)
+        if type(decl) == c_ast.Decl and type(decl.type) == c_ast.PtrDecl and ((hasattr(decl.init, "name") and decl.init.name == "NULL") or isinstance(decl.init, type(None))):
+            if self.heapPointers is None or decl.name in self.heapPointers:
+                aliasDictionary[alias] = [-1]
+        # a = malloc()
+        if type(decl) == c_ast.Assignment and type(decl.rvalue) == c_ast.FuncCall and decl.rvalue.name.name == "malloc":
+            if aliasDictionary.get(alias) is not None:
+                lastLocation = aliasDictionary.get(alias)[-1]
+                if lastLocation == -1:
+                    aliasDictionary[alias] = [self.memloc]
+                    locationDictionary[self.memloc] = AliasSet.fromkeys((alias,))
+                    self.addNewAllocationLine(self.memloc, decl)
+                    self.incrementMemLoc()
+
+        # if check for case 5: assigning a malloc'd pointer to a variable
+        if type(decl) == c_ast.Assignment and type(decl.rvalue) != c_ast.FuncCall and type(decl.rvalue) != c_ast.UnaryOp and type(decl.lvalue) != c_ast.UnaryOp and aliasDictionary.get(alias) != None:
+            assignmentAlias = self.internAlias(funcName, decl.rvalue.name)
+            # (a pointer assigned NULL, or anything else that is not tracked, points to nothing)
+            newLocation = aliasDictionary[assignmentAlias][-1] if assignmentAlias in aliasDictionary else -1
+            # if the variable being assigned to already points to allocated memory, remove it from its old location
+            # (otherwise the variable is either null, not initialized, or previously freed)
+            if not (aliasDictionary.get(alias) == -1 or aliasDictionary[alias][-1] == -1):
+                oldLocation = aliasDictionary[alias][-1]
+                self.detachAlias(oldLocation, alias, locationDictionary)
+            # update its new location
+            aliasDictionary.appendTo(alias, self.attachAlias(newLocation, alias, decl, locationDictionary))
+
+        # if check for loops
+        if (type(decl) == c_ast.For or type(decl) == c_ast.While or type(decl) == c_ast.DoWhile) and not isinstance(decl.stmt.block_items, type(None)):
+            self.evaluateLoop(decl, passByRef, funcName)
+
+        # if check for conditionals
+        if type(decl) == c_ast.If:
+            self.evaluateConditional(decl, funcName, passByRef, aliasDictionary, locationDictionary)
+
+        #PASS BY REFERENCE SECTION
+        #MALLOC
+        if type(decl) == c_ast.Assignment and type(decl.lvalue) != c_ast.UnaryOp and (decl.lvalue.name) in passByRef.varIndex:
+            if type(decl.rvalue.name) != str: # check that the right hand s ide is not null, which would be saved as a string
+                    if not passByRef.morf[passByRef.varIndex[decl.lvalue.name]]:
+                        passByRef.morf[passByRef.varIndex[decl.lvalue.name]] = True
+                    passByRef.malloc[passByRef.varIndex[decl.lvalue.name]] = True
+                    if passByRef.free[passByRef.varIndex[decl.lvalue.name]]:
+                        passByRef.free[passByRef.varIndex[decl.lvalue.name]] = False
+            elif decl.rvalue.name in passByRef.varIndex:
+                #REFERENCE
+                if passByRef.morf[passByRef.varIndex[decl.lvalue.name]]:
+                    passByRef.morf[passByRef.varIndex[decl.lvalue.name]] = False
+                for reference in passByRef.reference:
+                    if decl.lvalue.name in passByRef.reference[reference]:
+                        passByRef.reference[reference].remove(decl.lvalue.name)
+                if decl.lvalue.name in passByRef.refNormVars:
+                    passByRef.refNormVars.pop(decl.lvalue.name)
+                if decl.rvalue.name in passByRef.reference:
+                    passByRef.reference[decl.rvalue.name].append(decl.lvalue.name)
+                else:
+                    passByRef.reference[decl.rvalue.name] = [decl.lvalue.name]
+            elif self.internAlias(funcName, decl.rvalue.name) in aliasDictionary:
+                if passByRef.morf[passByRef.varIndex[decl.lvalue.name]]:
+                    passByRef.morf[passByRef.varIndex[decl.lvalue.name]] = False
+                for reference in passByRef.reference:
+                    if decl.lvalue.name in passByRef.reference[reference]:
+                        passByRef.reference[reference].remove(decl.lvalue.name)
+                passByRef.refNormVars[decl.lvalue.name] = decl.rvalue.name
+
+        #FREE
+        if type(decl) == c_ast.FuncCall and decl.name.name == "free" and decl.args.exprs[0].name in passByRef.varIndex:
+            if passByRef.malloc[passByRef.varIndex[decl.args.exprs[0].name]]:
+                passByRef.malloc[passByRef.varIndex[decl.args.exprs[0].name]] = False
+            else:
+                passByRef.free[passByRef.varIndex[decl.args.exprs[0].name]] = True
+
+    def evaluateConditional(self, decl, funcName, passByRef, aliasDictionary, locationDictionary):
+        if self.budget is not None:
+            self.checkBudget(aliasDictionary, locationDictionary)
+            if self.budget.nesting is not None and self.nest >= self.budget.nesting:
+                # the coarse evaluation skips the conditionals nested past the limit
+                if self.budget.coarse:
+                    return
+                raise BudgetExceeded("nesting")
+        self.incrementNest()
+
+        # fork the state: both branches share a frozen snapshot of it and only record their own changes
+        aliasBefore = aliasDictionary.fork()
+        locationBefore = locationDictionary.fork()
+        ifAliasDictionary = aliasBefore.branch()
+        elseAliasDictionary = aliasBefore.branch()
+        ifLocationDictionary = locationBefore.branch()
+        elseLocationDictionary = locationBefore.branch()
+
+        # Evaluating if branch
+        self.evaluateProgram(decl.iftrue.block_items, funcName, passByRef, ifAliasDictionary, ifLocationDictionary)
+
+        # Evaluating else branch
+        if decl.iffalse is not None:
+            self.evaluateProgram(decl.iffalse.block_items, funcName, passByRef, elseAliasDictionary, elseLocationDictionary)
+
+        # Finding variables missing in each branch
+        # (a location that was not changed by either branch holds the same aliases in both, so only changed ones are checked)
+        missingVars = []
+        if decl.iffalse is not None:
+            for key in ifLocationDictionary.changedKeys() + elseLocationDictionary.changedKeys():
+                if key in ifLocationDictionary and elseLocationDictionary.count(ifLocationDictionary[key]) == 0:
+                    missingVars.append(ifLocationDictionary[key])
+            for key in elseLocationDictionary.changedKeys() + ifLocationDictionary.changedKeys():
+                if key in elseLocationDictionary and ifLocationDictionary.count(elseLocationDictionary[key]) == 0:
+                    missingVars.append(elseLocationDictionary[key])
+        else:
+            # compared against the current state, which loops inside the branch may have changed as well
+            for key in locationDictionary.changedKeys() + ifLocationDictionary.changedKeys():
+                if key in locationDictionary and ifLocationDictionary.count(locationDictionary[key]) == 0:
+                    missingVars.append(locationDictionary[key])
+
+        missingVars = [alias for aliases in missingVars for alias in aliases]
+
+        # Union both conditional block dictionaries,
+        # checking if a declared variable has been initialized in one of the branches
+        aliasPlan = planJoin(aliasBefore, ifAliasDictionary, elseAliasDictionary, preferInitialized=True)[0]
+        locationPlan, changed, joined = planJoin(locationBefore, ifLocationDictionary, elseLocationDictionary)
+
+        # Finding introduced variables
+        introducedVars = []
+        for key in changed:
+            if joined[key] is not None and locationBefore.count(joined[key]) == 0:
+                introducedVars.append(joined[key])
+        introducedVars = [alias for aliases in introducedVars for alias in aliases]
+
+        missingVarsCopy = missingVars.copy()
+        for var in missingVars:
+            if var in introducedVars:
+                missingVarsCopy.remove(var)
+        missingVars = missingVarsCopy
+
+        # Update the current state
+        applyJoin(aliasDictionary, aliasBefore, aliasPlan)
+        applyJoin(locationDictionary, locationBefore, locationPlan)
+
+        # Generate warnings
+        self.generateIfWarnings(introducedVars, missingVars, aliasDictionary)
+        self.decrementNest()
+
+    def generateIfWarnings(self, introducedVars, missingVars, aliasDictionary):
+        # case MALLOC
+        for eachVar in set(introducedVars):
+            # a variable that went out of scope before the conditional was not allocated in it
+            if eachVar not in aliasDictionary:
+                continue
+            currLoc = aliasDictionary[eachVar][-1]
+            if currLoc == -1:
+                self.warnings.add("if-allocated", (eachVar,))
+            else:
+                self.warnings.add("if-allocated", (eachVar,), (self.getAllocationLine(currLoc), self.getLastUsedLine(currLoc)))
+
+        # case FREE
+        for eachVar in set(missingVars):
+            self.warnings.add("if-freed", (eachVar,))
+
+    # Evaluate a second or later pass over the body of the loop at line, returns False when it failed
+    # Its warnings are dropped: the variables declared in the body are still there from the pass before, so the
+    # conditionals and loops of the body would take them for variables declared outside. The warnings are those
+    # of the first pass. The transfer functions handle what a later pass finds (a pointer an earlier pass freed
+    # or moved); should one still meet a state it does not model, the pass is dropped with a "loop-pass-dropped"
+    # note rather than failing the whole file, and the state goes back to what the pass before left.
+    def evaluateLoopPass(self, loop, line, funcName, pbr):
+        aliasPass = self.globalAliasDictionary.fork()
+        locationPass = self.globalLocationDictionary.fork()
+        nest = self.nest
+        warnings = self.warnings
+        self.warnings = DiagnosticStore(self.aliasFuncs, self.aliasVars)
+        try:
+            self.evaluateProgram(loop, funcName, pbr, self.globalAliasDictionary, self.globalLocationDictionary)
+        except (KeyError, ValueError):
+            self.globalAliasDictionary.restore(aliasPass)
+            self.globalLocationDictionary.restore(locationPass)
+            self.nest = nest
+            self.warnings = warnings
+            self.warnings.add("loop-pass-dropped", (), (line,))
+            return False
+        finally:
+            self.warnings = warnings
+        self.globalAliasDictionary.commit(aliasPass)
+        self.globalLocationDictionary.commit(locationPass)
+        return True
+
+    # the options that change what an analysis reports, part of every summary cache key
+    def optionsKey(self):
+        return ("maxLoopIterations=" + str(self.maxLoopIterations) + ",engine=" + self.engine
+                + ",fullHistory=" + str(self.fullHistory) + ",slicing=" + str(self.slicing))
+
+    # A hashable abstraction of the given entries of a state. Locations are identified by the line they were
+    # allocated on, so the new locations a pass over a loop allocates look the same as those of the pass before
+    # and the passes can converge. Widened, the aliases of the locations are left out, which leaves a small
+    # domain (aliases x allocation lines) that converges fast.
+    def abstractState(self, aliasDictionary, locationDictionary, aliasKeys, locationKeys, widened=False):
+        allocationLines = self.allocationLines
+        aliases = []
+        for alias in aliasKeys:
+            loc = aliasDictionary[alias][-1] if alias in aliasDictionary else None
+            aliases.append((alias, allocationLines[loc] if loc is not None and loc != -1 else loc))
+        if widened:
+            locations = frozenset(allocationLines[loc] for loc in locationKeys)
+        else:
+            locations = frozenset((allocationLines[loc], frozenset(locationDictionary[loc]))
+                                  if loc in locationDictionary else (allocationLines[loc], None)
+                                  for loc in locationKeys)
+        return frozenset(aliases), locations
+
+    # the abstraction of what the loops being evaluated changed since the state was forked at the entry of the
+    # innermost one
+    def loopSignature(self, widened=False):
+        return self.abstractState(self.globalAliasDictionary, self.globalLocationDictionary,
+                                  self.globalAliasDictionary.changedKeys(), self.globalLocationDictionary.changedKeys(),
+                                  widened)
+
+    # Evaluate a loop (decl is the loop decl) to a fixpoint: its body is evaluated again, on the state the pass
+    # before left, until the abstract state (see loopSignature) repeats one seen after an earlier pass, so leaks
+    # that only happen on a second iteration are found. After WIDENING_DELAY passes the comparison is widened,
+    # and maxLoopIterations caps the passes. Loops nested in a later pass of an enclosing loop get one pass only:
+    # they reached their fixpoint in its first pass, and iterating them on every pass would take a number of
+    # passes exponential in the nesting depth.
+    # returns the number of passes and whether the loop converged
+    def evaluateLoop(self, decl, pbr, funcName):
+        # in a later pass of an enclosing loop the warnings are dropped (see evaluateLoopPass)
+        replay = self.loopReplays > 0
+
+        # Copy the current state of the dictionaries
+        aliasBefore = {}
+        if not replay:
+            for key in self.globalAliasDictionary.keys():
+                # note: using tuples to preserve immutability
+                aliasBefore[key] = tuple(self.globalAliasDictionary[key])
+
+        # the state at the entry of the loop is frozen, so what the passes change can be told apart in O(changes)
+        aliasEntry = self.globalAliasDictionary.fork()
+        locationEntry = self.globalLocationDictionary.fork()
+        limit = 1 if replay else self.maxLoopIterations
+        if limit > 1:
+            seen = {self.loopSignature()}
+            seenWidened = {self.loopSignature(widened=True)}
+        passes = 0
+        converged = replay
+
+        # Run through the loop until it converges, adding/removing entries as necessary from the global dictionaries
+        loop = decl.stmt.block_items
+        replaying = False
+        try:
+            while True:
+                if passes == 0:
+                    self.evaluateProgram(loop, funcName, pbr, self.globalAliasDictionary, self.globalLocationDictionary)
+                elif not self.evaluateLoopPass(loop, decl.coord.line, funcName, pbr):
+                    break
+                passes += 1
+                if self.budget is not None:
+                    self.checkBudget(self.globalAliasDictionary, self.globalLocationDictionary)
+                if passes >= limit:
+                    break
+                signature = self.loopSignature()
+                widened = self.loopSignature(widened=True)
+                if signature in seen or (passes > self.wideningDelay and widened in seenWidened):
+                    converged = True
+                    break
+                seen.add(signature)
+                seenWidened.add(widened)
+                if not replaying:
+                    replaying = True
+                    self.loopReplays += 1
+        finally:
+            if replaying:
+                self.loopReplays -= 1
+        self.globalAliasDictionary.commit(aliasEntry)
+        self.globalLocationDictionary.commit(locationEntry)
+
+        # Generate warnings based on differences in the dictionaries' state before and after the loop
+        if not replay:
+            self.generateLoopWarnings(aliasBefore)
+        return passes, converged
+
+    # aliasAfter is the state after the loop, the global alias dictionary by default
+    def generateLoopWarnings(self, aliasBefore, aliasAfter=None):
+        if aliasAfter is None:
+            aliasAfter = self.globalAliasDictionary
+        varsBefore = aliasBefore.keys()
+        varsAfter = aliasAfter.keys()
+
+        # case MALLOC
+        for eachVar in set(varsAfter).difference(varsBefore):
+            currLoc = aliasAfter[eachVar][-1]
+            if currLoc != -1:
+                self.warnings.add("loop-allocated", (eachVar,), (self.getAllocationLine(currLoc),))
+
+        varsInBoth = set(varsBefore).intersection(varsAfter)
+        for eachVar in varsInBoth:
+            oldLoc = aliasBefore[eachVar][-1]
+            newLoc = aliasAfter[eachVar][-1]
+            # case FREE
+            if oldLoc != -1 and newLoc == -1:
+                self.warnings.add("loop-freed", (eachVar,), (self.getLastUsedLine(oldLoc),))
+            # case REALLOCATE
+            elif aliasBefore[eachVar] != tuple(aliasAfter[eachVar]):
+                self.warnings.add("loop-reallocated", (eachVar,))
+
+    # evaluate one function, reusing its cached result when nothing it depends on has changed
+    def evaluateFunction(self, funcDec):
+        if self.summaryCache is None:
+            return self.boundedSummary(funcDec)[0]
+        import summaryCache
+        key = self.summaryCache.functionKey(funcDec, self)
+        entry = self.summaryCache.get(key)
+        if entry is not None:
+            return summaryCache.restoreFunction(self, funcDec, entry)
+        start = summaryCache.beginCapture(self)
+        x, pbr = self.boundedSummary(funcDec)
+        # a function cut short by its budget depends on how long it took, it is not cached
+        if self.budget is None or self.budget.precise:
+            self.summaryCache.put(key, summaryCache.captureFunction(self, funcDec, x, pbr, start))
+        return x
+
+    # summarizeFunction within the budget: a function that goes over it is rolled back and evaluated again
+    # coarsely, its loops in a single pass and its conditionals nested past the limit skipped (an
+    # "analysis-degraded" warning), and given up on when that goes over the budget as well ("analysis-incomplete")
+    def boundedSummary(self, funcDec):
+        budget = self.budget
+        if budget is None:
+            return self.summarizeFunction(funcDec)
+        mark = self.markState()
+        budget.begin()
+        try:
+            return self.summarizeFunction(funcDec)
+        except BudgetExceeded:
+            self.rollBack(mark)
+        budget.begin(coarse=True)
+        maxLoopIterations = self.maxLoopIterations
+        self.maxLoopIterations = 1
+        try:
+            x, pbr = self.summarizeFunction(funcDec)
+            self.warnings.add("analysis-degraded", (), (funcDec.decl.coord.line,))
+            return x, pbr
+        except BudgetExceeded:
+            self.rollBack(mark)
+        finally:
+            self.maxLoopIterations = maxLoopIterations
+            budget.coarse = False
+        self.warnings.add("analysis-incomplete", (), (funcDec.decl.coord.line,))
+        return PassByReference(funcDec.decl.name, [], [], [], [], {}, [], None, {}), False
+
+    # raise BudgetExceeded once the function being evaluated went over its time or state size budget
+    def checkBudget(self, aliasDictionary, locationDictionary):
+        self.budget.check(len(aliasDictionary) + len(locationDictionary))
+
+    # what the evaluation of a function adds to the state (which only holds that function, see exitFunction)
+    def markState(self):
+        return self.memloc, len(self.warnings), len(self.referenceFuncs), self.nest, self.loopReplays
+
+    # drop everything a function's evaluation added to the state since markState
+    def rollBack(self, mark):
+        memloc, warnings, referenceFuncs, self.nest, self.loopReplays = mark
+        self.memloc = memloc
+        del self.allocationLines[memloc:]
+        del self.lastUsedLines[memloc:]
+        self.warnings.truncate(warnings)
+        for x in self.referenceFuncs[referenceFuncs:]:
+            if self.referenceFuncIndex.get(x.funcName) is x:
+                del self.referenceFuncIndex[x.funcName]
+        del self.referenceFuncs[referenceFuncs:]
+        self.globalLocationDictionary = self.stateDictClass(countValues=True)
+        self.globalAliasDictionary = self.stateDictClass(maxHistory=self.globalAliasDictionary.maxHistory)
+
+    # the variables of a function to track while it is evaluated (see heapPointers), all of them without slicing
+    def sliceFunction(self, funcDec):
+        self.heapPointers = heapPointers(funcDec, self.functionIndex.__contains__) if self.slicing else None
+
+    # evaluate the body of a function on the global dictionaries
+    def evaluateBody(self, funcDec, passByRef):
+        if self.engine == "cfg":
+            import cfgEngine
+            (self.cfgEngineClass or cfgEngine.CfgEngine)(self).evaluateFunction(funcDec, passByRef)
+        else:
+            self.evaluateProgram(funcDec.body.block_items, funcDec.decl.name, passByRef, self.globalAliasDictionary,
+                                 self.globalLocationDictionary, blockScopedNames(funcDec))
+
+    # evaluate one function and fold what it did to its pointer parameters into its PassByReference summary
+    # returns the summary and whether it was registered as a pass by reference function
+    def summarizeFunction(self, funcDec):
+        pbr = False
+        x = PassByReference(funcDec.decl.name, [], [], [], [], {}, [], None, {})
+        if funcDec.decl.type.args is not None:
+            for paramIndex, param in enumerate(funcDec.decl.type.args.params):
+                if(type(param.type) == c_ast.PtrDecl):
+                    pbr = True
+                    x.addParam(param.name, paramIndex)
+        if pbr:
+            self.addReferenceFunc(x)
+        self.sliceFunction(funcDec)
+        self.evaluateBody(funcDec, x)
+        alreadyMallocedVars = []
+        alreadyMalloced = []
+        for key in x.refNormVars:
+            aliasedNormVar = self.internAlias(funcDec.decl.name, x.refNormVars[key])
+            if not isinstance(self.globalAliasDictionary[aliasedNormVar], type(None)) and not x.morf[x.varIndex[key]]:
+                #MALLOC
+                if self.globalAliasDictionary[aliasedNormVar][-1] != -1:
+                    if self.globalAliasDictionary[aliasedNormVar] not in alreadyMalloced:
+                        if x.free[x.varIndex[key]]:
+                            x.free[x.varIndex[key]] = False
+                        x.malloc[x.varIndex[key]] = True
+                        alreadyMallocedVars.append(key)
+                        alreadyMalloced.append(self.globalAliasDictionary[aliasedNormVar])
+                    else:
+                        varToRef = alreadyMallocedVars[alreadyMalloced.index(self.globalAliasDictionary[aliasedNormVar])]
+                        if varToRef in x.reference:
+                            x.reference[varToRef].append(key)
+                        else:
+                            x.reference[varToRef] = [key]
+                #FREE
                 else:
-                    x.free[x.varNames.index(key)] = True
+                    if x.malloc[x.varIndex[key]]:
+                        x.malloc[x.varIndex[key]] = False
+                    else:
+                        x.free[x.varIndex[key]] = True
+        return x, pbr
+
+    # generate leak info: the leaks found as the functions returned, and any location still allocated
+    def generateLeaks(self):
+        self.addLeaks(self.leaks, self.globalLocationDictionary)
+        return self.leaks
+
+    # add the leaks of the given locations to a DiagnosticStore
+    def addLeaks(self, leaks, locations):
+        for loc in locations:
+            aliasesPointingToLoc = self.globalLocationDictionary[loc]
+            lines = (self.getAllocationLine(loc), self.getLastUsedLine(loc))
+            if len(aliasesPointingToLoc) > 0:
+                leaks.add("leak", tuple(aliasesPointingToLoc), lines)
+            else:
+                leaks.add("leak-unreferenced", (), lines)
+
+
+def generateOutput(result, outputFormat="text"):
+    # print leak info, then warning info (from conditionals & loops)
+    if outputFormat == "text":
+        print(result, end="")
+    elif outputFormat == "jsonl":
+        import outputStream
+        writer = outputStream.JsonLinesWriter()
+        outputStream.writeResult(writer, result)
+        writer.close()
+    else:
+        import diagnostics
+        print(diagnostics.toJson([result]) if outputFormat == "json" else diagnostics.toSarif([result]))
+
+
+# record the results of the run in the --results-db database
+def recordResults(args, results, started, analyzerOptions):
+    import resultsStore
+    # the options that change what the analysis reports, the preprocessor and diff scope are objects
+    options = {name: value for name, value in analyzerOptions.items() if name not in ("preprocessor", "diffScope")}
+    options["cpp"] = args.cpp
+    options["diff"] = args.diff is not None or args.git_diff is not None
+    try:
+        resultsStore.recordRun(args.results_db, results, args.results_label or os.getcwd(), started, options)
+    except resultsStore.StoreError as e:
+        print("ERROR: " + str(e), file=sys.stderr)
+        sys.exit(2)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # the query subcommand reads a results database (see resultsStore), unless a file is named query
+    if argv and argv[0] == "query" and not os.path.exists("query"):
+        import resultsStore
+        sys.exit(resultsStore.queryMain(argv[1:]))
+    started = time.time()
+    argparser = argparse.ArgumentParser('memLeakTracker.py')
+    argparser.add_argument('c_filename', nargs='*',
+                            help='name of file to parse, or several files, directories, globs or a compile_commands.json to analyze a whole project')
+    argparser.add_argument('-j', '--jobs', type=int, default=None,
+                            help='number of worker processes in project mode (default: number of cores), or of processes the functions of a single large file are spread over (default: 1)')
+    argparser.add_argument('--timings', action='store_true',
+                            help='in project mode, list the wall time of every file instead of only the slowest ones')
+    argparser.add_argument('--summary-cache', metavar='DIR', default=None,
+                            help='directory of a per-function result cache to reuse across runs (safe to share between workers)')
+    argparser.add_argument('--format', choices=['text', 'json', 'jsonl', 'sarif'], default='text',
+                            help='output format of the leaks and warnings, text, jsonl (JSON Lines) and sarif are written as '
+                                 'the analysis goes, json at the end (default: text)')
+    argparser.add_argument('--max-diagnostics', metavar='N', type=int, default=None,
+                            help='stop the analysis after N leaks and warnings')
+    argparser.add_argument('--fail-fast', action='store_true',
+                            help='stop the analysis at the first leak, and exit with status 1 when there is one')
+    argparser.add_argument('--ast-cache', metavar='DIR', default=None,
+                            help='directory of a cache of parsed files, so unchanged files are not parsed again')
+    argparser.add_argument('--ast-cache-size', metavar='MB', type=int, default=512,
+                            help='size limit of the ast cache, least recently used files are evicted (default: 512)')
+    argparser.add_argument('--cache-stats', action='store_true',
+                            help='print the hits and misses of the caches to stderr')
+    argparser.add_argument('--profile', action='store_true',
+                            help='print where the time went (phases, functions, counters) to stderr and write a Chrome trace')
+    argparser.add_argument('--trace-file', metavar='PATH', default='memLeakTracker.trace.json',
+                            help='where --profile writes the Chrome trace (default: memLeakTracker.trace.json)')
+    argparser.add_argument('--watch', action='store_true',
+                            help='keep running and re-analyze the files whenever they change (only the changed functions are evaluated again)')
+    argparser.add_argument('--watch-interval', metavar='SECONDS', type=float, default=0.2,
+                            help='how often --watch checks the files for changes (default: 0.2)')
+    argparser.add_argument('--loop-iterations', metavar='N', type=int, default=MAX_LOOP_ITERATIONS,
+                            help='passes over a loop body before its fixpoint is given up on, 1 for a single pass (default: '
+                                 + str(MAX_LOOP_ITERATIONS) + ')')
+    argparser.add_argument('--engine', choices=('ast', 'cfg'), default='ast',
+                            help='how function bodies are evaluated: ast walks their statements, cfg runs a worklist over '
+                                 'their control-flow graph and models switch, break, continue, goto and early returns (default: ast)')
+    argparser.add_argument('--full-history', action='store_true',
+                            help='keep every location a pointer has pointed to in the analysis state, rather than the last '
+                                 + str(HISTORY_LENGTH))
+    argparser.add_argument('--cpp', action='store_true',
+                            help='run the files through the C preprocessor first, with stub headers for the C library, so '
+                                 'files with #include, #define and comments can be analyzed')
+    argparser.add_argument('-I', dest='include_dirs', metavar='DIR', action='append', default=[],
+                            help='with --cpp, a directory to search for included headers (can be repeated)')
+    argparser.add_argument('-D', dest='defines', metavar='NAME[=VALUE]', action='append', default=[],
+                            help='with --cpp, a macro to define (can be repeated)')
+    argparser.add_argument('--cpp-cache', metavar='DIR', default=None,
+                            help='with --cpp, directory of a cache of preprocessed headers to reuse across runs')
+    argparser.add_argument('--function-timeout', metavar='SECONDS', type=float, default=None,
+                            help='budget of wall time of every function: a function over its budget is analyzed again '
+                                 'coarsely, and given up on when it goes over it again')
+    argparser.add_argument('--max-state-size', metavar='N', type=int, default=None,
+                            help='budget of pointers and memory locations tracked at once in every function')
+    argparser.add_argument('--max-nesting', metavar='N', type=int, default=None,
+                            help='budget of conditionals nested in each other in every function, the coarse analysis '
+                                 'skips the ones nested deeper')
+    argparser.add_argument('--prefilter', action='store_true',
+                            help='skip the functions without heap activity (no malloc, free, pointer parameters or calls '
+                                 'to functions of the file), and the files with nothing else, without parsing them')
+    argparser.add_argument('--slice', action='store_true',
+                            help='leave the pointers that never hold heap memory out of the analysis state, which keeps it '
+                                 'smaller (loops can reach their fixpoint a pass sooner)')
+    argparser.add_argument('--reachable', action='store_true',
+                            help='only analyze the functions reachable from the entry functions (main unless --entry is '
+                                 'given), files without any of them are analyzed in full')
+    argparser.add_argument('--entry', metavar='NAME', action='append', default=None,
+                            help='an entry function of --reachable (can be repeated, implies --reachable)')
+    argparser.add_argument('--unreachable-pass', action='store_true',
+                            help='with --reachable, analyze the unreachable functions too, after the reachable ones and '
+                                 'reported after them')
+    argparser.add_argument('--per-function', action='store_true',
+                            help='parse and analyze files one function at a time, for very large files or files with syntax errors: '
+                                 'a function that does not parse is skipped and reported, and -j parses functions in parallel')
+    argparser.add_argument('--diff', metavar='PATCH', default=None,
+                            help='only analyze and report the functions a unified diff changes and the callers it affects '
+                                 '(PATCH is a file, - for stdin), the files analyzed are the C files it changes')
+    argparser.add_argument('--git-diff', metavar='REVISIONS', default=None,
+                            help='the same for the changes of a git revision range (e.g. origin/main...HEAD), or of the '
+                                 'working tree since a revision')
+    argparser.add_argument('--baseline', metavar='FILE', default=None,
+                            help='with --diff or --git-diff, do not report the leaks and warnings already in a baseline '
+                                 'saved by --write-baseline')
+    argparser.add_argument('--write-baseline', metavar='FILE', default=None,
+                            help='save the leaks and warnings of this run as a baseline for --baseline')
+    argparser.add_argument('--results-db', metavar='PATH', default=None,
+                            help='record the leaks, warnings, function summaries and timings of this run in a SQLite '
+                                 'database, which `memLeakTracker.py query PATH ...` answers questions about across runs')
+    argparser.add_argument('--results-label', metavar='NAME', default=None,
+                            help='with --results-db, the label of this run, runs are compared with the earlier runs of '
+                                 'their label (default: the current directory)')
+    argparser.add_argument('--lsp', action='store_true',
+                            help='run as a language server on stdin/stdout, publishing leaks and warnings as diagnostics')
+    args = argparser.parse_args(argv)
+
+    # keyword arguments of every Analyzer the run creates
+    analyzerOptions = {"maxLoopIterations": max(1, args.loop_iterations), "engine": args.engine,
+                       "fullHistory": args.full_history, "perFunction": args.per_function,
+                       "functionTimeout": args.function_timeout, "maxStateSize": args.max_state_size,
+                       "maxNesting": args.max_nesting, "prefilter": args.prefilter, "slicing": args.slice}
+    if args.reachable or args.entry is not None:
+        analyzerOptions["entryPoints"] = args.entry or ["main"]
+        analyzerOptions["unreachablePass"] = args.unreachable_pass
+    elif args.unreachable_pass:
+        argparser.error("--unreachable-pass needs --reachable or --entry")
+    if args.cpp:
+        import preprocessor
+        analyzerOptions["preprocessor"] = preprocessor.Preprocessor(args.include_dirs, args.defines, args.cpp_cache)
+
+    diff = args.diff is not None or args.git_diff is not None
+    if diff:
+        if args.lsp or args.watch or args.per_function:
+            argparser.error("--diff and --git-diff cannot be combined with --lsp, --watch or --per-function")
+        import diffMode
+        import projectMode
+        try:
+            changes = diffMode.readDiff(args.diff) if args.diff is not None else diffMode.gitChanges(args.git_diff)
+            baseline = diffMode.readBaseline(args.baseline) if args.baseline is not None else None
+        except (OSError, diffMode.DiffError) as e:
+            argparser.error(str(e))
+        analyzerOptions["diffScope"] = diffMode.DiffScope(changes, baseline)
+        # the C files of the change, only those among the given files when there are any
+        files = [path for path in sorted(changes) if path.endswith(".c") and os.path.isfile(path)]
+        if args.c_filename:
+            given = set(map(diffMode.normalizePath, projectMode.collectFiles(args.c_filename)))
+            files = [path for path in files if path in given]
+        if not files:
+            print("No C files changed")
+            return
+        args.c_filename = files
+    elif args.baseline is not None:
+        argparser.error("--baseline needs --diff or --git-diff")
+    if args.results_db is not None and (args.lsp or args.watch):
+        argparser.error("--results-db cannot be combined with --lsp or --watch")
+
+    if args.lsp:
+        import daemonMode
+        sys.exit(daemonMode.serveLsp(analyzerOptions=analyzerOptions))
+    if not args.c_filename:
+        argparser.error("the following arguments are required: c_filename")
+    if args.watch:
+        import daemonMode
+        daemonMode.watch(args.c_filename, args.watch_interval, args.format, analyzerOptions)
+        return
 
-generateOutput()
+    # a single existing file is the common case (editor and pre-commit hooks), it is analyzed without
+    # loading project mode and its process pool machinery
+    # (a diff is reported like a project, one section per file)
+    single = (not diff and len(args.c_filename) == 1 and os.path.isfile(args.c_filename[0])
+              and os.path.basename(args.c_filename[0]) != "compile_commands.json")
+    if not single:
+        import projectMode
+    if not single and (diff or projectMode.isProject(args.c_filename)):
+        results = projectMode.runProject(args.c_filename, args.jobs, args.timings, args.summary_cache, args.format,
+                                         args.trace_file if args.profile else None, args.ast_cache,
+                                         args.ast_cache_size * 1024 * 1024, analyzerOptions, args.max_diagnostics,
+                                         args.fail_fast)
+        if args.write_baseline is not None:
+            import diffMode
+            diffMode.writeBaseline(results, args.write_baseline)
+        if args.results_db is not None:
+            recordResults(args, results, started, analyzerOptions)
+        # a file that failed fails the run, as it does on its own
+        if any(r.error is not None for r in results) or (args.fail_fast and any(r.hasLeaks() for r in results)):
+            sys.exit(1)
+        return
+    args.c_filename = args.c_filename[0]
+
+    cache = None
+    if args.summary_cache is not None:
+        import summaryCache
+        cache = summaryCache.SummaryCache(args.summary_cache)
+    asts = None
+    if args.ast_cache is not None:
+        import astCache
+        asts = astCache.AstCache(args.ast_cache, args.ast_cache_size * 1024 * 1024)
+    if args.profile:
+        import profiler
+        analyzer = profiler.ProfilingAnalyzer(cache, asts, **analyzerOptions)
+    else:
+        analyzer = Analyzer(cache, asts, args.jobs or 1, **analyzerOptions)
+    # the diagnostics are written as every function finishes, except for json which is one document written at the end
+    import outputStream
+    analyzer.output = outputStream.WRITERS[args.format](sys.stdout, args.max_diagnostics, args.fail_fast)
+    fileStart = time.perf_counter()
+    result = analyzer.analyzeFile(args.c_filename)
+    result.seconds = time.perf_counter() - fileStart
+    # for testing
+    # result = analyzer.analyzeSource(testProgram)
+    if args.profile:
+        with result.profile.phase("output"):
+            analyzer.output.close()
+        profiler.printSummary(result.profile)
+        profiler.writeTrace([result.profile], args.trace_file)
+    else:
+        analyzer.output.close()
+    if args.write_baseline is not None:
+        import diffMode
+        diffMode.writeBaseline([result], args.write_baseline)
+    if args.results_db is not None:
+        recordResults(args, [result], started, analyzerOptions)
+    if args.cache_stats:
+        for c in (cache, asts, analyzer.preprocessor, analyzer.entryPoints):
+            if c is not None:
+                print(c.stats(), file=sys.stderr)
+    # what the prefilter skipped is reported whenever it is on, as the project timings do
+    if analyzer.prefilter is not None:
+        print(analyzer.prefilter.stats(), file=sys.stderr)
+    if args.fail_fast and result.hasLeaks():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
 
 # Old prints, leaving in for testing.
-# ast.show(showcoord=True)
-# print("LOCATION DICT (an unempty dict implies mem leak): " + str(globalLocationDictionary))
-# print("ALIAS DICT: " + str(globalAliasDictionary))
\ No newline at end of file
+# result.ast.show(showcoord=True)
+# print("LOCATION DICT (an unempty dict implies mem leak): " + str(analyzer.globalLocationDictionary))
+# print("ALIAS DICT: " + str(analyzer.globalAliasDictionary))
@@ -0,0 +1,241 @@
+# Streaming output: leaks and warnings are written as the analysis finds them instead of all at the end
+#
+# The analyzer hands a writer the diagnostics of every function as soon as the function is finished (see
+# Analyzer.exitFunction), so a long run shows its first results right away and the messages do not pile up
+# in memory. Writes are collected in a buffer that is flushed when it grows big or has waited long enough, and
+# at the end of every file.
+#
+# Every writer also enforces the limits of the run: with maxDiagnostics it stops after that many diagnostics,
+# with failFast after the first leak. The analyzer checks `done` after every function and stops evaluating
+# the rest of the file (and project mode the rest of the files) once it is set.
+
+import sys
+import time
+
+import diagnostics
+
+# characters buffered before they are written out, and the longest a write waits in the buffer (in seconds)
+BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.2
+
+
+# The limits of a run without any output, what the workers of project mode use to stop a file early
+class DiagnosticSink:
+    def __init__(self, maxDiagnostics=None, failFast=False):
+        self.maxDiagnostics = maxDiagnostics
+        self.failFast = failFast
+        # diagnostics and leaks written so far
+        self.count = 0
+        self.leakCount = 0
+
+    # true once the limits are reached, nothing more is written
+    @property
+    def done(self):
+        return ((self.maxDiagnostics is not None and self.count >= self.maxDiagnostics)
+                or (self.failFast and self.leakCount > 0))
+
+    # the diagnostics that fit in the limits
+    def admit(self, records):
+        if self.done:
+            return []
+        if self.maxDiagnostics is not None:
+            records = records[:self.maxDiagnostics - self.count]
+        self.count += len(records)
+        return records
+
+    def beginFile(self, filename):
+        self.filename = filename
+
+    # the leaks and warnings of one function (or of a whole file analyzed elsewhere)
+    # (with failFast only the first leak is written, the warnings of its function still are)
+    def write(self, leaks, warnings):
+        leaks = self.admit(list(leaks)[:1] if self.failFast else list(leaks))
+        self.leakCount += len(leaks)
+        self.emit(leaks, self.admit(list(warnings)))
+
+    def emit(self, leaks, warnings):
+        pass
+
+    # the end of the file's report, result is its AnalysisResult
+    def endFile(self, result):
+        pass
+
+    def close(self):
+        pass
+
+
+# The diagnostics of functions evaluated ahead of being written (callees first, see Analyzer.evaluateFunctions), to
+# stop evaluating once the writer is bound to reach its limits when they are written
+class PendingDiagnostics:
+    def __init__(self, sink):
+        self.sink = sink
+        self.count = 0
+        self.leakCount = 0
+
+    def add(self, leaks, warnings):
+        self.count += leaks + warnings
+        self.leakCount += leaks
+
+    @property
+    def done(self):
+        return ((self.sink.maxDiagnostics is not None and self.sink.count + self.count >= self.sink.maxDiagnostics)
+                or (self.sink.failFast and self.sink.leakCount + self.leakCount > 0))
+
+
+class BufferedWriter(DiagnosticSink):
+    def __init__(self, out=None, maxDiagnostics=None, failFast=False):
+        DiagnosticSink.__init__(self, maxDiagnostics, failFast)
+        self.out = out if out is not None else sys.stdout
+        self.buffer = []
+        self.buffered = 0
+        self.lastFlush = time.perf_counter()
+
+    def put(self, text):
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= BUFFER_SIZE or time.perf_counter() - self.lastFlush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.out.write("".join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+        self.out.flush()
+        self.lastFlush = time.perf_counter()
+
+    def close(self):
+        self.flush()
+
+
+# The text report. Leaks are written as they come and warnings (records, not text) are held until the end of
+# the file, so the report reads exactly like the one printed at the end: leaks first, then warnings.
+# With headers, every file starts with a "=== filename" line, as in project mode.
+class TextWriter(BufferedWriter):
+    def __init__(self, out=None, maxDiagnostics=None, failFast=False, headers=False):
+        BufferedWriter.__init__(self, out, maxDiagnostics, failFast)
+        self.headers = headers
+
+    def beginFile(self, filename):
+        BufferedWriter.beginFile(self, filename)
+        self.leaksWritten = 0
+        self.warnings = []
+        if self.headers:
+            self.put("=== " + filename + "\n")
+
+    def emit(self, leaks, warnings):
+        for d in leaks:
+            self.put(("\n" if self.leaksWritten == 0 else "\n\n") + str(d))
+            self.leaksWritten += 1
+        self.warnings += warnings
+
+    def endFile(self, result):
+        if result.error is not None:
+            self.put("\nERROR: " + result.error + "\n\n")
+        else:
+            if self.leaksWritten:
+                self.put("\n")
+            if self.warnings:
+                self.put("\n" + "\n\n".join(map(str, self.warnings)) + "\n")
+            self.put("\n" if self.leaksWritten or self.warnings else "\nNo memory leaks detected!\n\n")
+        self.warnings = []
+        self.flush()
+
+
+# JSON Lines: one object per diagnostic (file, kind, variables, lines and message) and one per failed file
+class JsonLinesWriter(BufferedWriter):
+    def emit(self, leaks, warnings):
+        import json
+        for d in leaks + warnings:
+            self.put(json.dumps(dict(file=self.filename, **d.toDict())) + "\n")
+
+    def endFile(self, result):
+        import json
+        if result.error is not None:
+            self.put(json.dumps({"file": result.filename, "error": result.error}) + "\n")
+        self.flush()
+
+
+# A SARIF 2.1.0 log written as it goes: the results array is opened at the start, every diagnostic is
+# appended to it, and the failed files are added as notifications when the log is closed
+class SarifWriter(BufferedWriter):
+    def __init__(self, out=None, maxDiagnostics=None, failFast=False):
+        BufferedWriter.__init__(self, out, maxDiagnostics, failFast)
+        self.notifications = []
+        self.results = 0
+        self.started = False
+
+    # the log is only started with the first file, a run that fails before it prints nothing
+    def start(self):
+        import json
+        if not self.started:
+            self.started = True
+            self.put('{"$schema": "https://json.schemastore.org/sarif-2.1.0.json", "version": "2.1.0", "runs": [{\n'
+                     + '"tool": ' + json.dumps(diagnostics.sarifTool()) + ',\n"results": [')
+
+    def beginFile(self, filename):
+        BufferedWriter.beginFile(self, filename)
+        self.start()
+
+    def emit(self, leaks, warnings):
+        import json
+        for d in leaks + warnings:
+            self.put(("\n" if self.results == 0 else ",\n") + json.dumps(diagnostics.sarifResult(self.filename, d)))
+            self.results += 1
+
+    def endFile(self, result):
+        if result.error is not None:
+            self.notifications.append(diagnostics.sarifNotification(result))
+        self.flush()
+
+    def close(self):
+        import json
+        self.start()
+        self.put("\n]")
+        if self.notifications:
+            self.put(',\n"invocations": ' + json.dumps([{"executionSuccessful": False,
+                                                          "toolExecutionNotifications": self.notifications}]))
+        self.put("\n}]}\n")
+        self.flush()
+
+
+# The JSON report, one document for every file: it can only be written once it is complete, when the writer is
+# closed, but it holds the same diagnostics as the streamed formats
+class JsonWriter(DiagnosticSink):
+    def __init__(self, out=None, maxDiagnostics=None, failFast=False):
+        DiagnosticSink.__init__(self, maxDiagnostics, failFast)
+        self.out = out if out is not None else sys.stdout
+        self.files = []
+
+    def beginFile(self, filename):
+        DiagnosticSink.beginFile(self, filename)
+        self.leaks = []
+        self.warnings = []
+
+    def emit(self, leaks, warnings):
+        self.leaks += leaks
+        self.warnings += warnings
+
+    def endFile(self, result):
+        self.files.append(diagnostics.fileToDict(result.filename, result.error, self.leaks, self.warnings))
+
+    def close(self):
+        import json
+        self.out.write(json.dumps(self.files, indent=2) + "\n")
+        self.out.flush()
+
+
+# < key=--format, value=writer class > of every format
+WRITERS = {
+    "text": TextWriter,
+    "json": JsonWriter,
+    "jsonl": JsonLinesWriter,
+    "sarif": SarifWriter,
+}
+
+# Write the report of a file analyzed elsewhere (a worker, the daemon) through a writer in one go
+def writeResult(writer, result):
+    writer.beginFile(result.filename)
+    if result.error is None:
+        writer.write(result.leaks, result.warnings)
+    writer.endFile(result)
@@ -0,0 +1,106 @@
+# Lexical prefilter: functions and files without heap activity are not evaluated, or not even parsed
+#
+# Most functions of a code base never allocate or free memory, and evaluating one that does not cannot report
+# anything: the analysis state only ever gets a memory location from malloc, from the result of a call to a
+# function of the file (`p = make()`) or from the pass by reference summary of one, and without a location
+# there is no leak and no warning. So before a file is parsed its text is scanned (with chunkParser.scanChunks)
+# for the function definitions in it, and a function is trivial when its text has no `malloc` or `free`, its
+# header no pointer parameter (it would have a summary its callers see) and its body no call to a function
+# defined in the file. Trivial functions are not evaluated, and a file whose functions are all trivial is not
+# parsed at all. The scan only ever over-approximates: a word in a comment or a string, or a call that is
+# really a macro, makes a function non-trivial. When the scan cannot account for every definition of a file
+# (a definition it cannot name, or an old-style one whose parameters are declared before its body) nothing in
+# the file is skipped.
+#
+# The report of a file is the same with the prefilter as without, except that a file it skips is not parsed, so
+# a syntax error in it is not reported either.
+
+import re
+
+import chunkParser
+from chunkParser import CALL, decode, pattern, scanChunks, splitHeader
+
+HEAP = re.compile(r"\b(?:malloc|free)\b")
+# a chunk that is the body of an old-style definition: its code starts with a brace
+BODY_CHUNK = re.compile(r"(?:\s|//[^\n]*|/\*.*?\*/)*\{", re.S)
+# memory-mapped files are scanned with the bytes versions of the patterns, as in chunkParser
+chunkParser.BYTES_PATTERNS.update({p: re.compile(p.pattern.encode(), p.flags & ~re.UNICODE) for p in (HEAP, BODY_CHUNK)})
+
+
+# What the scan of a file found: the names of its function definitions, those of its trivial ones, and whether
+# it accounted for all of them
+class FileScan:
+    def __init__(self, definitions, names, trivial, complete):
+        # number of function definitions
+        self.definitions = definitions
+        self.names = names
+        self.trivial = trivial
+        self.complete = complete
+
+    # true when nothing in the file needs to be parsed
+    def skipsFile(self):
+        return self.complete and self.trivial == self.names
+
+    # The FuncDefs of a parsed file that are evaluated. The parse has the last word: a definition the scan did
+    # not see means it missed something, and then every function is.
+    def select(self, functions):
+        if not self.complete or any(str(funcDec.decl.name) not in self.names for funcDec in functions):
+            return functions
+        return [funcDec for funcDec in functions if str(funcDec.decl.name) not in self.trivial]
+
+
+# The names of the trivial functions among functions, a list of (name, span, calls) of the definitions of source
+# (see chunkParser.FunctionChunk)
+def trivialNames(source, functions):
+    heap = pattern(HEAP, source)
+    defined = set(name for name, span, calls in functions)
+    nonTrivial = set()
+    for name, span, calls in functions:
+        if (name is None or not calls.isdisjoint(defined) or heap.search(source, span.start, span.end)
+                or "*" in splitHeader(decode(source[span.head:span.body]))[1]):
+            nonTrivial.add(name)
+    return defined - nonTrivial
+
+
+# The prefilter of an Analyzer, it counts what it skipped
+class Prefilter:
+    def __init__(self):
+        self.functions = 0
+        self.skippedFunctions = 0
+        self.files = 0
+        self.skippedFiles = 0
+
+    # the FileScan of C source text (a str, or bytes such as a memory-mapped file)
+    def scan(self, source):
+        call = pattern(CALL, source)
+        body = pattern(BODY_CHUNK, source)
+        functions = []
+        complete = True
+        for span in scanChunks(source):
+            if span.body is not None:
+                name = splitHeader(decode(source[span.head:span.body]))[0]
+                functions.append((name, span, set(decode(n) for n in call.findall(source, span.body, span.end))))
+                complete = complete and name is not None
+            elif body.match(source, span.start, span.end):
+                complete = False
+        return FileScan(len(functions), set(name for name, span, calls in functions), trivialNames(source, functions),
+                        complete)
+
+    # The positions of the trivial chunks of a chunkParser.FunctionChunks, in per-function mode (which only ever
+    # knows the definitions it scanned, so they are always all accounted for)
+    def trivialChunks(self, chunks):
+        trivial = trivialNames(chunks.source, [(chunk.name, chunk.span, chunk.calls) for chunk in chunks.functions])
+        return set(chunk.position for chunk in chunks.functions if chunk.name in trivial)
+
+    # count the functions of a file and those skipped, returns (skipped, functions) for its AnalysisResult
+    def count(self, functions, skipped):
+        self.files += 1
+        self.functions += functions
+        self.skippedFunctions += skipped
+        if functions == skipped:
+            self.skippedFiles += 1
+        return skipped, functions
+
+    def stats(self):
+        return ("prefilter: skipped " + str(self.skippedFunctions) + " of " + str(self.functions) + " functions, "
+                + str(self.skippedFiles) + " of " + str(self.files) + " files without heap activity")
@@ -0,0 +1,223 @@
+# Preprocessing: C files with #include, #define or comments are run through the C preprocessor before parsing
+#
+# Most of what cpp reads for a file is the headers it includes, and the files of a project include the same few
+# headers over and over. So a file is split into its prelude, the #include, #define and comment lines it starts
+# with, and its body. The prelude is preprocessed on its own, once per distinct prelude, include path and define
+# set: the declarations the headers expand to and the macros they leave defined are kept in a cache (in memory,
+# and in a directory when one is given, which several processes can share). An entry lists the headers it was
+# made from with the hash of their content and is not used any more once one of them changed. The body only goes
+# through cpp when it needs it (a directive, a comment or a macro of the prelude), with the prelude's macros in
+# front of it, and the cached declarations are spliced in front of the result. Preprocessing a project therefore
+# costs one run over the headers per distinct set of them, not one per file.
+#
+# The C library headers are replaced by the stubs of fakeLibc (in the style of pycparser's fake_libc_include):
+# they only declare the types, objects and constants code needs to parse, which keeps the declarations spliced
+# into every file small and free of the compiler extensions pycparser cannot parse.
+
+import os
+import re
+import json
+import hashlib
+import tempfile
+import subprocess
+
+# the stub headers standing in for the C library
+FAKE_LIBC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakeLibc")
+# part of every cache key, changing the format of an entry starts a fresh cache
+VERSION = "1"
+
+# the directives a prelude is made of
+PRELUDE_DIRECTIVE = re.compile(r"[ \t]*#[ \t]*(?:include|define|undef)\b")
+QUOTE_INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*"', re.M)
+# a line marker of cpp's output: # <line> "<file>" <flags>
+LINE_MARKER = re.compile(r'# \d+ "((?:\\.|[^"\\])*)"')
+MACRO_NAME = re.compile(r"#[ \t]*(?:define|undef)[ \t]+(\w+)")
+IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+# a body with any of these needs cpp even when it uses none of the prelude's macros
+NEEDS_CPP = re.compile(r"^[ \t]*#|/\*|//", re.M)
+# the pseudo files of cpp's output that are not headers
+PSEUDO_FILES = ("<stdin>", "<built-in>", "<command-line>")
+
+
+class PreprocessError(Exception):
+    pass
+
+
+# Split C source text into its prelude (the blank, comment, #include and single line #define and #undef lines it
+# starts with) and its body, returns (prelude, body, line the body starts on)
+def splitPrelude(text):
+    lines = text.splitlines(True)
+    end = 0
+    inComment = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if inComment or stripped.startswith("/*"):
+            close = stripped.find("*/", 0 if inComment else 2)
+            inComment = close < 0
+            if not inComment and stripped[close + 2:].strip():
+                break
+        elif stripped and not stripped.startswith("//"):
+            # a directive continued on the next line, or opening a comment, ends the prelude
+            if (not PRELUDE_DIRECTIVE.match(line) or stripped.endswith("\\")
+                    or ("/*" in stripped and "*/" not in stripped.rsplit("/*", 1)[1])):
+                break
+        if not inComment:
+            end = i + 1
+    return "".join(lines[:end]), "".join(lines[end:]), end + 1
+
+def lineMarker(line, filename):
+    return '# ' + str(line) + ' "' + filename.replace("\\", "\\\\").replace('"', '\\"') + '"\n'
+
+# Split the output of cpp -dD into the declarations (with their line markers) and the macros defined and
+# undefined, leaving out those cpp predefines. Returns (declarations, macros, < key=macro name, value=True >,
+# header files it read).
+def splitOutput(output):
+    declarations = []
+    macros = []
+    macroNames = {}
+    headers = []
+    current = "<stdin>"
+    for line in output.splitlines(True):
+        m = LINE_MARKER.match(line)
+        if m is not None:
+            current = m.group(1).replace('\\"', '"').replace("\\\\", "\\")
+            if current not in PSEUDO_FILES and current not in headers:
+                headers.append(current)
+            if current != "<built-in>":
+                declarations.append(line)
+            continue
+        if current == "<built-in>":
+            continue
+        m = MACRO_NAME.match(line)
+        if m is not None:
+            macros.append(line)
+            if line.lstrip("# \t").startswith("define"):
+                macroNames[m.group(1)] = True
+            else:
+                macroNames.pop(m.group(1), None)
+        elif current != "<stdin>" and current != "<command-line>":
+            declarations.append(line)
+    return "".join(declarations), "".join(macros), macroNames, headers
+
+
+class Preprocessor:
+    # includeDirs are searched for #include <...> (after fakeLibc) and #include "..." (after the file's directory)
+    # defines are NAME or NAME=VALUE, as for cpp -D
+    # cacheDir is an optional directory the preprocessed preludes are kept in across runs
+    def __init__(self, includeDirs=(), defines=(), cacheDir=None, cpp="cpp"):
+        self.includeDirs = [os.path.abspath(d) for d in includeDirs]
+        self.defines = list(defines)
+        self.cacheDir = cacheDir
+        self.cpp = cpp
+        # < key=prelude key, value=entry > of the preludes preprocessed or loaded by this process
+        self.entries = {}
+        # < key=header path, value=(mtime, size, sha256 of its content) >
+        self.fileHashes = {}
+        self.hits = 0
+        self.misses = 0
+        if cacheDir is not None:
+            os.makedirs(cacheDir, exist_ok=True)
+
+    # the text of a C file ready for the parser: the declarations of its headers followed by its preprocessed body
+    # (with line markers, so the coords of the body's nodes are those of the file)
+    def preprocess(self, text, filename='<none>'):
+        prelude, body, bodyLine = splitPrelude(text)
+        quoteDir = None
+        if QUOTE_INCLUDE.search(prelude):
+            quoteDir = os.path.dirname(os.path.abspath(filename))
+        entry = self.preludeEntry(prelude, quoteDir, filename)
+        if NEEDS_CPP.search(body) or not entry["macroNames"].keys().isdisjoint(IDENTIFIER.findall(body)):
+            body = self.run(entry["macros"] + lineMarker(bodyLine, filename) + body,
+                            os.path.dirname(os.path.abspath(filename)), filename)
+        else:
+            body = lineMarker(bodyLine, filename) + body
+        return entry["declarations"] + body
+
+    def options(self, quoteDir):
+        options = ["-nostdinc", "-I", FAKE_LIBC]
+        for d in self.includeDirs:
+            options += ["-I", d]
+        if quoteDir is not None:
+            options += ["-iquote", quoteDir]
+        return options
+
+    # run cpp over text, returns its output
+    def run(self, text, quoteDir, filename, extra=()):
+        try:
+            process = subprocess.run([self.cpp] + self.options(quoteDir) + list(extra) + ["-"],
+                                     input=text, capture_output=True, text=True)
+        except OSError as e:
+            raise PreprocessError("cannot run " + self.cpp + ": " + str(e))
+        if process.returncode != 0:
+            # the first error is the one that matters, cpp follows it with "compilation terminated."
+            messages = process.stderr.replace("<stdin>", filename).strip().splitlines()
+            errors = [line for line in messages if "error" in line]
+            raise PreprocessError((errors or messages or ["cpp failed"])[0])
+        return process.stdout
+
+    def key(self, prelude, quoteDir):
+        h = hashlib.sha256(VERSION.encode())
+        for part in [self.cpp, quoteDir or ""] + self.includeDirs + ["-D"] + self.defines:
+            h.update(b"\x00" + part.encode())
+        h.update(b"\x00" + prelude.encode())
+        return h.hexdigest()
+
+    def fileHash(self, path):
+        try:
+            st = os.stat(path)
+            known = self.fileHashes.get(path)
+            if known is not None and known[:2] == (st.st_mtime_ns, st.st_size):
+                return known[2]
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+        self.fileHashes[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    # an entry is only valid while every header it was made from is unchanged
+    def isValid(self, entry):
+        return all(self.fileHash(path) == digest for path, digest in entry["headers"].items())
+
+    def path(self, key):
+        return os.path.join(self.cacheDir, key[:2], key + ".json")
+
+    # the declarations and macros of a prelude, from the cache when its headers have not changed
+    def preludeEntry(self, prelude, quoteDir, filename):
+        key = self.key(prelude, quoteDir)
+        entry = self.entries.get(key)
+        if entry is None and self.cacheDir is not None:
+            try:
+                with open(self.path(key)) as f:
+                    entry = json.load(f)
+                entry["macroNames"] = dict.fromkeys(entry["macroNames"], True)
+            except (OSError, ValueError, KeyError, TypeError):
+                entry = None
+        if entry is not None and self.isValid(entry):
+            self.hits += 1
+            self.entries[key] = entry
+            return entry
+        self.misses += 1
+        output = self.run(prelude, quoteDir, filename, ["-dD"] + ["-D" + d for d in self.defines])
+        declarations, macros, macroNames, headers = splitOutput(output)
+        entry = {"headers": {path: self.fileHash(path) for path in headers}, "declarations": declarations,
+                 "macros": macros, "macroNames": macroNames}
+        self.entries[key] = entry
+        if self.cacheDir is not None:
+            self.save(key, entry)
+        return entry
+
+    def save(self, key, entry):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(dict(entry, macroNames=list(entry["macroNames"])), f)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def stats(self):
+        return "header cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses"
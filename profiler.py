@@ -0,0 +1,262 @@
+# Profiling: where the time of an analysis run goes
+#
+# ProfilingAnalyzer is an Analyzer that times the phases of a run and every function, and counts the hot
+# operations of the analysis. It overrides the Analyzer's methods rather than adding checks to them, so a
+# plain Analyzer runs exactly the same code as before: profiling costs nothing when it is off.
+#
+# A Profile holds the timings and counters of one file. printSummary prints it as a table and
+# writeTrace saves it as Chrome trace events (open the file in chrome://tracing or https://ui.perfetto.dev).
+
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+from pycparser import c_ast
+
+from memLeakTracker import Analyzer, StateDict
+from cfgEngine import CfgEngine
+
+
+# < key=counter, value=description > in the order of the summary table
+COUNTERS = {
+    "functions": "functions analyzed",
+    "conditionals": "conditionals (state forks and branch merges)",
+    "valueCopies": "copy-on-write value copies",
+    "loopEvaluations": "loop evaluations",
+    "loopPasses": "passes over loop bodies",
+    "loopCapped": "loops stopped by the iteration cap",
+    "cfgBlocks": "control-flow graph blocks evaluated",
+    "cfgJoins": "control-flow graph join points",
+    "pbrEvaluations": "pass by reference call evaluations",
+    "trackedPointers": "pointer variables tracked",
+    "slicedPointers": "pointer variables sliced out of the state",
+    "prefilterFunctions": "functions seen by the prefilter",
+    "prefilterSkipped": "functions skipped by the prefilter",
+    "maxNesting": "max nesting depth",
+    "peakAliases": "peak alias dictionary size",
+    "peakLocations": "peak location dictionary size",
+}
+# counters that are a maximum rather than a total
+MAX_COUNTERS = ("maxNesting", "peakAliases", "peakLocations")
+# trace events kept per file, a pathological file should not produce a trace too big to open
+MAX_EVENTS = 200000
+
+
+class Profile:
+    def __init__(self, filename="<none>"):
+        self.filename = filename
+        self.origin = time.perf_counter()
+        # < key=phase, value=seconds >
+        self.phases = {}
+        # list of (seconds, function name, line)
+        self.functions = []
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # Chrome trace "complete" events, times in microseconds from origin
+        self.events = []
+        self.droppedEvents = 0
+
+    def event(self, name, category, start, end, args=None):
+        if len(self.events) >= MAX_EVENTS:
+            self.droppedEvents += 1
+            return
+        e = {"name": name, "cat": category, "ph": "X", "pid": 1, "tid": 1,
+             "ts": round((start - self.origin) * 1e6, 3), "dur": round((end - start) * 1e6, 3)}
+        if args:
+            e["args"] = args
+        self.events.append(e)
+
+    @contextmanager
+    def phase(self, name):
+        # phases are listed in the order they start
+        self.phases.setdefault(name, 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases[name] += end - start
+            self.event(name, "phase", start, end)
+
+    def peak(self, counter, value):
+        if value > self.counters[counter]:
+            self.counters[counter] = value
+
+
+# StateDict that counts the values it copies on write
+class CountingStateDict(StateDict):
+    # the Profile of the run in progress (a process analyzes one file at a time)
+    profile = None
+
+    def ownedValue(self, key):
+        if key not in self.delta:
+            CountingStateDict.profile.counters["valueCopies"] += 1
+        return StateDict.ownedValue(self, key)
+
+
+# CfgEngine that counts the blocks it evaluates and the states it joins
+class CountingCfgEngine(CfgEngine):
+    def evaluateBlock(self, block, state, funcName, passByRef):
+        self.analyzer.profile.counters["cfgBlocks"] += 1
+        evaluated = CfgEngine.evaluateBlock(self, block, state, funcName, passByRef)
+        self.analyzer.profile.peak("peakAliases", len(state[0]))
+        self.analyzer.profile.peak("peakLocations", len(state[1]))
+        return evaluated
+
+    def join(self, states):
+        self.analyzer.profile.counters["cfgJoins"] += 1
+        return CfgEngine.join(self, states)
+
+
+class ProfilingAnalyzer(Analyzer):
+    stateDictClass = CountingStateDict
+    cfgEngineClass = CountingCfgEngine
+
+    # functions are always evaluated in this process, the counters of forked workers would be lost
+    # options are the keyword arguments of Analyzer but jobs
+    def __init__(self, summaryCache=None, astCache=None, **options):
+        Analyzer.__init__(self, summaryCache, astCache, 1, **options)
+        self.profile = None
+
+    def analyzeSource(self, text, filename='<none>'):
+        profile = Profile(filename)
+        with profile.phase("parse"):
+            ast = self.parse(text, filename)
+        return self.analyzeAst(ast, filename, profile)
+
+    def analyzeAst(self, ast, filename='<none>', profile=None):
+        return self.profiled(profile if profile is not None else Profile(filename),
+                             lambda: Analyzer.analyzeAst(self, ast, filename))
+
+    # with perFunction the functions are parsed as they are evaluated, the parse phase is part of the analysis
+    def analyzeFile(self, filename):
+        if not self.perFunction:
+            return Analyzer.analyzeFile(self, filename)
+        return self.profiled(Profile(filename), lambda: Analyzer.analyzeFile(self, filename))
+
+    def loadChunk(self, chunks, position):
+        with self.profile.phase("parse"):
+            return Analyzer.loadChunk(self, chunks, position)
+
+    # run the analysis of a file, analyze, with profile as the Profile of the run
+    def profiled(self, profile, analyze):
+        self.profile = profile
+        CountingStateDict.profile = self.profile
+        try:
+            with self.profile.phase("analysis"):
+                result = analyze()
+        finally:
+            CountingStateDict.profile = None
+        if result.prefiltered is not None:
+            self.profile.counters["prefilterSkipped"] += result.prefiltered[0]
+            self.profile.counters["prefilterFunctions"] += result.prefiltered[1]
+        result.profile = self.profile
+        self.profile = None
+        return result
+
+    def generateLeaks(self):
+        with self.profile.phase("leaks"):
+            return Analyzer.generateLeaks(self)
+
+    def evaluateFunction(self, funcDec):
+        name = str(funcDec.decl.name)
+        line = funcDec.decl.coord.line
+        start = time.perf_counter()
+        try:
+            return Analyzer.evaluateFunction(self, funcDec)
+        finally:
+            end = time.perf_counter()
+            self.profile.counters["functions"] += 1
+            self.profile.functions.append((end - start, name, line))
+            self.profile.event(name, "function", start, end, {"line": line})
+
+    def evaluateConditional(self, decl, funcName, passByRef, aliasDictionary, locationDictionary):
+        self.profile.counters["conditionals"] += 1
+        self.profile.peak("maxNesting", self.nest + 1)
+        start = time.perf_counter()
+        try:
+            Analyzer.evaluateConditional(self, decl, funcName, passByRef, aliasDictionary, locationDictionary)
+        finally:
+            self.profile.event("if", "conditional", start, time.perf_counter(), {"line": decl.coord.line})
+
+    def evaluateLoop(self, decl, pbr, funcName):
+        self.profile.counters["loopEvaluations"] += 1
+        start = time.perf_counter()
+        args = {"line": decl.coord.line}
+        try:
+            passes, converged = Analyzer.evaluateLoop(self, decl, pbr, funcName)
+            self.profile.counters["loopPasses"] += passes
+            if not converged and passes == self.maxLoopIterations:
+                self.profile.counters["loopCapped"] += 1
+            args["passes"] = passes
+            return passes, converged
+        finally:
+            self.profile.event(type(decl).__name__, "loop", start, time.perf_counter(), args)
+
+    # the pointer variables a function declares, and how many of them slicing leaves out of its state
+    def sliceFunction(self, funcDec):
+        Analyzer.sliceFunction(self, funcDec)
+        declared = set()
+        stack = [funcDec.body]
+        while stack:
+            node = stack.pop()
+            if type(node) == c_ast.Decl and type(node.type) == c_ast.PtrDecl:
+                declared.add(node.name)
+            stack.extend(child for _, child in node.children())
+        sliced = len(declared - self.heapPointers) if self.heapPointers is not None else 0
+        self.profile.counters["trackedPointers"] += len(declared) - sliced
+        self.profile.counters["slicedPointers"] += sliced
+
+    def evaluatePBR(self, referenceFunc, funcName, decl, aliasDictionary, locationDictionary):
+        self.profile.counters["pbrEvaluations"] += 1
+        Analyzer.evaluatePBR(self, referenceFunc, funcName, decl, aliasDictionary, locationDictionary)
+
+    # the dictionaries are sampled at the end of every block
+    def evaluateProgram(self, dec, funcName, passByRef, aliasDictionary, locationDictionary, scoped=None):
+        Analyzer.evaluateProgram(self, dec, funcName, passByRef, aliasDictionary, locationDictionary, scoped)
+        self.profile.peak("peakAliases", len(aliasDictionary))
+        self.profile.peak("peakLocations", len(locationDictionary))
+
+
+# Combine the profiles of several files: phases and counters are summed (maxima for the peaks)
+def mergeProfiles(profiles):
+    merged = Profile("<all files>")
+    for profile in profiles:
+        for phase, seconds in profile.phases.items():
+            merged.phases[phase] = merged.phases.get(phase, 0.0) + seconds
+        for counter, value in profile.counters.items():
+            if counter in MAX_COUNTERS:
+                merged.peak(counter, value)
+            else:
+                merged.counters[counter] += value
+        for seconds, name, line in profile.functions:
+            merged.functions.append((seconds, profile.filename + ":" + name, line))
+        merged.droppedEvents += profile.droppedEvents
+    return merged
+
+def printSummary(profile, top=10, out=sys.stderr):
+    print("Profile of " + profile.filename, file=out)
+    print("  %-46s %10s" % ("phase", "seconds"), file=out)
+    for phase in profile.phases:
+        print("  %-46s %10.4f" % (phase, profile.phases[phase]), file=out)
+    print("  %-46s %10s" % ("counter", "value"), file=out)
+    for counter in COUNTERS:
+        print("  %-46s %10d" % (COUNTERS[counter], profile.counters[counter]), file=out)
+    print("  slowest functions", file=out)
+    for seconds, name, line in sorted(profile.functions, reverse=True)[:top]:
+        print("  %10.4fs  %s (line %d)" % (seconds, name, line), file=out)
+    if profile.droppedEvents:
+        print("  " + str(profile.droppedEvents) + " trace events dropped (over " + str(MAX_EVENTS) + " per file)", file=out)
+
+# Write the profiles as one Chrome trace, one trace process per file
+def writeTrace(profiles, path):
+    events = []
+    for pid, profile in enumerate(profiles, 1):
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 1, "args": {"name": profile.filename}})
+        for e in profile.events:
+            events.append(dict(e, pid=pid))
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    os.replace(tmp, path)
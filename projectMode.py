@@ -0,0 +1,240 @@
+# Project mode: analyze many translation units across a pool of worker processes
+#
+# Inputs can be C files, directories (searched recursively for .c files), glob patterns or a
+# compile_commands.json. Files are handed out to the workers one at a time, and results are streamed
+# back in the same order the inputs were given, no matter which worker finishes first.
+
+import os
+import sys
+import glob
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from memLeakTracker import Analyzer, AnalysisResult
+
+
+# one Analyzer per worker process, so the CParser is only built once per worker
+workerAnalyzer = None
+# (maxDiagnostics, failFast) a file's analysis stops at, or None
+workerLimits = None
+
+def initWorker(cacheDir=None, profile=False, astCacheDir=None, astCacheSize=None, analyzerOptions=None, limits=None):
+    global workerAnalyzer, workerLimits
+    workerLimits = limits
+    cache = None
+    if cacheDir is not None:
+        import summaryCache
+        cache = summaryCache.SummaryCache(cacheDir)
+    asts = None
+    if astCacheDir is not None:
+        import astCache
+        asts = astCache.AstCache(astCacheDir, astCacheSize)
+    if profile:
+        import profiler
+        workerAnalyzer = profiler.ProfilingAnalyzer(cache, asts, **(analyzerOptions or {}))
+    else:
+        workerAnalyzer = Analyzer(cache, asts, **(analyzerOptions or {}))
+
+# the hit and miss counts of the caches of an analyzer
+def cacheCounters(analyzer):
+    counters = {}
+    for name, cache in (("summary cache", analyzer.summaryCache), ("ast cache", analyzer.astCache),
+                        ("header cache", analyzer.preprocessor)):
+        if cache is not None:
+            counters[name] = (cache.hits, cache.misses)
+    return counters
+
+# analyze one file inside a worker
+# a ParseError (or any other error) only fails this file, it is returned as an errored result
+def analyzeInWorker(filename):
+    global workerAnalyzer
+    if workerAnalyzer is None:
+        initWorker()
+    start = time.perf_counter()
+    before = cacheCounters(workerAnalyzer)
+    if workerLimits is not None:
+        import outputStream
+        workerAnalyzer.output = outputStream.DiagnosticSink(*workerLimits)
+    try:
+        result = workerAnalyzer.analyzeFile(filename)
+    except Exception as e:
+        result = AnalysisResult(filename, [], [], [], error=type(e).__name__ + ": " + str(e))
+    result.seconds = time.perf_counter() - start
+    after = cacheCounters(workerAnalyzer)
+    result.cacheStats = {name: (after[name][0] - before[name][0], after[name][1] - before[name][1]) for name in after}
+    return result
+
+def isGlob(path):
+    return any(c in path for c in "*?[")
+
+# read the translation units out of a compile_commands.json
+def readCompileCommands(path):
+    with open(path) as f:
+        commands = json.load(f)
+    filenames = []
+    for command in commands:
+        filename = command["file"]
+        if not os.path.isabs(filename):
+            filename = os.path.join(command.get("directory", os.path.dirname(path)), filename)
+        filenames.append(os.path.normpath(filename))
+    return filenames
+
+# turn the command line inputs into an ordered list of C files without duplicates
+def collectFiles(inputs):
+    filenames = []
+    for path in inputs:
+        if os.path.basename(path) == "compile_commands.json":
+            filenames += readCompileCommands(path)
+        elif os.path.isdir(path):
+            found = []
+            for root, dirs, files in os.walk(path):
+                for name in files:
+                    if name.endswith(".c"):
+                        found.append(os.path.join(root, name))
+            filenames += sorted(found)
+        elif isGlob(path):
+            filenames += sorted(glob.glob(path, recursive=True))
+        else:
+            filenames.append(path)
+    seen = set()
+    ordered = []
+    for filename in filenames:
+        if filename not in seen:
+            seen.add(filename)
+            ordered.append(filename)
+    return ordered
+
+# true when the inputs need project mode rather than the plain single file output
+def isProject(inputs):
+    if len(inputs) != 1:
+        return True
+    path = inputs[0]
+    return os.path.isdir(path) or isGlob(path) or os.path.basename(path) == "compile_commands.json"
+
+# re-run a file alone in a fresh process after the pool broke, to find out whether it was the one that crashed
+def retryAlone(filename, workerArgs=()):
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=1, initializer=initWorker, initargs=workerArgs) as executor:
+            return executor.submit(analyzeInWorker, filename).result()
+    except BrokenProcessPool:
+        result = AnalysisResult(filename, [], [], [], error="worker crashed while analyzing this file")
+        result.seconds = time.perf_counter() - start
+        return result
+
+# Yields one AnalysisResult per file, in input order
+# jobs=1 analyzes in this process without starting any workers
+# cacheDir is a summary cache directory shared by all the workers
+# with profile, files are analyzed by a profiler.ProfilingAnalyzer and every result carries its profile
+# astCacheDir is an ast cache directory shared by all the workers, limited to astCacheSize bytes
+# analyzerOptions are keyword arguments of the workers' analyzers (see Analyzer)
+# limits is (maxDiagnostics, failFast): the analysis of a file stops once it found that many diagnostics, or a leak
+def analyzeProject(filenames, jobs=None, cacheDir=None, profile=False, astCacheDir=None, astCacheSize=None,
+                   analyzerOptions=None, limits=None):
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(filenames)))
+    workerArgs = (cacheDir, profile, astCacheDir, astCacheSize, analyzerOptions, limits)
+
+    if jobs == 1:
+        initWorker(*workerArgs)
+        for filename in filenames:
+            yield analyzeInWorker(filename)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=jobs, initializer=initWorker, initargs=workerArgs)
+    try:
+        futures = [executor.submit(analyzeInWorker, filename) for filename in filenames]
+        for i, filename in enumerate(filenames):
+            try:
+                yield futures[i].result()
+            except BrokenProcessPool:
+                # a worker died (segfault, out of memory, ...): every pending future is lost with it,
+                # so isolate this file and restart the pool for the rest of the batch
+                executor.shutdown(wait=False, cancel_futures=True)
+                yield retryAlone(filename, workerArgs)
+                executor = ProcessPoolExecutor(max_workers=jobs, initializer=initWorker, initargs=workerArgs)
+                for j in range(i + 1, len(filenames)):
+                    if not futures[j].done() or futures[j].exception() is not None:
+                        futures[j] = executor.submit(analyzeInWorker, filenames[j])
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+# Print the wall time summary of a batch
+# only the slowest `top` files are listed unless top is None
+def printTimings(results, wallTime, jobs, top=10, out=sys.stdout):
+    errors = [r for r in results if r.error is not None]
+    leaky = [r for r in results if r.hasLeaks()]
+    cpuTime = sum(r.seconds for r in results)
+    print("Analyzed " + str(len(results)) + " files in " + "%.2f" % wallTime + "s with " + str(jobs) + " workers"
+          + " (" + "%.2f" % cpuTime + "s of analysis, " + str(len(leaky)) + " with leaks, " + str(len(errors)) + " failed)", file=out)
+    caches = {}
+    for r in results:
+        for name, (hits, misses) in (r.cacheStats or {}).items():
+            total = caches.get(name, (0, 0))
+            caches[name] = (total[0] + hits, total[1] + misses)
+    for name in caches:
+        print(name + ": " + str(caches[name][0]) + " hits, " + str(caches[name][1]) + " misses", file=out)
+    prefiltered = [r.prefiltered for r in results if r.prefiltered is not None]
+    if prefiltered:
+        print("prefilter: skipped " + str(sum(skipped for skipped, functions in prefiltered)) + " of "
+              + str(sum(functions for skipped, functions in prefiltered)) + " functions, "
+              + str(sum(1 for skipped, functions in prefiltered if skipped == functions)) + " of " + str(len(results))
+              + " files without heap activity", file=out)
+    reachable = [r.reachable for r in results if r.reachable is not None]
+    if reachable:
+        print("entry points: " + str(sum(counts[0] for counts in reachable)) + " of "
+              + str(sum(counts[1] for counts in reachable)) + " functions reachable, "
+              + str(sum(1 for counts in reachable if not counts[2])) + " of " + str(len(results))
+              + " files without an entry point", file=out)
+    slowest = sorted(results, key=lambda r: r.seconds, reverse=True)
+    if top is not None:
+        slowest = slowest[:top]
+        print("Slowest files:", file=out)
+    for r in slowest:
+        print("%10.3fs  " % r.seconds + r.filename, file=out)
+
+# Analyze every file of a project and print the results as they come in (see outputStream)
+# with outputFormat json, a single document covering every file is printed at the end instead
+# (and with any format but text the timings go to stderr so stdout stays parseable)
+# with a traceFile, the files are profiled: the merged profile is printed to stderr and the trace written to traceFile
+# astCacheDir, astCacheSize and analyzerOptions are passed on to analyzeProject
+# once maxDiagnostics diagnostics were printed, or a leak with failFast, the remaining files are not analyzed
+# returns the results of the files analyzed
+def runProject(inputs, jobs=None, allTimings=False, cacheDir=None, outputFormat="text", traceFile=None,
+               astCacheDir=None, astCacheSize=None, analyzerOptions=None, maxDiagnostics=None, failFast=False):
+    import outputStream
+    filenames = collectFiles(inputs)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if outputFormat == "text":
+        writer = outputStream.TextWriter(sys.stdout, maxDiagnostics, failFast, headers=True)
+    else:
+        writer = outputStream.WRITERS[outputFormat](sys.stdout, maxDiagnostics, failFast)
+    limits = (maxDiagnostics, failFast) if maxDiagnostics is not None or failFast else None
+    start = time.perf_counter()
+    results = []
+    stream = analyzeProject(filenames, jobs, cacheDir, traceFile is not None, astCacheDir, astCacheSize,
+                            analyzerOptions, limits)
+    for result in stream:
+        outputStream.writeResult(writer, result)
+        results.append(result)
+        if writer.done:
+            break
+    # the files still being analyzed are cancelled
+    stream.close()
+    writer.close()
+    wallTime = time.perf_counter() - start
+    printTimings(results, wallTime, max(1, min(jobs, len(filenames))), top=None if allTimings else 10,
+                 out=sys.stdout if outputFormat == "text" else sys.stderr)
+    if writer.done:
+        print("Stopped after " + str(writer.count) + " diagnostics, " + str(len(filenames) - len(results))
+              + " files not analyzed", file=sys.stdout if outputFormat == "text" else sys.stderr)
+    if traceFile is not None:
+        import profiler
+        profiles = [r.profile for r in results if r.profile is not None]
+        profiler.printSummary(profiler.mergeProfiles(profiles))
+        profiler.writeTrace(profiles, traceFile)
+    return results
@@ -0,0 +1,344 @@
+# Results store: the diagnostics, function summaries and timings of every run kept in a SQLite database
+#
+# A run (one invocation of the tracker, under a label that defaults to the directory it ran in) is recorded
+# after its analysis: a row per file with its time and counts, a row per diagnostic, the leak and warning counts
+# of every function, a row per PassByReference summary and, with --profile, a row per function timing. The rows
+# are inserted with executemany in batches of BATCH_ROWS, one transaction per batch. A diagnostic is a finding
+# (its file, function, kind and variables, stored once whatever the number of runs that have it) and the lines it
+# has in a run, so comparing two runs compares integer ids. Indexes on run, file, function and kind keep the
+# queries of the query subcommand (see queryMain) to index range scans however many runs the database holds:
+#
+#   introduced   the leaks of the latest run that the last run before a date (default: a week ago) did not have
+#   top-files    the files with the most leaks in the latest run
+#   regressed    the functions with more leaks in the latest run than in the run before it
+#   runs         the runs recorded
+#
+# Findings are matched across runs as in diffMode: by file, kind and variables, not by line, and counted. A finding
+# a run has more times than the run compared with (three leaks with nothing pointing to them where there was one,
+# which have no variables to tell them apart) has its extra occurrences introduced.
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+import diagnostics
+
+# part of every database, a database of another version is rejected
+SCHEMA_VERSION = 1
+# rows inserted per transaction
+BATCH_ROWS = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, label TEXT NOT NULL, started REAL NOT NULL,
+                                 seconds REAL, options TEXT);
+CREATE TABLE IF NOT EXISTS paths (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS files (run_id INTEGER NOT NULL, path_id INTEGER NOT NULL, seconds REAL, error TEXT,
+                                  leaks INTEGER, warnings INTEGER);
+CREATE TABLE IF NOT EXISTS findings (id INTEGER PRIMARY KEY, path_id INTEGER NOT NULL, function TEXT,
+                                     kind TEXT NOT NULL, variables TEXT NOT NULL, fingerprint TEXT NOT NULL,
+                                     UNIQUE (path_id, kind, fingerprint));
+CREATE TABLE IF NOT EXISTS diagnostics (run_id INTEGER NOT NULL, finding_id INTEGER NOT NULL, leak INTEGER NOT NULL,
+                                        lines TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS functionCounts (run_id INTEGER NOT NULL, path_id INTEGER NOT NULL, function TEXT NOT NULL,
+                                           leaks INTEGER NOT NULL, warnings INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS summaries (run_id INTEGER NOT NULL, path_id INTEGER NOT NULL, function TEXT NOT NULL,
+                                      frees TEXT, allocates TEXT);
+CREATE TABLE IF NOT EXISTS functions (run_id INTEGER NOT NULL, path_id INTEGER NOT NULL, function TEXT NOT NULL,
+                                      line INTEGER, seconds REAL);
+CREATE INDEX IF NOT EXISTS runsByLabel ON runs (label, started);
+CREATE INDEX IF NOT EXISTS filesByRun ON files (run_id, leaks);
+CREATE INDEX IF NOT EXISTS filesByPath ON files (path_id, run_id);
+CREATE INDEX IF NOT EXISTS findingsByFunction ON findings (function);
+CREATE INDEX IF NOT EXISTS findingsByKind ON findings (kind);
+CREATE INDEX IF NOT EXISTS diagnosticsByRun ON diagnostics (run_id, leak, finding_id);
+CREATE INDEX IF NOT EXISTS diagnosticsByFinding ON diagnostics (finding_id, run_id);
+CREATE INDEX IF NOT EXISTS functionCountsByRun ON functionCounts (run_id, path_id, function);
+CREATE INDEX IF NOT EXISTS functionCountsByFunction ON functionCounts (function, run_id);
+CREATE INDEX IF NOT EXISTS summariesByRun ON summaries (run_id, path_id);
+CREATE INDEX IF NOT EXISTS functionsByRun ON functions (run_id, path_id);
+"""
+
+
+class StoreError(Exception):
+    pass
+
+
+class ResultsStore:
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.db = sqlite3.connect(path)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            with self.db:
+                self.db.executescript(SCHEMA)
+                version = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                if version is None:
+                    self.db.execute("INSERT INTO meta VALUES ('version', ?)", (str(SCHEMA_VERSION),))
+                elif version[0] != str(SCHEMA_VERSION):
+                    raise StoreError(path + " is a results database of another version of the tracker")
+        except sqlite3.Error as e:
+            raise StoreError("cannot open results database " + path + ": " + str(e))
+        # < key=path, value=id > of the paths known to this connection
+        self.pathIds = {}
+        # < key=path id, value=< key=(kind, fingerprint), value=finding id > > of the files recorded by it
+        self.findingIds = {}
+
+    def close(self):
+        self.db.close()
+
+    def pathId(self, path):
+        pathId = self.pathIds.get(path)
+        if pathId is None:
+            self.db.execute("INSERT OR IGNORE INTO paths (path) VALUES (?)", (path,))
+            pathId = self.db.execute("SELECT id FROM paths WHERE path = ?", (path,)).fetchone()[0]
+            self.pathIds[path] = pathId
+        return pathId
+
+    # Record the AnalysisResults of a run, returns the id of the run
+    # options are the options of the run worth keeping (anything json can encode)
+    def record(self, results, label, started, seconds, options=None):
+        try:
+            with self.db:
+                runId = self.db.execute("INSERT INTO runs (label, started, seconds, options) VALUES (?, ?, ?, ?)",
+                                        (label, started, seconds, json.dumps(options or {}, sort_keys=True))).lastrowid
+            # < key=table, value=rows waiting to be inserted >
+            batches = {"files": [], "diagnostics": [], "functionCounts": [], "summaries": [], "functions": []}
+            pending = 0
+            for result in results:
+                pending += self.addResult(runId, result, batches)
+                if pending >= BATCH_ROWS:
+                    self.flush(batches)
+                    pending = 0
+            self.flush(batches)
+        except sqlite3.Error as e:
+            raise StoreError("cannot write results database " + self.path + ": " + str(e))
+        return runId
+
+    # the rows of one result, returns how many were added
+    def addResult(self, runId, result, batches):
+        import diffMode
+        pathId = self.pathId(diffMode.normalizePath(result.filename))
+        batches["files"].append((runId, pathId, result.seconds, result.error, len(result.leaks), len(result.warnings)))
+        rows = 1
+        if result.error is not None:
+            return rows
+        # < key=function, value=[leaks, warnings] >
+        counts = {}
+        for leak, records in ((1, result.leaks), (0, result.warnings)):
+            for d in records:
+                function = d.store.aliasFuncs[d.aliases[0]] if d.aliases else None
+                findingId = self.findingId(pathId, function, d)
+                batches["diagnostics"].append((runId, findingId, leak, json.dumps(list(d.lines))))
+                if function is not None:
+                    counts.setdefault(function, [0, 0])[1 - leak] += 1
+                rows += 1
+        for function, (leaks, warnings) in counts.items():
+            batches["functionCounts"].append((runId, pathId, function, leaks, warnings))
+            rows += 1
+        for x in result.referenceFuncs:
+            frees = [name for name, free in zip(x.varNames, x.free) if free]
+            allocates = [name for name, malloc in zip(x.varNames, x.malloc) if malloc]
+            batches["summaries"].append((runId, pathId, x.funcName, json.dumps(frees), json.dumps(allocates)))
+            rows += 1
+        if result.profile is not None:
+            for seconds, name, line in result.profile.functions:
+                batches["functions"].append((runId, pathId, name, line, seconds))
+                rows += 1
+        return rows
+
+    # the id of the finding of a diagnostic of the file pathId, added the first time it is seen
+    def findingId(self, pathId, function, d):
+        known = self.findingIds.get(pathId)
+        if known is None:
+            known = self.findingIds[pathId] = {
+                (kind, fingerprint): findingId for findingId, kind, fingerprint in
+                self.db.execute("SELECT id, kind, fingerprint FROM findings WHERE path_id = ?", (pathId,))}
+        names = d.names()
+        key = (d.kind, json.dumps(sorted(names)))
+        findingId = known.get(key)
+        if findingId is None:
+            findingId = known[key] = self.db.execute(
+                "INSERT INTO findings (path_id, function, kind, variables, fingerprint) VALUES (?, ?, ?, ?, ?)",
+                (pathId, function, d.kind, json.dumps(names), key[1])).lastrowid
+        return findingId
+
+    # insert the waiting rows in one transaction
+    def flush(self, batches):
+        with self.db:
+            for table, rows in batches.items():
+                if rows:
+                    self.db.executemany("INSERT INTO " + table + " VALUES (" + ", ".join("?" * len(rows[0])) + ")",
+                                        rows)
+                    rows.clear()
+
+    # the latest run of a label (of any label when label is None), or None
+    def latestRun(self, label=None, before=None):
+        query = "SELECT id, label, started FROM runs"
+        conditions = []
+        params = []
+        if label is not None:
+            conditions.append("label = ?")
+            params.append(label)
+        if before is not None:
+            conditions.append("started < ?")
+            params.append(before)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return self.db.execute(query + " ORDER BY started DESC, id DESC LIMIT 1", params).fetchone()
+
+    def run(self, runId):
+        return self.db.execute("SELECT id, label, started FROM runs WHERE id = ?", (runId,)).fetchone()
+
+    # the run a query is about: runId, or the latest run of label
+    def headRun(self, runId=None, label=None):
+        run = self.run(runId) if runId is not None else self.latestRun(label)
+        if run is None:
+            raise StoreError("no run " + (str(runId) if runId is not None else "recorded"
+                                          + (" with label " + label if label is not None else "")))
+        return run
+
+    # the leaks of run head whose file, kind and variables run base did not have, or had fewer times (the
+    # occurrences after the first ones, as diffMode matches them), all of them without a base
+    def introduced(self, head, base=None):
+        query = ("SELECT p.path, f.function, f.kind, f.variables, d.lines FROM "
+                 "(SELECT finding_id, lines, rowid AS id, "
+                 "ROW_NUMBER() OVER (PARTITION BY finding_id ORDER BY rowid) AS occurrence "
+                 "FROM diagnostics WHERE run_id = ? AND leak = 1) d "
+                 "JOIN findings f ON f.id = d.finding_id JOIN paths p ON p.id = f.path_id")
+        params = [head]
+        if base is not None:
+            query += (" WHERE d.occurrence > (SELECT COUNT(*) FROM diagnostics "
+                      "WHERE run_id = ? AND leak = 1 AND finding_id = d.finding_id)")
+            params.append(base)
+        return self.db.execute(query + " ORDER BY p.path, d.id", params).fetchall()
+
+    # (path, leaks, warnings, seconds) of the files of a run with the most leaks
+    def topFiles(self, runId, limit=20):
+        return self.db.execute("SELECT p.path, f.leaks, f.warnings, f.seconds FROM files f "
+                               "JOIN paths p ON p.id = f.path_id WHERE f.run_id = ? AND f.leaks > 0 "
+                               "ORDER BY f.leaks DESC, p.path LIMIT ?", (runId, limit)).fetchall()
+
+    # (path, function, leaks in head, leaks in base) of the functions with more leaks in run head than in base
+    def regressed(self, head, base):
+        return self.db.execute("SELECT p.path, h.function, h.leaks, COALESCE(b.leaks, 0) FROM functionCounts h "
+                               "LEFT JOIN functionCounts b ON b.run_id = ? AND b.path_id = h.path_id "
+                               "AND b.function = h.function JOIN paths p ON p.id = h.path_id "
+                               "WHERE h.run_id = ? AND h.leaks > COALESCE(b.leaks, 0) "
+                               "ORDER BY h.leaks - COALESCE(b.leaks, 0) DESC, p.path, h.function",
+                               (base, head)).fetchall()
+
+    def runs(self, label=None, limit=20):
+        query = "SELECT r.id, r.label, r.started, r.seconds, (SELECT COUNT(*) FROM files f WHERE f.run_id = r.id) FROM runs r"
+        params = []
+        if label is not None:
+            query += " WHERE r.label = ?"
+            params.append(label)
+        return self.db.execute(query + " ORDER BY r.started DESC, r.id DESC LIMIT ?", params + [limit]).fetchall()
+
+
+# Record the results of a run in the database at path (see main's --results-db)
+def recordRun(path, results, label, started, options=None):
+    store = ResultsStore(path)
+    try:
+        return store.record(results, label, started, time.time() - started, options)
+    finally:
+        store.close()
+
+
+# a date as seconds since the epoch: a duration before now ("7d", "12h", "30m") or an ISO date ("2024-05-01")
+def parseSince(text):
+    units = {"d": 86400, "h": 3600, "m": 60}
+    if text[-1:] in units:
+        try:
+            return time.time() - float(text[:-1]) * units[text[-1]]
+        except ValueError:
+            pass
+    import datetime
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise StoreError("not a duration or a date: " + text)
+
+def formatTime(seconds):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+
+def printRows(rows, columns, outputFormat):
+    if outputFormat == "json":
+        print(json.dumps([dict(zip(columns, row)) for row in rows], indent=2))
+        return
+    print("  ".join(columns))
+    for row in rows:
+        print("  ".join(str(value) for value in row))
+
+
+# The query subcommand: python3 memLeakTracker.py query DB QUERY [options]
+def queryMain(argv):
+    argparser = argparse.ArgumentParser('memLeakTracker.py query')
+    argparser.add_argument('database', help='the results database written by --results-db')
+    argparser.add_argument('query', choices=('introduced', 'top-files', 'regressed', 'runs'),
+                            help='introduced: leaks new since a date, top-files: files with the most leaks, '
+                                 'regressed: functions with more leaks than in the run before, runs: the runs recorded')
+    argparser.add_argument('--label', default=None,
+                            help='only the runs of this label (default: the label of the run queried, any for runs)')
+    argparser.add_argument('--run', metavar='ID', type=int, default=None,
+                            help='the run to query (default: the latest one)')
+    argparser.add_argument('--against', metavar='ID', type=int, default=None,
+                            help='with introduced and regressed, the run to compare with (default: the last run before '
+                                 '--since, or the run before, of the same label)')
+    argparser.add_argument('--since', default='7d',
+                            help='with introduced, a duration before now (7d, 12h) or a date (default: 7d)')
+    argparser.add_argument('--limit', type=int, default=20,
+                            help='with top-files and runs, rows shown (default: 20)')
+    argparser.add_argument('--format', choices=('text', 'json'), default='text')
+    args = argparser.parse_args(argv)
+    if not os.path.isfile(args.database):
+        argparser.error("no results database " + args.database)
+    try:
+        store = ResultsStore(args.database)
+        try:
+            query(store, args)
+        finally:
+            store.close()
+    except StoreError as e:
+        print("ERROR: " + str(e), file=sys.stderr)
+        return 1
+    return 0
+
+def query(store, args):
+    if args.query == "runs":
+        rows = [(runId, label, formatTime(started), round(seconds or 0.0, 3), files)
+                for runId, label, started, seconds, files in store.runs(args.label, args.limit)]
+        printRows(rows, ("run", "label", "started", "seconds", "files"), args.format)
+        return
+    head, label, started = store.headRun(args.run, args.label)
+    if args.query == "top-files":
+        printRows(store.topFiles(head, args.limit), ("file", "leaks", "warnings", "seconds"), args.format)
+        return
+    if args.against is not None:
+        base = store.headRun(args.against)
+    elif args.query == "introduced":
+        base = store.latestRun(label, min(parseSince(args.since), started))
+    else:
+        base = store.latestRun(label, started)
+    if args.query == "introduced":
+        rows = []
+        for path, function, kind, variables, lines in store.introduced(head, base[0] if base else None):
+            rows.append((path, function, kind, diagnostics.render(kind, json.loads(variables), json.loads(lines))))
+        if args.format == "text":
+            print("Leaks of run " + str(head) + " not in " + ("run " + str(base[0]) + " (" + formatTime(base[2]) + ")"
+                                                           if base else "any earlier run") + ":")
+            for path, function, kind, message in rows:
+                print("=== " + path + (" (" + function + ")" if function else "") + "\n" + message)
+        else:
+            printRows(rows, ("file", "function", "kind", "message"), args.format)
+        return
+    if base is None:
+        raise StoreError("no run before run " + str(head) + " to compare with")
+    if args.format == "text":
+        print("Functions with more leaks in run " + str(head) + " than in run " + str(base[0]) + ":")
+    printRows(store.regressed(head, base[0]), ("file", "function", "leaks", "before"), args.format)
@@ -0,0 +1,230 @@
+# On-disk cache of per-function analysis results
+#
+# Every function's contribution to the analysis (its PassByReference summary, the location/line
+# entries it leaves behind and the warnings it generates) is stored under a content-addressed key:
+# a structural hash of the function's AST plus the summaries of the functions it calls. A function whose
+# key is already in the cache is restored from it without calling evaluateProgram. Editing a callee
+# changes its summary, which changes the keys of its callers, and so on up the call graph, so only the
+# transitive callers of an edited function are re-evaluated. Line numbers are stored relative to the line the
+# function starts on, so a function that only moved up or down the file is still found in the cache.
+#
+# Entries are written to a temporary file and renamed into place, so several processes can share the
+# same cache directory safely.
+
+import os
+import json
+import marshal
+import hashlib
+import tempfile
+import weakref
+
+from memLeakTracker import PassByReference, AliasSet
+from callGraph import calledNames
+
+
+# the modules whose code decides what the analysis of a function produces: the analyzer, both engines, the
+# parsing of --per-function, the diagnostics and the entry format of this module
+ANALYSIS_MODULES = ("memLeakTracker", "cfgEngine", "callGraph", "chunkParser", "diagnostics", "summaryCache")
+
+# a change to any of the ANALYSIS_MODULES invalidates the whole cache, so their sources are part of every key
+# (the other modules only choose which functions are analyzed, or how the results are printed)
+def analyzerVersion():
+    import importlib
+    h = hashlib.sha256()
+    for name in ANALYSIS_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def summaryToDict(x):
+    return {
+        "funcName": x.funcName,
+        "varNames": x.varNames,
+        "pbrIndex": x.pbrIndex,
+        "free": x.free,
+        "malloc": x.malloc,
+        "reference": x.reference,
+        "morf": x.morf,
+        "retName": x.retName,
+        "refNormVars": x.refNormVars,
+    }
+
+def summaryFromDict(d):
+    return PassByReference(d["funcName"], d["varNames"], d["pbrIndex"], d["free"], d["malloc"],
+                           d["reference"], d["morf"], d["retName"], d["refNormVars"])
+
+# feed the structure of an AST node into a hash: node types, attributes and line numbers relative to baseLine
+# (line numbers are part of the analysis output, so they are part of the key as well)
+def hashNode(node, h, baseLine=0):
+    h.update(type(node).__name__.encode())
+    for attr in node.attr_names:
+        h.update(b"\x00" + repr(getattr(node, attr)).encode())
+    if node.coord is not None:
+        h.update(b"@" + str(node.coord.line - baseLine).encode())
+    h.update(b"(")
+    for name, child in node.children():
+        h.update(name.encode() + b"=")
+        hashNode(child, h, baseLine)
+    h.update(b")")
+
+# the line every line number of a function's cache entry is relative to
+def baseLine(funcDec):
+    return funcDec.decl.coord.line
+
+
+class SummaryCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.version = analyzerVersion()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # The key of a function: the analyzer's options, its AST and, for every function it calls, whatever the
+    # analysis of the call depends on (whether the callee is defined in this translation unit and its pass by
+    # reference summary)
+    def functionKey(self, funcDec, analyzer):
+        h = hashlib.sha256((self.version + analyzer.optionsKey()).encode())
+        digest, names = self.structure(funcDec)
+        h.update(digest)
+        for name in names:
+            callee = analyzer.returnReferenceFunc(name)
+            calleeSummary = summaryToDict(callee) if callee is not None else None
+            h.update(json.dumps([name, analyzer.findFuncDec(name) is not None, calleeSummary], sort_keys=True).encode())
+        return h.hexdigest()
+
+    # the structural hash of a function and the names of the functions it calls
+    def structure(self, funcDec):
+        h = hashlib.sha256()
+        hashNode(funcDec, h, baseLine(funcDec))
+        return h.digest(), calledNames(funcDec)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            # atomic on POSIX and Windows: readers see either the old entry, the new one, or nothing
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def stats(self):
+        return "summary cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses"
+
+
+# The same cache kept in memory, for a long-lived process (see daemonMode)
+# The structure of a function is remembered for as long as its FuncDef is alive, so a function whose ast is
+# reused from one run to the next is not hashed again. Entries are kept serialized, every get() returns a
+# fresh copy like one read from disk, and the least recently used ones are dropped past maxEntries.
+class MemorySummaryCache(SummaryCache):
+    def __init__(self, maxEntries=100000):
+        self.version = analyzerVersion()
+        self.hits = 0
+        self.misses = 0
+        self.maxEntries = maxEntries
+        # < key=function key, value=marshalled entry >, least recently used first
+        self.entries = {}
+        # < key=FuncDef, value=structure(FuncDef) >
+        self.structures = weakref.WeakKeyDictionary()
+
+    def structure(self, funcDec):
+        if funcDec not in self.structures:
+            self.structures[funcDec] = SummaryCache.structure(self, funcDec)
+        return self.structures[funcDec]
+
+    def get(self, key):
+        data = self.entries.pop(key, None)
+        if data is None:
+            self.misses += 1
+            return None
+        self.entries[key] = data
+        self.hits += 1
+        return marshal.loads(data)
+
+    def put(self, key, entry):
+        self.entries.pop(key, None)
+        self.entries[key] = marshal.dumps(entry)
+        while len(self.entries) > self.maxEntries:
+            del self.entries[next(iter(self.entries))]
+
+
+# Snapshot the analyzer state before a function is evaluated, so its contribution can be captured afterwards
+def beginCapture(analyzer):
+    return (analyzer.memloc, len(analyzer.warnings))
+
+def shiftLine(line, offset):
+    return line if line is None else line + offset
+
+# Everything a function added to the analyzer state, with its memory locations made relative to the
+# first location it allocated and its aliases stored by variable name (alias ids are only valid within one run)
+def captureFunction(analyzer, funcDec, x, registered, start):
+    memlocStart, warningsStart = start
+    def relative(loc):
+        return loc if loc == -1 else loc - memlocStart
+    # (its aliases are not kept, they are dead once it returns, see Analyzer.exitFunction)
+    # every alias pointing to a location the function allocated is one of its own variables
+    varNames = {alias: name for name, alias in analyzer.aliasIds.get(funcDec.decl.name, {}).items()}
+    locations = []
+    for loc in analyzer.globalLocationDictionary:
+        if loc >= memlocStart:
+            locations.append([relative(loc), [varNames[alias] for alias in analyzer.globalLocationDictionary[loc]]])
+    base = baseLine(funcDec)
+    lines = []
+    for loc in range(memlocStart, analyzer.memloc):
+        lines.append([relative(loc), analyzer.allocationLines[loc] - base, analyzer.lastUsedLines[loc] - base])
+    warnings = []
+    for d in analyzer.warnings[warningsStart:]:
+        names = [[analyzer.aliasFuncs[alias], analyzer.aliasVars[alias]] for alias in d.aliases]
+        warnings.append([d.kind, names, [shiftLine(line, -base) for line in d.lines]])
+    return {
+        "summary": summaryToDict(x),
+        "registered": registered,
+        "memlocs": analyzer.memloc - memlocStart,
+        "locations": locations,
+        "lines": lines,
+        "warnings": warnings,
+    }
+
+# (leaks, warnings) a contribution reports once it is replayed, every location it leaves behind is a leak
+def diagnosticCounts(entry):
+    return len(entry["locations"]), len(entry["warnings"])
+
+# Replay a cached contribution of funcDec onto the analyzer state, relocating its memory locations and lines
+def restoreFunction(analyzer, funcDec, entry):
+    return restoreEntry(analyzer, baseLine(funcDec), entry)
+
+# the same for a function that starts on line base and is not parsed any more
+def restoreEntry(analyzer, base, entry):
+    offset = analyzer.memloc
+    def absolute(loc):
+        return loc if loc == -1 else loc + offset
+    x = summaryFromDict(entry["summary"])
+    if entry["registered"]:
+        analyzer.addReferenceFunc(x)
+    funcName = x.funcName
+    for loc, names in entry["locations"]:
+        analyzer.globalLocationDictionary[absolute(loc)] = AliasSet.fromkeys(analyzer.internAlias(funcName, name) for name in names)
+    for loc, allocationLine, lastUsedLine in entry["lines"]:
+        analyzer.setLines(absolute(loc), allocationLine + base, lastUsedLine + base)
+    for kind, names, lines in entry["warnings"]:
+        aliases = tuple(analyzer.internAlias(func, var) for func, var in names)
+        analyzer.warnings.add(kind, aliases, tuple(shiftLine(line, base) for line in lines))
+    analyzer.memloc += entry["memlocs"]
+    return x